@@ -0,0 +1,207 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+UI/UX Pro Max Benchmark - synthetic corpora and timings for the core.py search engine
+Usage: python bench.py [--sizes 100 10000 100000] [--domains style ux] [--backends python numpy]
+                       [--queries 200] [--output bench_results.json]
+
+For each corpus size a synthetic CSV per domain is generated with the real
+CSV_CONFIG column layout and a Zipf-distributed vocabulary drawn from the
+shipped data. Per size and backend it records:
+  cold start (fresh interpreter: import + build, and import + load persisted index),
+  index build/load time, index size on disk, tracemalloc peak and resident size,
+  per-query p50/p99 (exact, fuzzy, search_all) and score_batch throughput.
+"""
+
+import argparse
+import csv
+import json
+import os
+import platform
+import random
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+from itertools import accumulate
+from pathlib import Path
+
+import core
+from core import CSV_CONFIG, MAX_RESULTS
+
+SCRIPTS_DIR = Path(__file__).parent
+REAL_DATA_DIR = core.DATA_DIR
+
+
+def _vocabulary(domains):
+    """Real tokens from the shipped CSVs, most frequent first"""
+    counts = {}
+    tokenizer = core.BM25()
+    for domain in domains:
+        filepath = REAL_DATA_DIR / CSV_CONFIG[domain]["file"]
+        if not filepath.exists():
+            continue
+        for row in core._load_csv(filepath):
+            for token in tokenizer.tokenize(" ".join(str(v) for v in row.values())):
+                counts[token] = counts.get(token, 0) + 1
+    words = sorted(counts, key=counts.get, reverse=True)
+    return words or [f"term{i}" for i in range(500)]
+
+
+def generate_corpus(data_dir, domains, rows, vocabulary, seed):
+    """Write one CSV per domain with `rows` rows; search columns get 3-15 Zipf-sampled words"""
+    rng = random.Random(seed)
+    cum_weights = list(accumulate(1 / (rank + 1) for rank in range(len(vocabulary))))
+    for domain in domains:
+        config = CSV_CONFIG[domain]
+        columns = list(dict.fromkeys(config["search_cols"] + config["output_cols"]))
+        filepath = data_dir / config["file"]
+        filepath.parent.mkdir(parents=True, exist_ok=True)
+        with open(filepath, "w", encoding="utf-8", newline="") as f:
+            writer = csv.writer(f)
+            writer.writerow(columns)
+            for _ in range(rows):
+                writer.writerow(" ".join(rng.choices(vocabulary, cum_weights=cum_weights, k=rng.randint(3, 15))) for _ in columns)
+
+
+def make_queries(vocabulary, count, seed):
+    """Mix of 1-3 word queries plus partial words for the fuzzy runs"""
+    rng = random.Random(seed)
+    head = vocabulary[:max(50, len(vocabulary) // 4)]
+    exact = [" ".join(rng.sample(head, rng.randint(1, 3))) for _ in range(count)]
+    partial = [word[:max(3, len(word) - 2)] for word in rng.sample(vocabulary, min(count, len(vocabulary)))]
+    return exact, partial
+
+
+def percentiles(samples_ms):
+    ordered = sorted(samples_ms)
+    pick = lambda p: ordered[min(len(ordered) - 1, int(p * len(ordered)))]
+    return {"p50_ms": round(pick(0.50), 4), "p99_ms": round(pick(0.99), 4), "mean_ms": round(sum(ordered) / len(ordered), 4)}
+
+
+def time_queries(fn, queries):
+    samples = []
+    for query in queries:
+        start = time.perf_counter()
+        fn(query)
+        samples.append((time.perf_counter() - start) * 1000)
+    return percentiles(samples)
+
+
+def cold_start_ms(data_dir, index_dir, backend, domain, query):
+    """Wall time of a fresh interpreter that imports core and answers one query"""
+    env = dict(os.environ, UIPRO_DATA_DIR=str(data_dir), UIPRO_INDEX_DIR=str(index_dir), UIPRO_BM25_BACKEND=backend)
+    code = f"import core; core.search({query!r}, {domain!r})"
+    start = time.perf_counter()
+    subprocess.run([sys.executable, "-c", code], cwd=SCRIPTS_DIR, env=env, check=True)
+    return round((time.perf_counter() - start) * 1000, 2)
+
+
+def _reset_caches():
+    core._INDEX_CACHE.clear()
+    core._UNIFIED_CACHE.update(key=None, index=None)
+
+
+def bench_backend(data_dir, index_dir, domains, backend, exact, partial):
+    """All measurements for one corpus and backend"""
+    core.DATA_DIR, core.INDEX_DIR, core.BM25_BACKEND = data_dir, index_dir, backend
+    shutil.rmtree(index_dir, ignore_errors=True)
+    _reset_caches()
+    first = domains[0]
+    result = {"backend": backend}
+
+    result["cold_build_ms"] = cold_start_ms(data_dir, index_dir, backend, first, exact[0])
+    result["cold_start_ms"] = cold_start_ms(data_dir, index_dir, backend, first, exact[0])
+
+    sources = [(d, data_dir / CSV_CONFIG[d]["file"], CSV_CONFIG[d]["search_cols"], CSV_CONFIG[d]["output_cols"])
+               for d in domains]
+
+    start = time.perf_counter()
+    for _, path, s_cols, o_cols in sources:
+        core._build_index(path, s_cols, o_cols)
+    result["build_ms"] = round((time.perf_counter() - start) * 1000, 2)
+
+    # Separate pass: tracemalloc slows allocation too much to share with the timing run
+    tracemalloc.start()
+    built = [core._build_index(path, s_cols, o_cols) for _, path, s_cols, o_cols in sources]
+    current, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    result["build_peak_mb"] = round(peak / 2**20, 2)
+    result["index_resident_mb"] = round(current / 2**20, 2)
+    del built
+
+    for _, path, s_cols, o_cols in sources:
+        core._load_index(path, s_cols, o_cols)  # persist indexes the cold start didn't touch
+    start = time.perf_counter()
+    for _, path, s_cols, o_cols in sources:
+        core._load_index(path, s_cols, o_cols)
+    result["load_ms"] = round((time.perf_counter() - start) * 1000, 2)
+    result["index_disk_kb"] = round(sum(p.stat().st_size for p in index_dir.glob("*.idx")) / 1024, 1)
+
+    # Warm up: index cache, fuzzy vocabularies and the unified index are built on first use
+    core.preload_indexes()
+    core.search(partial[0], first, fuzzy=True)
+    core.search_all(exact[0])
+    result["query_exact"] = time_queries(lambda q: core.search(q, first), exact)
+    result["query_fuzzy"] = time_queries(lambda q: core.search(q, first, fuzzy=True), partial)
+    result["search_all"] = time_queries(lambda q: core.search_all(q), exact)
+
+    bm25 = core._get_index(sources[0][1], sources[0][2], sources[0][3])["bm25"]
+    start = time.perf_counter()
+    bm25.score_batch(exact, MAX_RESULTS)
+    elapsed = time.perf_counter() - start
+    result["batch_qps"] = round(len(exact) / elapsed, 1) if elapsed else None
+    result["bm25_class"] = type(bm25).__name__
+    return result
+
+
+def main():
+    parser = argparse.ArgumentParser(description="UI Pro Max search benchmark")
+    parser.add_argument("--sizes", type=int, nargs="+", default=[100, 10000, 100000], help="Rows per CSV")
+    parser.add_argument("--domains", nargs="+", choices=list(CSV_CONFIG), default=list(CSV_CONFIG), help="Domains to generate")
+    parser.add_argument("--backends", nargs="+", choices=["python", "numpy"], default=["python", "numpy"])
+    parser.add_argument("--queries", type=int, default=200, help="Queries per latency measurement")
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--output", "-o", default="bench_results.json", help="JSON results file")
+    args = parser.parse_args()
+
+    backends = [b for b in args.backends if b == "python" or core.np is not None]
+    vocabulary = _vocabulary(args.domains)
+    exact, partial = make_queries(vocabulary, args.queries, args.seed)
+    report = {
+        "meta": {
+            "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "numpy": getattr(core.np, "__version__", None),
+            "tokenizer": core.TOKENIZER,
+            "domains": args.domains,
+            "queries": args.queries,
+            "seed": args.seed
+        },
+        "results": []
+    }
+
+    with tempfile.TemporaryDirectory(prefix="uipro-bench-") as tmp:
+        for size in args.sizes:
+            data_dir = Path(tmp) / f"data-{size}"
+            start = time.perf_counter()
+            generate_corpus(data_dir, args.domains, size, vocabulary, args.seed)
+            generate_s = round(time.perf_counter() - start, 2)
+            for backend in backends:
+                result = bench_backend(data_dir, Path(tmp) / f"index-{size}-{backend}", args.domains, backend, exact, partial)
+                result.update(rows=size, generate_s=generate_s)
+                report["results"].append(result)
+                print(f"{size:>7} rows {backend:>6}: build {result['build_ms']}ms, load {result['load_ms']}ms, "
+                      f"cold {result['cold_start_ms']}ms, p50 {result['query_exact']['p50_ms']}ms, "
+                      f"p99 {result['query_exact']['p99_ms']}ms, batch {result['batch_qps']} q/s", flush=True)
+
+    with open(args.output, "w", encoding="utf-8") as f:
+        json.dump(report, f, indent=2, ensure_ascii=False)
+    print(f"Results written to {args.output}")
+
+
+if __name__ == "__main__":
+    main()
@@ -5,15 +5,41 @@ UI/UX Pro Max Core - BM25 search engine for UI/UX style guides
 """
 
 import csv
+import hashlib
+import heapq
+import os
+import pickle
 import re
+import zlib
+from array import array
 from pathlib import Path
 from math import log
-from collections import defaultdict
+from collections import Counter, defaultdict
+from itertools import accumulate, chain
+
+try:
+    import numpy as np
+except ImportError:  # optional: only the vectorized BM25 backend needs it
+    np = None
 
 # ============ CONFIGURATION ============
-DATA_DIR = Path(__file__).parent.parent / "data"
+DATA_DIR = Path(os.environ.get("UIPRO_DATA_DIR", Path(__file__).parent.parent / "data"))
+INDEX_DIR = Path(os.environ.get("UIPRO_INDEX_DIR", Path(__file__).parent.parent / ".index"))
+INDEX_VERSION = 3
 MAX_RESULTS = 3
 
+# Tokenizer: "cjk" adds character bigrams for Chinese/Japanese/Korean runs, "latin" is whitespace only
+TOKENIZER = os.environ.get("UIPRO_TOKENIZER", "cjk")
+
+# BM25 backend: "python", "numpy", or "auto" (numpy for corpora of VECTOR_MIN_DOCS+ rows when installed)
+BM25_BACKEND = os.environ.get("UIPRO_BM25_BACKEND", "auto")
+VECTOR_MIN_DOCS = 2000
+
+# Fuzzy query expansion: completions per partial token, and weights relative to an exact match
+PREFIX_LIMIT = 5
+FUZZY_LIMIT = 3
+FUZZY_WEIGHT = 0.5
+
 CSV_CONFIG = {
     "style": {
         "file": "styles.csv",
@@ -77,67 +103,396 @@ _STACK_COLS = {
 AVAILABLE_STACKS = list(STACK_CONFIG.keys())
 
 
+# ============ VOCABULARY ============
+class Vocabulary:
+    """
+    Character trie over index terms, for search-as-you-type:
+    prefix completion ("typog" -> typography) and bounded Levenshtein
+    lookup ("glasmorphism" -> glassmorphism). The edit-distance walk
+    prunes any branch whose best DP cell already exceeds the bound.
+    """
+
+    _END = ""  # key marking a complete term; never collides with a character
+
+    def __init__(self, terms):
+        self.root = {}
+        for term in sorted(terms):
+            node = self.root
+            for ch in term:
+                node = node.setdefault(ch, {})
+            node[self._END] = term
+
+    def complete(self, prefix, limit=PREFIX_LIMIT):
+        """Up to `limit` terms starting with prefix, shortest first"""
+        node = self.root
+        for ch in prefix:
+            node = node.get(ch)
+            if node is None:
+                return []
+        found, frontier = [], [node]
+        while frontier and len(found) < limit:
+            next_frontier = []
+            for current in frontier:
+                for ch, child in current.items():
+                    if ch == self._END:
+                        found.append(child)
+                    else:
+                        next_frontier.append(child)
+            frontier = next_frontier
+        return found[:limit]
+
+    def within(self, word, max_edits):
+        """[(term, distance)] for terms within max_edits of word, closest first"""
+        found = []
+        first_row = list(range(len(word) + 1))
+        stack = [(child, ch, first_row) for ch, child in self.root.items() if ch != self._END]
+        while stack:
+            node, ch, prev_row = stack.pop()
+            row = [prev_row[0] + 1]
+            for i in range(1, len(word) + 1):
+                row.append(min(row[i - 1] + 1, prev_row[i] + 1, prev_row[i - 1] + (word[i - 1] != ch)))
+            if self._END in node and row[-1] <= max_edits:
+                found.append((node[self._END], row[-1]))
+            if min(row) <= max_edits:
+                stack.extend((child, next_ch, row) for next_ch, child in node.items() if next_ch != self._END)
+        return sorted(found, key=lambda x: (x[1], x[0]))
+
+
+def expand_token(token, known_terms, vocabulary):
+    """
+    Map one query token to weighted index terms: an exact term as is, else
+    prefix completions (weighted by how much of the term was typed), else
+    near misses within 1 edit (2 for tokens of 6+ chars) at FUZZY_WEIGHT per edit.
+    """
+    if token in known_terms:
+        return [(token, 1.0)]
+    completions = vocabulary.complete(token)
+    if completions:
+        return [(term, 0.5 + 0.5 * len(token) / len(term)) for term in completions]
+    max_edits = 1 if len(token) < 6 else 2
+    return [(term, FUZZY_WEIGHT ** distance) for term, distance in vocabulary.within(token, max_edits)[:FUZZY_LIMIT]]
+
+
 # ============ BM25 IMPLEMENTATION ============
-class BM25:
-    """BM25 ranking algorithm for text search"""
+_NON_WORD = re.compile(r'[^\w\s]')
+# Hiragana/katakana, CJK unified ideographs (+ext A, compatibility), Hangul syllables
+_CJK_CHARS = '\u3040-\u30ff\u3400-\u4dbf\u4e00-\u9fff\uf900-\ufaff\uac00-\ud7af'
+_CJK_CHAR = re.compile(f'[{_CJK_CHARS}]')
+# Runs of 3+ other word characters (CJK splits words like "abc中文def"),
+# overlapping CJK bigrams (zero-width lookahead), and lone CJK characters
+_NON_CJK_WORD = re.compile(f'[^\\s{_CJK_CHARS}]{{3,}}')
+_CJK_BIGRAM = re.compile(f'(?=([{_CJK_CHARS}]{{2}}))')
+_CJK_SINGLE = re.compile(f'(?<![{_CJK_CHARS}])[{_CJK_CHARS}](?![{_CJK_CHARS}])')
+
 
-    def __init__(self, k1=1.5, b=0.75):
+class BM25:
+    """
+    BM25 ranking algorithm for text search.
+    Terms are interned to integer ids; postings are stored CSR-style in flat
+    arrays (post_ptr[term_id]..post_ptr[term_id + 1] indexes post_docs/post_tfs),
+    so the index holds each term string once and pickles as raw bytes.
+    """
+
+    def __init__(self, k1=1.5, b=0.75, tokenizer=None):
         self.k1 = k1
         self.b = b
-        self.corpus = []
-        self.doc_lengths = []
+        self.tokenizer = tokenizer or TOKENIZER
+        self.term_ids = {}
+        self.terms = []
+        self.post_ptr = array('q', [0])
+        self.post_docs = array('i')
+        self.post_tfs = array('i')
+        self.idf = array('d')
+        self.doc_lengths = array('i')
+        self.doc_norms = array('d')
         self.avgdl = 0
-        self.idf = {}
-        self.doc_freqs = defaultdict(int)
         self.N = 0
+        self._vocabulary = None
 
     def tokenize(self, text):
-        """Lowercase, split, remove punctuation, filter short words"""
-        text = re.sub(r'[^\w\s]', ' ', str(text).lower())
-        return [w for w in text.split() if len(w) > 2]
+        """
+        Lowercase, split, remove punctuation, filter short words.
+        In "cjk" mode CJK runs become overlapping character bigrams (a lone
+        character stays a unigram), since they have no spaces and every
+        word is short; Latin words are filtered exactly as in "latin" mode.
+        """
+        text = _NON_WORD.sub(' ', str(text).lower())
+        if self.tokenizer != "cjk" or not _CJK_CHAR.search(text):
+            return [w for w in text.split() if len(w) > 2]
+
+        # Token order is irrelevant to BM25, so each kind is collected by one C-level findall
+        return _NON_CJK_WORD.findall(text) + _CJK_BIGRAM.findall(text) + _CJK_SINGLE.findall(text)
 
     def fit(self, documents):
-        """Build BM25 index from documents"""
-        self.corpus = [self.tokenize(doc) for doc in documents]
-        self.N = len(self.corpus)
+        """Build the inverted index: intern terms, then flatten per-term (doc, tf) lists into arrays"""
+        term_ids = {}
+        doc_lists, tf_lists = [], []
+        self.doc_lengths = array('i')
+
+        for idx, doc in enumerate(documents):
+            tokens = self.tokenize(doc)
+            self.doc_lengths.append(len(tokens))
+            for word, tf in Counter(tokens).items():
+                term_id = term_ids.get(word)
+                if term_id is None:
+                    term_id = term_ids[word] = len(term_ids)
+                    doc_lists.append([])
+                    tf_lists.append([])
+                doc_lists[term_id].append(idx)
+                tf_lists[term_id].append(tf)
+
+        self.term_ids = term_ids
+        self.terms = list(term_ids)
+        self.post_ptr = array('q', [0])
+        self.post_ptr.extend(accumulate(len(docs) for docs in doc_lists))
+        self.post_docs = array('i', chain.from_iterable(doc_lists))
+        self.post_tfs = array('i', chain.from_iterable(tf_lists))
+
+        self.N = len(self.doc_lengths)
+        self._vocabulary = None
         if self.N == 0:
             return
-        self.doc_lengths = [len(doc) for doc in self.corpus]
         self.avgdl = sum(self.doc_lengths) / self.N
+        self._compute_norms()
+        self.idf = array('d', (log((self.N - len(docs) + 0.5) / (len(docs) + 0.5) + 1) for docs in doc_lists))
+
+    def _compute_norms(self):
+        """Per-document length normalization, the tf-independent part of the denominator"""
+        # A corpus whose documents all tokenize to nothing has avgdl 0; no term can match, any norm works
+        self.doc_norms = array('d', (self.k1 * (1 - self.b + self.b * (dl / self.avgdl if self.avgdl else 0))
+                                     for dl in self.doc_lengths))
+
+    def postings(self, term_id):
+        """(doc ids, term freqs) of one term as zero-copy memoryviews"""
+        start, end = self.post_ptr[term_id], self.post_ptr[term_id + 1]
+        return memoryview(self.post_docs)[start:end], memoryview(self.post_tfs)[start:end]
+
+    def term_idf(self, term, default=0.0):
+        term_id = self.term_ids.get(term)
+        return default if term_id is None else self.idf[term_id]
+
+    @property
+    def vocabulary(self):
+        """Trie over the index terms, built on first fuzzy query"""
+        if self._vocabulary is None:
+            self._vocabulary = Vocabulary(self.terms)
+        return self._vocabulary
+
+    def query_terms(self, query, fuzzy=False):
+        """[(term_id, weight)] to score; fuzzy expands partial and misspelled tokens"""
+        terms = []
+        for token in self.tokenize(query):
+            if fuzzy:
+                terms.extend((self.term_ids[term], weight)
+                             for term, weight in expand_token(token, self.term_ids, self.vocabulary))
+            elif token in self.term_ids:
+                terms.append((self.term_ids[token], 1.0))
+        return terms
+
+    def score(self, query, top_k=None, fuzzy=False):
+        """
+        Score documents matching the query, best first.
+        Only posting lists of query terms are visited; documents without any
+        query term (score 0) are not returned. With top_k, a heap selects the
+        best k instead of sorting every match. Ties keep document order.
+        """
+        scores = defaultdict(float)
+        k1_plus_1 = self.k1 + 1
+        norms = self.doc_norms
+
+        for term_id, weight in self.query_terms(query, fuzzy):
+            idf = self.idf[term_id]
+            docs, tfs = self.postings(term_id)
+            for idx, tf in zip(docs, tfs):
+                scores[idx] += weight * (idf * (tf * k1_plus_1) / (tf + norms[idx]))
+
+        key = lambda x: (x[1], -x[0])
+        if top_k is None:
+            return sorted(scores.items(), key=key, reverse=True)
+        return heapq.nlargest(top_k, scores.items(), key=key)
+
+    def score_batch(self, queries, top_k=None, fuzzy=False):
+        """Score several queries; one ranked list per query"""
+        return [self.score(query, top_k, fuzzy) for query in queries]
+
+    def to_state(self):
+        """Export fitted index as plain data for persistence"""
+        return {
+            "k1": self.k1,
+            "b": self.b,
+            "tokenizer": self.tokenizer,
+            "terms": self.terms,
+            "post_ptr": self.post_ptr,
+            "post_docs": self.post_docs,
+            "post_tfs": self.post_tfs,
+            "idf": self.idf,
+            "doc_lengths": self.doc_lengths,
+            "avgdl": self.avgdl,
+            "N": self.N
+        }
+
+    @classmethod
+    def from_state(cls, state):
+        """Restore a fitted index without re-tokenizing"""
+        bm25 = cls(state["k1"], state["b"], state["tokenizer"])
+        bm25.terms = state["terms"]
+        bm25.term_ids = {term: i for i, term in enumerate(bm25.terms)}
+        bm25.post_ptr = state["post_ptr"]
+        bm25.post_docs = state["post_docs"]
+        bm25.post_tfs = state["post_tfs"]
+        bm25.idf = state["idf"]
+        bm25.doc_lengths = state["doc_lengths"]
+        bm25.avgdl = state["avgdl"]
+        bm25.N = state["N"]
+        if bm25.N:
+            bm25._compute_norms()
+        return bm25
+
+
+class VectorBM25(BM25):
+    """
+    BM25 with NumPy scoring for large corpora. The CSR posting arrays are
+    wrapped without copying as a term-major matrix (indptr/indices, one row
+    per term) plus final BM25 term weights, so a query is a sum of sparse rows
+    and a batch of queries is one bincount. Rankings equal the pure-Python backend.
+    """
 
-        for doc in self.corpus:
-            seen = set()
-            for word in doc:
-                if word not in seen:
-                    self.doc_freqs[word] += 1
-                    seen.add(word)
-
-        for word, freq in self.doc_freqs.items():
-            self.idf[word] = log((self.N - freq + 0.5) / (freq + 0.5) + 1)
-
-    def score(self, query):
-        """Score all documents against query"""
-        query_tokens = self.tokenize(query)
-        scores = []
-
-        for idx, doc in enumerate(self.corpus):
-            score = 0
-            doc_len = self.doc_lengths[idx]
-            term_freqs = defaultdict(int)
-            for word in doc:
-                term_freqs[word] += 1
-
-            for token in query_tokens:
-                if token in self.idf:
-                    tf = term_freqs[token]
-                    idf = self.idf[token]
-                    numerator = tf * (self.k1 + 1)
-                    denominator = tf + self.k1 * (1 - self.b + self.b * doc_len / self.avgdl)
-                    score += idf * numerator / denominator
-
-            scores.append((idx, score))
-
-        return sorted(scores, key=lambda x: x[1], reverse=True)
+    def fit(self, documents):
+        super().fit(documents)
+        self._build_matrix()
+
+    @classmethod
+    def from_state(cls, state):
+        bm25 = super().from_state(state)
+        bm25._build_matrix()
+        return bm25
+
+    def _build_matrix(self):
+        self.indptr = np.frombuffer(self.post_ptr, dtype=np.int64)
+        self.indices = np.frombuffer(self.post_docs, dtype=np.int32)
+        tfs = np.frombuffer(self.post_tfs, dtype=np.int32).astype(np.float64)
+        idfs = np.repeat(np.frombuffer(self.idf, dtype=np.float64), np.diff(self.indptr)) if self.N else np.empty(0)
+
+        # Same operation order as BM25.score(), so scores match bit for bit
+        norms = np.frombuffer(self.doc_norms, dtype=np.float64) if self.N else np.empty(0)
+        self.weights = idfs * (tfs * (self.k1 + 1)) / (tfs + norms[self.indices])
+
+    def _term_rows(self, query, fuzzy=False):
+        """(CSR row slice, weight) per query term, repeated tokens included"""
+        return [(slice(self.indptr[term_id], self.indptr[term_id + 1]), weight)
+                for term_id, weight in self.query_terms(query, fuzzy)]
+
+    def _top(self, scores, top_k):
+        """Matching docs best first, ties by doc order; argpartition narrows to top_k first"""
+        if top_k is not None and top_k <= 0:
+            return []  # heapq.nlargest returns [] here; order[:top_k] would not
+        candidates = np.flatnonzero(scores)
+        if top_k is not None and top_k < len(candidates):
+            kth = -np.partition(-scores[candidates], top_k - 1)[top_k - 1]
+            candidates = candidates[scores[candidates] >= kth]
+        order = np.lexsort((candidates, -scores[candidates]))
+        if top_k is not None:
+            order = order[:top_k]
+        return [(int(candidates[i]), float(scores[candidates[i]])) for i in order]
+
+    def score(self, query, top_k=None, fuzzy=False):
+        scores = np.zeros(self.N, dtype=np.float64)
+        for rows, weight in self._term_rows(query, fuzzy):
+            scores[self.indices[rows]] += weight * self.weights[rows]
+        return self._top(scores, top_k)
+
+    def score_batch(self, queries, top_k=None, fuzzy=False):
+        """Score all queries with a single bincount over (query, doc) cells"""
+        cells, weights = [], []
+        for query_idx, query in enumerate(queries):
+            for rows, weight in self._term_rows(query, fuzzy):
+                cells.append(self.indices[rows].astype(np.int64) + query_idx * self.N)
+                weights.append(weight * self.weights[rows])
+        if not cells:
+            return [[] for _ in queries]
+        scores = np.bincount(np.concatenate(cells), np.concatenate(weights), minlength=len(queries) * self.N)
+        return [self._top(row, top_k) for row in scores.reshape(len(queries), self.N)]
+
+
+def _bm25_class(n_docs):
+    """Pick the BM25 backend for a corpus size according to BM25_BACKEND"""
+    if np is not None and (BM25_BACKEND == "numpy" or (BM25_BACKEND == "auto" and n_docs >= VECTOR_MIN_DOCS)):
+        return VectorBM25
+    return BM25
+
+
+# ============ UNIFIED INDEX ============
+class UnifiedIndex:
+    """
+    Every domain and stack merged into one inverted index for cross-domain search.
+    Postings hold precomputed BM25 term weights, using each source's own IDF and
+    length normalization, so one pass over the query terms scores all sources.
+    Raw scores are divided by the source's best achievable score for the query,
+    which puts small and large CSVs on the same 0-1 scale.
+    """
+
+    def __init__(self, sources):
+        """sources: list of (name, file, bm25, rows)"""
+        self.sources = [(name, file, rows) for name, file, _, rows in sources]
+        self.source_bm25 = [bm25 for _, _, bm25, _ in sources]
+        self.doc_refs = []
+        postings = defaultdict(list)
+
+        for source_idx, (_, _, bm25, _) in enumerate(sources):
+            offset = len(self.doc_refs)
+            self.doc_refs.extend((source_idx, local_idx) for local_idx in range(bm25.N))
+            k1_plus_1 = bm25.k1 + 1
+            for term_id, term in enumerate(bm25.terms):
+                idf = bm25.idf[term_id]
+                docs, tfs = bm25.postings(term_id)
+                postings[term].extend(
+                    (offset + idx, idf * (tf * k1_plus_1) / (tf + bm25.doc_norms[idx])) for idx, tf in zip(docs, tfs)
+                )
+
+        self.postings = dict(postings)
+        self._vocabulary = None
+        # Upper bound per source and term: idf * (k1 + 1); unseen terms get the source's max IDF
+        self.max_idf = [log((bm25.N + 0.5) / 0.5 + 1) for bm25 in self.source_bm25]
+
+    @property
+    def vocabulary(self):
+        if self._vocabulary is None:
+            self._vocabulary = Vocabulary(self.postings)
+        return self._vocabulary
+
+    def score(self, query, top_k, fuzzy=False):
+        """Return [(global_doc, normalized_score)] best first"""
+        if not self.source_bm25:
+            return []
+        # One group of weighted terms per query token; a token's bound is its best expansion
+        groups = []
+        for token in self.source_bm25[0].tokenize(query):
+            if fuzzy:
+                group = expand_token(token, self.postings, self.vocabulary)
+            else:
+                group = [(token, 1.0)] if token in self.postings else []
+            if group:
+                groups.append(group)
+        if not groups:
+            return []
+
+        bounds = []
+        for source_idx, bm25 in enumerate(self.source_bm25):
+            k1_plus_1 = bm25.k1 + 1
+            bounds.append(sum(
+                max(weight * k1_plus_1 * bm25.term_idf(term, self.max_idf[source_idx]) for term, weight in group)
+                for group in groups
+            ))
+
+        scores = defaultdict(float)
+        for group in groups:
+            for term, term_weight in group:
+                for doc, weight in self.postings[term]:
+                    scores[doc] += term_weight * weight
+
+        doc_refs = self.doc_refs
+        normalized = ((doc, raw / bounds[doc_refs[doc][0]]) for doc, raw in scores.items())
+        return heapq.nlargest(top_k, normalized, key=lambda x: (x[1], -x[0]))
 
 
 # ============ SEARCH FUNCTIONS ============
@@ -147,29 +502,162 @@ def _load_csv(filepath):
         return list(csv.DictReader(f))
 
 
-def _search_csv(filepath, search_cols, output_cols, query, max_results):
-    """Core search function using BM25"""
-    if not filepath.exists():
-        return []
+# ============ PERSISTENT INDEX ============
+def _file_hash(filepath):
+    """Content hash, used when mtime changed but the file may not have"""
+    return hashlib.sha1(filepath.read_bytes()).hexdigest()
 
+
+def _index_path(filepath):
+    """One index file per CSV, e.g. stacks/react.csv -> stacks__react.idx"""
+    try:
+        relative = filepath.relative_to(DATA_DIR)
+    except ValueError:
+        relative = Path(filepath.name)
+    return INDEX_DIR / (relative.with_suffix("").as_posix().replace("/", "__") + ".idx")
+
+
+def _build_index(filepath, search_cols, output_cols):
+    """Parse CSV, fit BM25 and keep only the output columns of each row"""
     data = _load_csv(filepath)
 
     # Build documents from search columns
     documents = [" ".join(str(row.get(col, "")) for col in search_cols) for row in data]
 
-    # BM25 search
-    bm25 = BM25()
+    bm25 = _bm25_class(len(documents))()
     bm25.fit(documents)
-    ranked = bm25.score(query)
+    rows = [{col: row.get(col, "") for col in output_cols if col in row} for row in data]
+    return {"bm25": bm25, "rows": rows}
+
+
+def _save_index(index_file, payload):
+    """Write compressed index atomically; a read-only checkout just skips caching"""
+    try:
+        index_file.parent.mkdir(parents=True, exist_ok=True)
+        tmp_file = index_file.with_suffix(f".tmp{os.getpid()}")
+        tmp_file.write_bytes(zlib.compress(pickle.dumps(payload, pickle.HIGHEST_PROTOCOL), 1))
+        os.replace(tmp_file, index_file)
+    except OSError:
+        pass
+
+
+def _load_index(filepath, search_cols, output_cols):
+    """
+    Load the persisted index for a CSV, rebuilding it only when stale.
+    Stale means different format version or columns, or a changed file:
+    mtime/size are checked first, the content hash only when they differ.
+    """
+    index_file = _index_path(filepath)
+    stat = filepath.stat()
+    columns = (tuple(search_cols), tuple(output_cols))
+
+    payload = None
+    try:
+        payload = pickle.loads(zlib.decompress(index_file.read_bytes()))
+    except (OSError, zlib.error, pickle.UnpicklingError, EOFError, AttributeError, ValueError):
+        pass
+
+    if (payload and payload.get("version") == INDEX_VERSION and payload.get("columns") == columns
+            and payload["bm25"]["tokenizer"] == TOKENIZER):
+        if (payload["mtime_ns"], payload["size"]) == (stat.st_mtime_ns, stat.st_size):
+            return {"bm25": _bm25_class(payload["bm25"]["N"]).from_state(payload["bm25"]), "rows": payload["rows"]}
+        if payload["sha1"] == _file_hash(filepath):
+            # Touched but unchanged (e.g. git checkout): refresh the stamp only
+            payload["mtime_ns"], payload["size"] = stat.st_mtime_ns, stat.st_size
+            _save_index(index_file, payload)
+            return {"bm25": _bm25_class(payload["bm25"]["N"]).from_state(payload["bm25"]), "rows": payload["rows"]}
+
+    index = _build_index(filepath, search_cols, output_cols)
+    _save_index(index_file, {
+        "version": INDEX_VERSION,
+        "columns": columns,
+        "mtime_ns": stat.st_mtime_ns,
+        "size": stat.st_size,
+        "sha1": _file_hash(filepath),
+        "bm25": index["bm25"].to_state(),
+        "rows": index["rows"]
+    })
+    return index
+
+
+# Loaded indexes kept for the life of the process: filepath -> (mtime_ns, size, index)
+_INDEX_CACHE = {}
+
+
+def _get_index(filepath, search_cols, output_cols):
+    """Return the in-memory index for a CSV, loading it once per process (re-checked by stat)"""
+    stat = filepath.stat()
+    cached = _INDEX_CACHE.get(filepath)
+    if cached and cached[:2] == (stat.st_mtime_ns, stat.st_size):
+        return cached[2]
+    index = _load_index(filepath, search_cols, output_cols)
+    _INDEX_CACHE[filepath] = (stat.st_mtime_ns, stat.st_size, index)
+    return index
+
+
+def _all_sources():
+    """(name, filepath, search_cols, output_cols) for every domain and stack CSV"""
+    sources = [(domain, DATA_DIR / config["file"], config["search_cols"], config["output_cols"])
+               for domain, config in CSV_CONFIG.items()]
+    sources += [(f"stack:{stack}", DATA_DIR / config["file"], _STACK_COLS["search_cols"], _STACK_COLS["output_cols"])
+                for stack, config in STACK_CONFIG.items()]
+    return sources
+
+
+def preload_indexes():
+    """Load every domain and stack index into the process cache; returns loaded names"""
+    loaded = []
+    for name, filepath, search_cols, output_cols in _all_sources():
+        if filepath.exists():
+            _get_index(filepath, search_cols, output_cols)
+            loaded.append(name)
+    return loaded
+
+
+def refresh_indexes():
+    """Reload cached indexes whose CSV changed on disk; returns reloaded names"""
+    reloaded = []
+    for name, filepath, search_cols, output_cols in _all_sources():
+        cached = _INDEX_CACHE.get(filepath)
+        if not cached or not filepath.exists():
+            continue
+        stat = filepath.stat()
+        if cached[:2] != (stat.st_mtime_ns, stat.st_size):
+            _get_index(filepath, search_cols, output_cols)
+            reloaded.append(name)
+    return reloaded
+
+
+# Unified index with the identities of the per-source indexes it was built from
+_UNIFIED_CACHE = {"key": None, "index": None}
+
+
+def _get_unified_index():
+    """Build the cross-domain index from cached per-source indexes; rebuilt when any source reloads"""
+    sources = []
+    for name, filepath, search_cols, output_cols in _all_sources():
+        if filepath.exists():
+            index = _get_index(filepath, search_cols, output_cols)
+            sources.append((name, filepath.relative_to(DATA_DIR).as_posix(), index["bm25"], index["rows"]))
+
+    key = tuple(id(bm25) for _, _, bm25, _ in sources)
+    if _UNIFIED_CACHE["key"] != key:
+        _UNIFIED_CACHE["index"] = UnifiedIndex(sources)
+        _UNIFIED_CACHE["key"] = key
+    return _UNIFIED_CACHE["index"]
+
+
+def _search_csv(filepath, search_cols, output_cols, query, max_results, fuzzy=False):
+    """Core search function using BM25"""
+    if not filepath.exists():
+        return []
 
-    # Get top results with score > 0
-    results = []
-    for idx, score in ranked[:max_results]:
-        if score > 0:
-            row = data[idx]
-            results.append({col: row.get(col, "") for col in output_cols if col in row})
+    index = _get_index(filepath, search_cols, output_cols)
+    ranked = index["bm25"].score(query, top_k=max_results, fuzzy=fuzzy)
 
-    return results
+    # Get top results with score > 0
+    rows = index["rows"]
+    return [rows[idx] for idx, score in ranked if score > 0]
 
 
 def detect_domain(query):
@@ -192,8 +680,8 @@ def detect_domain(query):
     return best if scores[best] > 0 else "style"
 
 
-def search(query, domain=None, max_results=MAX_RESULTS):
-    """Main search function with auto-domain detection"""
+def search(query, domain=None, max_results=MAX_RESULTS, fuzzy=False):
+    """Main search function with auto-domain detection; fuzzy enables prefix/typo expansion"""
     if domain is None:
         domain = detect_domain(query)
 
@@ -203,7 +691,7 @@ def search(query, domain=None, max_results=MAX_RESULTS):
     if not filepath.exists():
         return {"error": f"File not found: {filepath}", "domain": domain}
 
-    results = _search_csv(filepath, config["search_cols"], config["output_cols"], query, max_results)
+    results = _search_csv(filepath, config["search_cols"], config["output_cols"], query, max_results, fuzzy)
 
     return {
         "domain": domain,
@@ -214,7 +702,7 @@ def search(query, domain=None, max_results=MAX_RESULTS):
     }
 
 
-def search_stack(query, stack, max_results=MAX_RESULTS):
+def search_stack(query, stack, max_results=MAX_RESULTS, fuzzy=False):
     """Search stack-specific guidelines"""
     if stack not in STACK_CONFIG:
         return {"error": f"Unknown stack: {stack}. Available: {', '.join(AVAILABLE_STACKS)}"}
@@ -224,7 +712,7 @@ def search_stack(query, stack, max_results=MAX_RESULTS):
     if not filepath.exists():
         return {"error": f"Stack file not found: {filepath}", "stack": stack}
 
-    results = _search_csv(filepath, _STACK_COLS["search_cols"], _STACK_COLS["output_cols"], query, max_results)
+    results = _search_csv(filepath, _STACK_COLS["search_cols"], _STACK_COLS["output_cols"], query, max_results, fuzzy)
 
     return {
         "domain": "stack",
@@ -234,3 +722,22 @@ def search_stack(query, stack, max_results=MAX_RESULTS):
         "count": len(results),
         "results": results
     }
+
+
+def search_all(query, k=MAX_RESULTS, fuzzy=False):
+    """Search every domain and stack at once, returning hits tagged with their source"""
+    unified = _get_unified_index()
+    results = []
+    for doc, score in unified.score(query, k, fuzzy):
+        source_idx, local_idx = unified.doc_refs[doc]
+        name, file, rows = unified.sources[source_idx]
+        hit = {"domain": "stack", "stack": name[len("stack:"):]} if name.startswith("stack:") else {"domain": name}
+        hit.update({"file": file, "score": round(score, 4), "row": rows[local_idx]})
+        results.append(hit)
+
+    return {
+        "domain": "all",
+        "query": query,
+        "count": len(results),
+        "results": results
+    }
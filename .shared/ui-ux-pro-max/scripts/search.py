@@ -1,61 +1,144 @@
-#!/usr/bin/env python3
-# -*- coding: utf-8 -*-
-"""
-UI/UX Pro Max Search - BM25 search engine for UI/UX style guides
-Usage: python search.py "<query>" [--domain <domain>] [--stack <stack>] [--max-results 3]
-
-Domains: style, prompt, color, chart, landing, product, ux, typography
-Stacks: html-tailwind, react, nextjs
-"""
-
-import argparse
-from core import CSV_CONFIG, AVAILABLE_STACKS, MAX_RESULTS, search, search_stack
-
-
-def format_output(result):
-    """Format results for Claude consumption (token-optimized)"""
-    if "error" in result:
-        return f"Error: {result['error']}"
-
-    output = []
-    if result.get("stack"):
-        output.append(f"## UI Pro Max Stack Guidelines")
-        output.append(f"**Stack:** {result['stack']} | **Query:** {result['query']}")
-    else:
-        output.append(f"## UI Pro Max Search Results")
-        output.append(f"**Domain:** {result['domain']} | **Query:** {result['query']}")
-    output.append(f"**Source:** {result['file']} | **Found:** {result['count']} results\n")
-
-    for i, row in enumerate(result['results'], 1):
-        output.append(f"### Result {i}")
-        for key, value in row.items():
-            value_str = str(value)
-            if len(value_str) > 300:
-                value_str = value_str[:300] + "..."
-            output.append(f"- **{key}:** {value_str}")
-        output.append("")
-
-    return "\n".join(output)
-
-
-if __name__ == "__main__":
-    parser = argparse.ArgumentParser(description="UI Pro Max Search")
-    parser.add_argument("query", help="Search query")
-    parser.add_argument("--domain", "-d", choices=list(CSV_CONFIG.keys()), help="Search domain")
-    parser.add_argument("--stack", "-s", choices=AVAILABLE_STACKS, help="Stack-specific search (html-tailwind, react, nextjs)")
-    parser.add_argument("--max-results", "-n", type=int, default=MAX_RESULTS, help="Max results (default: 3)")
-    parser.add_argument("--json", action="store_true", help="Output as JSON")
-
-    args = parser.parse_args()
-
-    # Stack search takes priority
-    if args.stack:
-        result = search_stack(args.query, args.stack, args.max_results)
-    else:
-        result = search(args.query, args.domain, args.max_results)
-
-    if args.json:
-        import json
-        print(json.dumps(result, indent=2, ensure_ascii=False))
-    else:
-        print(format_output(result))
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+UI/UX Pro Max Search - BM25 search engine for UI/UX style guides
+Usage: python search.py "<query>" [--domain <domain>] [--stack <stack>] [--max-results 3]
+       python search.py "<query>" --all   (every domain and stack, ranked together)
+       python search.py --batch queries.jsonl   (or --batch - for stdin)
+
+Domains: style, prompt, color, chart, landing, product, ux, typography
+Stacks: html-tailwind, react, nextjs
+"""
+
+import argparse
+import json
+import sys
+import time
+from core import CSV_CONFIG, AVAILABLE_STACKS, MAX_RESULTS, search, search_stack, search_all
+
+
+def format_output(result):
+    """Format results for Claude consumption (token-optimized)"""
+    if "error" in result:
+        return f"Error: {result['error']}"
+
+    output = []
+    if result.get("domain") == "all":
+        output.append(f"## UI Pro Max Search Results (all domains)")
+        output.append(f"**Query:** {result['query']} | **Found:** {result['count']} results\n")
+        for i, hit in enumerate(result['results'], 1):
+            source = f"stack/{hit['stack']}" if hit.get("stack") else hit['domain']
+            output.append(f"### Result {i} ({source}, score {hit['score']})")
+            output.extend(_format_row(hit['row']))
+            output.append("")
+        return "\n".join(output)
+
+    if result.get("stack"):
+        output.append(f"## UI Pro Max Stack Guidelines")
+        output.append(f"**Stack:** {result['stack']} | **Query:** {result['query']}")
+    else:
+        output.append(f"## UI Pro Max Search Results")
+        output.append(f"**Domain:** {result['domain']} | **Query:** {result['query']}")
+    output.append(f"**Source:** {result['file']} | **Found:** {result['count']} results\n")
+
+    for i, row in enumerate(result['results'], 1):
+        output.append(f"### Result {i}")
+        output.extend(_format_row(row))
+        output.append("")
+
+    return "\n".join(output)
+
+
+def _format_row(row):
+    """Render one result row as markdown bullets, truncating long values"""
+    lines = []
+    for key, value in row.items():
+        value_str = str(value)
+        if len(value_str) > 300:
+            value_str = value_str[:300] + "..."
+        lines.append(f"- **{key}:** {value_str}")
+    return lines
+
+
+def run_query(query, domain=None, stack=None, max_results=MAX_RESULTS, fuzzy=False):
+    """Dispatch one query; stack search takes priority, domain "all" searches everywhere"""
+    if stack:
+        return search_stack(query, stack, max_results, fuzzy)
+    if domain == "all":
+        return search_all(query, max_results, fuzzy)
+    return search(query, domain, max_results, fuzzy)
+
+
+def _parse_batch_item(item, default_max_results):
+    """Validate one decoded batch line, returning run_query arguments or raising ValueError"""
+    if not isinstance(item, dict):
+        raise ValueError("expected a JSON object")
+    query = item.get("query")
+    if not isinstance(query, str) or not query.strip():
+        raise ValueError("'query' must be a non-empty string")
+    for key in ("domain", "stack"):
+        if item.get(key) is not None and not isinstance(item[key], str):
+            raise ValueError(f"'{key}' must be a string")
+    max_results = item.get("max_results", default_max_results)
+    if isinstance(max_results, bool) or not isinstance(max_results, int):
+        raise ValueError("'max_results' must be an integer")
+    if max_results < 1:
+        raise ValueError("'max_results' must be at least 1")
+    return query, item.get("domain"), item.get("stack"), max_results, bool(item.get("fuzzy", False))
+
+
+def run_batch(lines, default_max_results=MAX_RESULTS):
+    """
+    Answer JSONL queries, yielding one JSONL result per input line.
+    Input: {"query": "...", "domain"?: "...|all", "stack"?: "...", "max_results"?: 3, "fuzzy"?: false, "id"?: ...}
+    Invalid lines yield {"error": ...}, keeping "id" whenever the line decoded to an object.
+    Indexes are loaded once by core and reused across all queries.
+    """
+    for line_no, line in enumerate(lines, 1):
+        line = line.strip()
+        if not line:
+            continue
+        start = time.perf_counter()
+        item = None
+        try:
+            item = json.loads(line)
+            result = run_query(*_parse_batch_item(item, default_max_results))
+        except (ValueError, TypeError, AttributeError) as e:
+            result = {"error": f"line {line_no}: {e}"}
+        if isinstance(item, dict) and "id" in item:
+            result = {"id": item["id"], **result}
+        result["latency_ms"] = round((time.perf_counter() - start) * 1000, 3)
+        yield json.dumps(result, ensure_ascii=False)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="UI Pro Max Search")
+    parser.add_argument("query", nargs="?", help="Search query")
+    parser.add_argument("--domain", "-d", choices=list(CSV_CONFIG.keys()), help="Search domain")
+    parser.add_argument("--stack", "-s", choices=AVAILABLE_STACKS, help="Stack-specific search (html-tailwind, react, nextjs)")
+    parser.add_argument("--max-results", "-n", type=int, default=MAX_RESULTS, help="Max results (default: 3)")
+    parser.add_argument("--all", "-a", action="store_true", help="Search all domains and stacks in one ranking")
+    parser.add_argument("--fuzzy", "-f", action="store_true", help="Expand partial and misspelled words (search-as-you-type)")
+    parser.add_argument("--json", action="store_true", help="Output as JSON")
+    parser.add_argument("--batch", "-b", metavar="FILE", help="Read JSONL queries from FILE ('-' for stdin), write JSONL results")
+
+    args = parser.parse_args()
+    if args.max_results < 1:
+        parser.error("--max-results must be at least 1")
+
+    if args.batch:
+        source = sys.stdin if args.batch == "-" else open(args.batch, encoding="utf-8")
+        with source:
+            for output_line in run_batch(source, args.max_results):
+                print(output_line, flush=True)
+        sys.exit(0)
+
+    if not args.query:
+        parser.error("query is required unless --batch is given")
+
+    result = run_query(args.query, "all" if args.all else args.domain, args.stack, args.max_results, args.fuzzy)
+
+    if args.json:
+        print(json.dumps(result, indent=2, ensure_ascii=False))
+    else:
+        print(format_output(result))
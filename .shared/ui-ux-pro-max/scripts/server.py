@@ -0,0 +1,153 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+UI/UX Pro Max Search Server - resident BM25 search with warm indexes
+Usage: python server.py [--host 127.0.0.1] [--port 8765] [--reload-interval 2]
+
+Endpoints (GET, JSON responses; add &fuzzy=1 to expand partial/misspelled words):
+  /search?q=<query>[&domain=<domain>][&n=3]
+  /search_stack?q=<query>&stack=<stack>[&n=3]
+  /search_all?q=<query>[&n=3]   every domain and stack in one ranking
+  /stats      request counts and latency percentiles per endpoint
+  /health
+"""
+
+import argparse
+import json
+import threading
+import time
+from collections import deque
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+
+import core
+from core import MAX_RESULTS, search, search_stack, search_all
+
+
+class LatencyStats:
+    """Thread-safe per-endpoint latency recorder over a bounded window of recent requests"""
+
+    def __init__(self, window=10000):
+        self.window = window
+        self.lock = threading.Lock()
+        self.samples = {}
+        self.counts = {}
+
+    def record(self, endpoint, latency_ms):
+        with self.lock:
+            self.samples.setdefault(endpoint, deque(maxlen=self.window)).append(latency_ms)
+            self.counts[endpoint] = self.counts.get(endpoint, 0) + 1
+
+    def snapshot(self):
+        with self.lock:
+            items = [(endpoint, sorted(samples), self.counts[endpoint]) for endpoint, samples in self.samples.items()]
+        result = {}
+        for endpoint, samples, count in items:
+            pick = lambda p: samples[min(len(samples) - 1, int(p * len(samples)))]
+            result[endpoint] = {
+                "count": count,
+                "window": len(samples),
+                "mean_ms": round(sum(samples) / len(samples), 4),
+                "p50_ms": round(pick(0.50), 4),
+                "p90_ms": round(pick(0.90), 4),
+                "p99_ms": round(pick(0.99), 4),
+                "max_ms": round(samples[-1], 4)
+            }
+        return result
+
+
+class SearchHandler(BaseHTTPRequestHandler):
+    """Routes GET requests to core search functions; the server holds stats and reload state"""
+
+    protocol_version = "HTTP/1.1"  # keep-alive, so clients skip a TCP handshake per query
+    disable_nagle_algorithm = True  # headers and body are separate writes; don't wait for delayed ACKs
+
+    def do_GET(self):
+        start = time.perf_counter()
+        url = urlparse(self.path)
+        params = {key: values[0] for key, values in parse_qs(url.query).items()}
+        endpoint = url.path.rstrip("/") or "/"
+
+        try:
+            max_results = int(params.get("n", MAX_RESULTS))
+        except ValueError:
+            return self._send(400, {"error": "n must be an integer"})
+        if max_results < 1:
+            return self._send(400, {"error": "n must be at least 1"})
+        fuzzy = params.get("fuzzy", "0") not in ("0", "false", "")
+
+        if endpoint == "/search":
+            if not params.get("q"):
+                return self._send(400, {"error": "missing q"})
+            status, body = 200, search(params["q"], params.get("domain"), max_results, fuzzy)
+        elif endpoint == "/search_stack":
+            if not params.get("q") or not params.get("stack"):
+                return self._send(400, {"error": "missing q or stack"})
+            status, body = 200, search_stack(params["q"], params["stack"], max_results, fuzzy)
+        elif endpoint == "/search_all":
+            if not params.get("q"):
+                return self._send(400, {"error": "missing q"})
+            status, body = 200, search_all(params["q"], max_results, fuzzy)
+        elif endpoint == "/stats":
+            return self._send(200, {
+                "uptime_s": round(time.time() - self.server.started_at, 1),
+                "indexes": self.server.loaded,
+                "reloads": self.server.reloads,
+                "endpoints": self.server.stats.snapshot()
+            })
+        elif endpoint == "/health":
+            return self._send(200, {"status": "ok"})
+        else:
+            return self._send(404, {"error": f"unknown endpoint: {endpoint}"})
+
+        self.server.stats.record(endpoint, (time.perf_counter() - start) * 1000)
+        self._send(status, body)
+
+    def _send(self, status, body):
+        payload = json.dumps(body, ensure_ascii=False).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json; charset=utf-8")
+        self.send_header("Content-Length", str(len(payload)))
+        self.end_headers()
+        self.wfile.write(payload)
+
+    def log_message(self, format, *args):
+        pass
+
+
+def watch_indexes(server, interval):
+    """Poll CSV files and hot-reload changed domains before the next request needs them"""
+    while True:
+        time.sleep(interval)
+        for name in core.refresh_indexes():
+            server.reloads[name] = server.reloads.get(name, 0) + 1
+            print(f"Reloaded index: {name}", flush=True)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="UI Pro Max Search Server")
+    parser.add_argument("--host", default="127.0.0.1", help="Bind address (default: 127.0.0.1)")
+    parser.add_argument("--port", "-p", type=int, default=8765, help="Port (default: 8765)")
+    parser.add_argument("--reload-interval", type=float, default=2.0, help="Seconds between CSV change checks (default: 2)")
+    args = parser.parse_args()
+
+    server = ThreadingHTTPServer((args.host, args.port), SearchHandler)
+    server.daemon_threads = True
+    server.started_at = time.time()
+    server.stats = LatencyStats()
+    server.reloads = {}
+    server.loaded = core.preload_indexes()
+
+    threading.Thread(target=watch_indexes, args=(server, args.reload_interval), daemon=True).start()
+
+    print(f"UI Pro Max search server on http://{args.host}:{args.port} ({len(server.loaded)} indexes loaded)", flush=True)
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+
+
+if __name__ == "__main__":
+    main()
@@ -7,6 +7,7 @@ const router = express.Router();
 const cleanupService = require('../services/cleanupService');
 const errorLogService = require('../services/errorLogService');
 const apiLogService = require('../services/apiLogService');
+const pythonBridge = require('../services/pythonBridge');
 
 // 手动清理
 router.post('/cleanup', async (req, res) => {
@@ -131,4 +132,26 @@ router.get('/api-logs/:taskId', async (req, res) => {
   }
 });
 
+// Python脚本各阶段耗时、请求合并、优先级调度与进程取消统计
+router.get('/python-stats', (req, res) => {
+  res.json({
+    success: true,
+    data: {
+      latency: pythonBridge.getScriptLatencyStats(),
+      coalescing: pythonBridge.getCoalescingStats(),
+      scheduler: pythonBridge.getSchedulerStats(),
+      processes: pythonBridge.getProcessStats()
+    }
+  });
+});
+
+// 清空Python脚本统计
+router.post('/python-stats/reset', (req, res) => {
+  pythonBridge.resetScriptLatencyStats();
+  pythonBridge.resetCoalescingStats();
+  pythonBridge.resetSchedulerStats();
+  pythonBridge.resetProcessStats();
+  res.json({ success: true, message: 'Python脚本统计已清空' });
+});
+
 module.exports = router;
@@ -5,6 +5,7 @@
 const express = require('express');
 const router = express.Router();
 const fs = require('fs');
+const path = require('path');
 const { v4: uuidv4 } = require('uuid');
 const db = require('../db/connection');
 const userService = require('../services/userService');
@@ -12,6 +13,40 @@ const generationService = require('../services/generationService');
 const { exportOrdersExcel } = require('../services/pythonBridge');
 const { validateRequest, validateCreateProductOrderParams } = require('../utils/validation');
 
+// 增量导出的清单和滚动工作簿存放目录
+const ORDER_EXPORT_DIR = process.env.ORDER_EXPORT_DIR || path.join(__dirname, '..', 'exports');
+// append 模式每次把新增订单写成该目录下的一个分片 part-NNNNN.xlsx
+const ROLLING_CHUNK_DIR = path.join(ORDER_EXPORT_DIR, 'product_orders_rolling');
+
+/**
+ * 增量导出清单路径：delta 与 append 各自维护高水位线，交替使用两种模式不会漏单
+ */
+function exportManifestPath(mode) {
+  return path.join(ORDER_EXPORT_DIR, `order_export_manifest_${mode}.json`);
+}
+
+/**
+ * 读取增量导出清单
+ * 用于把高水位线下推到 SQL，避免每次都查询全部历史订单
+ */
+function readExportManifest(manifestPath) {
+  try {
+    return JSON.parse(fs.readFileSync(manifestPath, 'utf-8'));
+  } catch (e) {
+    return {};
+  }
+}
+
+/**
+ * 原子写入增量导出清单（先写临时文件再替换）
+ */
+function writeExportManifest(manifestPath, manifest) {
+  fs.mkdirSync(path.dirname(manifestPath), { recursive: true });
+  const tmpPath = `${manifestPath}.tmp`;
+  fs.writeFileSync(tmpPath, JSON.stringify(manifest, null, 2), 'utf-8');
+  fs.renameSync(tmpPath, manifestPath);
+}
+
 // 创建产品订单
 router.post('/create', validateRequest(validateCreateProductOrderParams), async (req, res) => {
   try {
@@ -180,7 +215,14 @@ router.put('/:orderId/status', async (req, res) => {
 // 导出产品订单Excel (管理员)
 router.post('/export-excel', async (req, res) => {
   try {
-    const { status, startDate, endDate } = req.body;
+    const { status, startDate, endDate, incremental, mode } = req.body;
+    const exportMode = mode === 'append' ? 'append' : 'delta';
+    const manifestPath = exportManifestPath(exportMode);
+    
+    // 高水位线只对全部订单有意义：带筛选条件推进后，之后才满足条件的更早订单会被永久跳过
+    if (incremental && (status || startDate || endDate)) {
+      return res.status(400).json({ error: '增量导出不支持 status / startDate / endDate 筛选条件' });
+    }
     
     const connection = await db.pool.getConnection();
     try {
@@ -207,8 +249,17 @@ router.post('/export-excel', async (req, res) => {
         query += ' AND po.created_at <= ?';
         queryParams.push(endDate);
       }
+      if (incremental) {
+        // 只查询高水位线之后的订单，导出耗时与新增订单数成正比
+        const manifest = readExportManifest(manifestPath);
+        if (manifest.last_create_time) {
+          const lastCreateTime = new Date(manifest.last_create_time);
+          query += ' AND (po.created_at > ? OR (po.created_at = ? AND po.id > ?))';
+          queryParams.push(lastCreateTime, lastCreateTime, manifest.last_order_id || '');
+        }
+      }
       
-      query += ' ORDER BY po.created_at DESC';
+      query += incremental ? ' ORDER BY po.created_at ASC, po.id ASC' : ' ORDER BY po.created_at DESC';
       
       const [rows] = await connection.execute(query, queryParams);
       
@@ -222,12 +273,23 @@ router.post('/export-excel', async (req, res) => {
         image_url: row.image_url || '', create_time: row.create_time
       }));
       
-      const result = await exportOrdersExcel(orders);
+      const result = incremental
+        ? await exportOrdersExcel(orders, exportMode === 'append' ? ROLLING_CHUNK_DIR : null, {
+          incremental: true,
+          manifestPath,
+          mode: exportMode,
+          deferManifest: true
+        })
+        : await exportOrdersExcel(orders);
       
       if (!result.success) {
         return res.status(500).json({ error: 'Excel导出失败', message: result.message });
       }
       
+      if (result.order_count === 0) {
+        return res.json({ success: true, message: result.message, data: { orderCount: 0 } });
+      }
+      
       const filePath = result.output_path;
       
       if (!fs.existsSync(filePath)) {
@@ -249,13 +311,23 @@ router.post('/export-excel', async (req, res) => {
       res.setHeader('Content-Type', 'application/vnd.openxmlformats-officedocument.spreadsheetml.sheet');
       res.setHeader('Content-Disposition', `attachment; filename="${encodeURIComponent('product_orders.xlsx')}"`);
       
+      // 文件完整发送后才推进高水位线，下载中断时下次重新导出同一批订单
+      if (result.manifest) {
+        res.on('finish', () => {
+          try { writeExportManifest(manifestPath, result.manifest); } catch (e) { console.error('写入增量导出清单失败:', e); }
+        });
+      }
+      
+      // append 模式的分片保留在滚动目录中，其余导出文件发送结束（或中断）后删除
+      if (!(incremental && exportMode === 'append')) {
+        res.on('close', () => {
+          try { fs.unlinkSync(filePath); } catch (e) { console.error('删除临时文件失败:', e); }
+        });
+      }
+      
       const fileStream = fs.createReadStream(filePath);
       fileStream.pipe(res);
       
-      fileStream.on('end', () => {
-        try { fs.unlinkSync(filePath); } catch (e) { console.error('删除临时文件失败:', e); }
-      });
-      
     } finally {
       connection.release();
     }
@@ -10,8 +10,16 @@ const fs = require('fs');
 const path = require('path');
 const os = require('os');
 const { uploadImageToOSS } = require('../services/ossService');
-const { extractFaces, addWatermark } = require('../services/pythonBridge');
-const { validateRequest, validateUploadImageParams, validateExtractFacesParams } = require('../utils/validation');
+const { checkFaces, extractFaces, processUpload, addWatermark, SHM_OUTPUT } = require('../services/pythonBridge');
+const { writeSegment, releaseSegment } = require('../utils/sharedMemory');
+const { disconnectSignal } = require('../utils/requestAbort');
+const {
+  validateRequest,
+  validateUploadImageParams,
+  validateExtractFacesParams,
+  validateCheckFacesParams,
+  validateProcessUploadParams
+} = require('../utils/validation');
 const userService = require('../services/userService');
 
 // 上传图片到OSS（Base64 方式）
@@ -93,16 +101,34 @@ router.post('/upload-image-from-url', async (req, res) => {
   }
 });
 
+// 批量人脸校验：多张照片一次进程调用并行检测，返回逐张结果与汇总
+router.post('/check-faces', validateRequest(validateCheckFacesParams), async (req, res) => {
+  try {
+    const { imageUrls, gate } = req.body;
+    
+    const result = await checkFaces(imageUrls, { gate, signal: disconnectSignal(res) });
+    
+    if (!result.results) {
+      return res.status(500).json({ error: '人脸校验失败', message: result.message });
+    }
+    
+    res.json({ success: result.success, data: result });
+  } catch (error) {
+    console.error('人脸校验失败:', error);
+    res.status(500).json({ error: '人脸校验失败', message: error.message });
+  }
+});
+
 // 人脸提取
 router.post('/extract-faces', validateRequest(validateExtractFacesParams), async (req, res) => {
   try {
-    const { imageUrls } = req.body;
+    const { imageUrls, cropSize, cropMargin, cropFormat, pack } = req.body;
     
     if (!imageUrls || !Array.isArray(imageUrls) || imageUrls.length === 0) {
       return res.status(400).json({ error: '缺少必要参数', message: '需要提供 imageUrls 数组参数' });
     }
     
-    const result = await extractFaces(imageUrls);
+    const result = await extractFaces(imageUrls, { cropSize, cropMargin, cropFormat, pack, signal: disconnectSignal(res) });
     
     if (!result.success) {
       return res.status(400).json({ error: '人脸提取失败', message: result.message });
@@ -115,6 +141,58 @@ router.post('/extract-faces', validateRequest(validateExtractFacesParams), async
   }
 });
 
+// 上传图片组合处理：人脸校验 + 人脸提取 + 压缩（+ 水印），图片只解码一次
+// 输入输出都经共享内存段交接，不落临时文件
+router.post('/process-upload', validateRequest(validateProcessUploadParams), async (req, res) => {
+  try {
+    const { image, imageUrl, watermark } = req.body;
+    const source = image || imageUrl;
+    
+    const stages = ['check_face', 'extract_faces', 'compress'];
+    if (watermark) {
+      stages.push('watermark');
+    }
+    
+    const result = await processUpload(source, stages, {
+      // 上传校验只需确认有一张合格人脸，先在缩小图上粗检测
+      check_face: { gate: true },
+      extract_faces: { output_dir: SHM_OUTPUT, min_face_size: 50, confidence_threshold: 0.3 },
+      compress: { output_path: SHM_OUTPUT, max_size_mb: 2 },
+      watermark: {
+        output_path: SHM_OUTPUT,
+        qr_url: process.env.PAYMENT_URL || 'https://your-domain.com/pay',
+        position: process.env.WATERMARK_POSITION || 'center'
+      }
+    }, true, { signal: disconnectSignal(res) });
+    
+    if (!result.success) {
+      // 中途失败时已完成阶段的输出图片不返回给客户端
+      const stageResults = Object.fromEntries(
+        Object.entries(result.stages || {}).map(([name, { output_buffer, ...rest }]) => [name, rest])
+      );
+      return res.status(400).json({ error: '图片处理失败', message: result.message, data: { stages: stageResults } });
+    }
+    
+    // 上传处理后的图片到OSS
+    const uploadBuffer = (buffer, mimeType) =>
+      uploadImageToOSS(`data:${mimeType};base64,${buffer.toString('base64')}`);
+    
+    const data = {
+      faceCheck: result.stages.check_face,
+      faces: result.stages.extract_faces.faces,
+      imageUrl: await uploadBuffer(result.stages.compress.output_buffer, 'image/png')
+    };
+    if (result.stages.watermark) {
+      data.watermarkedImageUrl = await uploadBuffer(result.stages.watermark.output_buffer, 'image/jpeg');
+    }
+    
+    res.json({ success: true, data });
+  } catch (error) {
+    console.error('图片组合处理失败:', error);
+    res.status(500).json({ error: '图片组合处理失败', message: error.message });
+  }
+});
+
 // 添加水印
 router.post('/add-watermark', async (req, res) => {
   try {
@@ -142,45 +220,39 @@ router.post('/add-watermark', async (req, res) => {
       return res.json({ success: true, data: { imageUrl, watermarked: false } });
     }
     
-    const tempDir = os.tmpdir();
-    const tempInputPath = path.join(tempDir, `input_${Date.now()}.jpg`);
-    const tempOutputPath = path.join(tempDir, `output_${Date.now()}.jpg`);
-    
-    // 下载图片
-    await new Promise((resolve, reject) => {
-      const file = fs.createWriteStream(tempInputPath);
+    // 下载图片到内存，写入共享内存段交给 Python（不落临时文件）
+    const imageBuffer = await new Promise((resolve, reject) => {
       https.get(imageUrl, (response) => {
-        response.pipe(file);
-        file.on('finish', () => { file.close(); resolve(); });
-      }).on('error', (err) => {
-        fs.unlink(tempInputPath, () => {});
-        reject(err);
-      });
+        const chunks = [];
+        response.on('data', chunk => chunks.push(chunk));
+        response.on('end', () => resolve(Buffer.concat(chunks)));
+        response.on('error', reject);
+      }).on('error', reject);
     });
+    const segment = writeSegment(imageBuffer);
     
     // 添加水印
-    const result = await addWatermark(
-      tempInputPath, tempOutputPath,
-      'AI全家福制作\n扫码去水印',
-      process.env.PAYMENT_URL || 'https://your-domain.com/pay',
-      'center'
-    );
+    let result;
+    try {
+      result = await addWatermark(
+        segment.ref, SHM_OUTPUT,
+        'AI全家福制作\n扫码去水印',
+        process.env.PAYMENT_URL || 'https://your-domain.com/pay',
+        process.env.WATERMARK_POSITION || 'center',
+        { signal: disconnectSignal(res) }
+      );
+    } finally {
+      releaseSegment(segment.name);
+    }
     
     if (!result.success) {
-      fs.unlink(tempInputPath, () => {});
-      fs.unlink(tempOutputPath, () => {});
       return res.status(500).json({ error: '添加水印失败', message: result.message });
     }
     
     // 上传到OSS
-    const watermarkedImageBuffer = fs.readFileSync(tempOutputPath);
-    const watermarkedImageBase64 = `data:image/jpeg;base64,${watermarkedImageBuffer.toString('base64')}`;
+    const watermarkedImageBase64 = `data:image/jpeg;base64,${result.output_buffer.toString('base64')}`;
     const watermarkedImageUrl = await uploadImageToOSS(watermarkedImageBase64);
     
-    // 清理临时文件
-    fs.unlink(tempInputPath, () => {});
-    fs.unlink(tempOutputPath, () => {});
-    
     res.json({ success: true, data: { imageUrl: watermarkedImageUrl, watermarked: true } });
   } catch (error) {
     console.error('添加水印失败:', error);
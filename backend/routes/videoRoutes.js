@@ -10,6 +10,7 @@ const { generateVideo, getVideoTaskStatus } = require('../services/videoService'
 const { convertToLivePhoto } = require('../services/pythonBridge');
 const { uploadImageToOSS } = require('../services/ossService');
 const { validateRequest, validateGenerateVideoParams } = require('../utils/validation');
+const { disconnectSignal } = require('../utils/requestAbort');
 
 // 生成微动态视频
 router.post('/generate-video', validateRequest(validateGenerateVideoParams), async (req, res) => {
@@ -109,7 +110,7 @@ router.post('/convert-to-live-photo', async (req, res) => {
       return res.status(401).json({ error: '未授权', message: '需要提供 userId 参数' });
     }
     
-    const result = await convertToLivePhoto(videoUrl);
+    const result = await convertToLivePhoto(videoUrl, null, { signal: disconnectSignal(res) });
     
     if (!result.success) {
       return res.status(500).json({ error: 'Live Photo转换失败', message: result.message });
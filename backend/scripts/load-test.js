@@ -0,0 +1,574 @@
+#!/usr/bin/env node
+
+/**
+ * Python桥接端到端压测脚本
+ *
+ * 在本机启动一个代替 OSS 的 HTTP 服务（提供生成的图片/视频，接收上传结果），
+ * 把会调用 pythonBridge 的 Express 路由挂到同一进程里，按指定并发持续请求，
+ * 定时输出吞吐量、进行中的请求数与 Python 进程数，结束时汇总各场景的
+ * 延迟分位数、错误率以及桥接层的耗时/合并/调度统计。
+ * 不需要真实的 OSS、数据库与上游 AI 服务（ossService / userService 被替换为本地实现）。
+ *
+ * 场景:
+ *   extract-faces   POST /api/extract-faces          人脸提取（下载 + 检测 + 裁剪）
+ *   process-upload  POST /api/process-upload         人脸校验 + 提取 + 压缩 + 水印（单次解码）
+ *   live-photo      POST /api/convert-to-live-photo  视频转 Live Photo（需要 ffmpeg）
+ *   （/api/add-watermark 只能下载 https 地址，水印负载由 process-upload 覆盖）
+ *
+ * 生成的图片不含人脸，extract-faces / process-upload 会在检测后返回 400（计为 rejected），
+ * 仍然覆盖了下载、解码与检测的完整开销；需要测完整流程时用 --images 指定真实照片目录。
+ *
+ * 用法:
+ *   node scripts/load-test.js [选项]
+ *
+ * 选项:
+ *   --concurrency N     并发请求数（默认 8）
+ *   --duration S        持续秒数（默认 30）
+ *   --requests N        总请求数上限，达到后提前结束
+ *   --scenarios LIST    场景及权重，如 extract-faces:3,process-upload:1（默认三个场景等权重）
+ *   --images DIR        使用目录中的 jpg/png 作为测试图片
+ *   --videos DIR        使用目录中的 mp4/mov 作为测试视频
+ *   --oss-latency MS    模拟 OSS 上传延迟（默认 0）
+ *   --same-url          所有请求使用相同的素材地址（允许桥接层合并请求），默认每次请求地址不同
+ *   --interval S        时间序列采样间隔秒数（默认 1）
+ *   --json FILE         把完整报告（含时间序列）写入 JSON 文件
+ *   --verbose           保留路由与桥接层的日志输出
+ */
+
+const http = require('http');
+const fs = require('fs');
+const os = require('os');
+const path = require('path');
+const { spawnSync } = require('child_process');
+
+const { LatencyHistogram } = require('../utils/latencyHistogram');
+
+// ==================== 参数解析 ====================
+
+function parseArgs(argv) {
+  const options = {
+    concurrency: 8,
+    duration: 30,
+    requests: Infinity,
+    scenarios: 'extract-faces:1,process-upload:1,live-photo:1',
+    images: null,
+    videos: null,
+    ossLatency: 0,
+    sameUrl: false,
+    interval: 1,
+    json: null,
+    verbose: false
+  };
+
+  for (let i = 0; i < argv.length; i++) {
+    const arg = argv[i];
+    const next = () => argv[++i];
+    switch (arg) {
+      case '--concurrency': options.concurrency = parseInt(next(), 10); break;
+      case '--duration': options.duration = parseFloat(next()); break;
+      case '--requests': options.requests = parseInt(next(), 10); break;
+      case '--scenarios': options.scenarios = next(); break;
+      case '--images': options.images = next(); break;
+      case '--videos': options.videos = next(); break;
+      case '--oss-latency': options.ossLatency = parseInt(next(), 10); break;
+      case '--same-url': options.sameUrl = true; break;
+      case '--interval': options.interval = parseFloat(next()); break;
+      case '--json': options.json = next(); break;
+      case '--verbose': options.verbose = true; break;
+      case '--help':
+      case '-h':
+        console.log(fs.readFileSync(__filename, 'utf8').split('*/')[0]);
+        process.exit(0);
+        break;
+      default:
+        console.error(`未知参数: ${arg}`);
+        process.exit(1);
+    }
+  }
+
+  options.scenarios = options.scenarios.split(',').map((item) => {
+    const [name, weight] = item.trim().split(':');
+    return { name, weight: weight === undefined ? 1 : parseFloat(weight) };
+  });
+  return options;
+}
+
+// ==================== 测试素材 ====================
+
+const GENERATE_IMAGES_SCRIPT = `
+import sys
+import numpy as np
+from PIL import Image, ImageDraw
+
+out_dir = sys.argv[1]
+rng = np.random.default_rng(42)
+for i, (w, h) in enumerate([(1024, 768), (1536, 2048), (3000, 4000)]):
+    yy, xx = np.mgrid[0:h, 0:w]
+    base = np.stack([xx * 255 // w, yy * 255 // h, (xx + yy) * 255 // (w + h)], axis=-1)
+    noise = rng.integers(-24, 24, size=(h, w, 3))
+    img = Image.fromarray(np.clip(base + noise, 0, 255).astype(np.uint8))
+    draw = ImageDraw.Draw(img)
+    for _ in range(12):
+        x, y = int(rng.integers(0, w)), int(rng.integers(0, h))
+        r = int(rng.integers(min(w, h) // 20, min(w, h) // 6))
+        draw.ellipse((x - r, y - r, x + r, y + r), fill=tuple(int(c) for c in rng.integers(0, 255, 3)))
+    img.save(f'{out_dir}/generated_{w}x{h}.jpg', quality=90)
+`;
+
+function readMediaDir(dir, extensions) {
+  return fs.readdirSync(dir)
+    .filter(name => extensions.includes(path.extname(name).toLowerCase()))
+    .map(name => ({ name, buffer: fs.readFileSync(path.join(dir, name)) }));
+}
+
+/**
+ * 准备测试图片：优先读取 --images 目录，否则用 Python（与桥接层相同的解释器）生成
+ */
+function prepareImages(options, workDir) {
+  if (options.images) {
+    return readMediaDir(options.images, ['.jpg', '.jpeg', '.png']);
+  }
+
+  const { PYTHON_PATH } = require('../services/pythonBridge');
+  const result = spawnSync(PYTHON_PATH, ['-c', GENERATE_IMAGES_SCRIPT, workDir], { encoding: 'utf8' });
+  if (result.status !== 0) {
+    throw new Error(`生成测试图片失败: ${result.stderr || result.error}`);
+  }
+  return readMediaDir(workDir, ['.jpg']);
+}
+
+/**
+ * 准备测试视频：优先读取 --videos 目录，否则用 ffmpeg 生成；没有 ffmpeg 时返回空数组
+ */
+function prepareVideos(options, workDir) {
+  if (options.videos) {
+    return readMediaDir(options.videos, ['.mp4', '.mov']);
+  }
+
+  const output = path.join(workDir, 'generated_720x1280.mp4');
+  const result = spawnSync('ffmpeg', [
+    '-y', '-loglevel', 'error',
+    '-f', 'lavfi', '-i', 'testsrc2=size=720x1280:rate=30:duration=3',
+    '-c:v', 'libx264', '-pix_fmt', 'yuv420p', output
+  ]);
+  if (result.status !== 0) {
+    return [];
+  }
+  return readMediaDir(workDir, ['.mp4']);
+}
+
+// ==================== 本地 OSS 替身 ====================
+
+const MIME_TYPES = {
+  '.jpg': 'image/jpeg', '.jpeg': 'image/jpeg', '.png': 'image/png',
+  '.mp4': 'video/mp4', '.mov': 'video/quicktime'
+};
+const MAX_STORED_OBJECTS = 200;
+
+/**
+ * 启动本地 HTTP 服务：GET /media/<name> 提供测试素材，GET /oss/<key> 读取上传结果
+ */
+async function startStandInServer(media) {
+  const objects = new Map();
+  const stats = { mediaRequests: 0, mediaBytes: 0, uploads: 0, uploadBytes: 0 };
+
+  const server = http.createServer((req, res) => {
+    const { pathname } = new URL(req.url, 'http://localhost');
+    const [, bucket, key] = pathname.split('/');
+    const object = bucket === 'media' ? media.get(key) : bucket === 'oss' ? objects.get(key) : null;
+
+    if (!object) {
+      res.writeHead(404);
+      res.end();
+      return;
+    }
+    if (bucket === 'media') {
+      stats.mediaRequests++;
+      stats.mediaBytes += object.buffer.length;
+    }
+    res.writeHead(200, {
+      'Content-Type': object.mimeType || MIME_TYPES[path.extname(key).toLowerCase()] || 'application/octet-stream',
+      'Content-Length': object.buffer.length
+    });
+    res.end(object.buffer);
+  });
+
+  await new Promise(resolve => server.listen(0, '127.0.0.1', resolve));
+  const baseUrl = `http://127.0.0.1:${server.address().port}`;
+
+  let seq = 0;
+  const put = (buffer, mimeType, ext) => {
+    const key = `${Date.now()}_${++seq}${ext}`;
+    objects.set(key, { buffer, mimeType });
+    // 只保留最近的上传结果，避免长时间压测占满内存
+    if (objects.size > MAX_STORED_OBJECTS) {
+      objects.delete(objects.keys().next().value);
+    }
+    stats.uploads++;
+    stats.uploadBytes += buffer.length;
+    return `${baseUrl}/oss/${key}`;
+  };
+
+  return { server, baseUrl, put, stats };
+}
+
+/**
+ * 用本地实现替换 ossService / userService，必须在加载路由之前调用
+ */
+function installServiceStubs(standIn, options) {
+  const delay = () => new Promise(resolve => setTimeout(resolve, options.ossLatency));
+  const decodeDataUri = (dataUri) => {
+    const match = /^data:([^;]+);base64,(.*)$/s.exec(dataUri);
+    return match ? { mimeType: match[1], buffer: Buffer.from(match[2], 'base64') }
+      : { mimeType: 'image/jpeg', buffer: Buffer.from(dataUri, 'base64') };
+  };
+
+  const uploadBase64 = async (base64Data) => {
+    const { mimeType, buffer } = decodeDataUri(base64Data);
+    await delay();
+    return standIn.put(buffer, mimeType, '');
+  };
+
+  const ossStub = {
+    initCOS: () => null,
+    uploadImageToOSS: uploadBase64,
+    uploadVideoToOSS: uploadBase64,
+    uploadImageFromUrlToOSS: async imageUrl => imageUrl,
+    uploadImagesFromUrlsToOSS: async imageUrls => imageUrls,
+    COS_BUCKET: 'load-test',
+    COS_REGION: 'local',
+    COS_DOMAIN: standIn.baseUrl
+  };
+  // Live Photo 仅对尊享包开放，压测用户统一按 premium 处理
+  const userStub = {
+    getUserById: async userId => ({ id: userId, payment_status: 'premium' })
+  };
+
+  for (const [modulePath, exports] of [
+    ['../services/ossService', ossStub],
+    ['../services/userService', userStub]
+  ]) {
+    const filename = require.resolve(modulePath);
+    require.cache[filename] = { id: filename, filename, loaded: true, exports };
+  }
+}
+
+// ==================== 采样与统计 ====================
+
+/**
+ * 统计当前进程的 Python 子进程数（Linux 读取 /proc，其他平台用调度器的运行数代替）
+ */
+function countPythonProcesses(pythonBridge) {
+  if (process.platform !== 'linux') {
+    return pythonBridge.getSchedulerStats().running;
+  }
+  let count = 0;
+  for (const pid of fs.readdirSync('/proc')) {
+    if (!/^\d+$/.test(pid)) continue;
+    try {
+      const stat = fs.readFileSync(`/proc/${pid}/stat`, 'utf8');
+      // 格式: pid (comm) state ppid ...，comm 可能包含空格
+      const comm = stat.slice(stat.indexOf('(') + 1, stat.lastIndexOf(')'));
+      const ppid = parseInt(stat.slice(stat.lastIndexOf(')') + 2).split(' ')[1], 10);
+      if (ppid === process.pid && comm.startsWith('python')) {
+        count++;
+      }
+    } catch (e) {
+      // 进程在读取期间已退出
+    }
+  }
+  return count;
+}
+
+function createScenarioStats() {
+  return { ok: 0, rejected: 0, errors: 0, latency: new LatencyHistogram(), lastError: null };
+}
+
+function formatScenarioRow(name, stats, elapsedSec) {
+  const total = stats.ok + stats.rejected + stats.errors;
+  const latency = stats.latency.toJSON();
+  return [
+    name.padEnd(16),
+    String(total).padStart(6),
+    (total / elapsedSec).toFixed(2).padStart(8),
+    String(latency.p50).padStart(8),
+    String(latency.p90).padStart(8),
+    String(latency.p99).padStart(8),
+    String(latency.max).padStart(8),
+    `${total ? ((stats.rejected / total) * 100).toFixed(1) : '0.0'}%`.padStart(9),
+    `${total ? ((stats.errors / total) * 100).toFixed(1) : '0.0'}%`.padStart(8)
+  ].join(' ');
+}
+
+// ==================== 请求驱动 ====================
+
+function postJson(agent, baseUrl, pathname, body) {
+  return new Promise((resolve, reject) => {
+    const payload = Buffer.from(JSON.stringify(body));
+    const req = http.request(new URL(pathname, baseUrl), {
+      method: 'POST',
+      agent,
+      headers: { 'Content-Type': 'application/json', 'Content-Length': payload.length }
+    }, (res) => {
+      const chunks = [];
+      res.on('data', chunk => chunks.push(chunk));
+      res.on('end', () => resolve({ status: res.statusCode, body: Buffer.concat(chunks).toString() }));
+    });
+    req.on('error', reject);
+    req.end(payload);
+  });
+}
+
+function buildScenarios(options, standIn, images, videos) {
+  let seq = 0;
+  const pick = (list) => {
+    const item = list[seq % list.length];
+    seq++;
+    const url = `${standIn.baseUrl}/media/${encodeURIComponent(item.name)}`;
+    // 默认给每次请求加不同的查询参数，避免桥接层把并发的相同调用合并掉
+    return options.sameUrl ? url : `${url}?n=${seq}`;
+  };
+
+  const available = {
+    'extract-faces': images.length > 0 && (() => ({
+      path: '/api/extract-faces',
+      body: { imageUrls: [pick(images)] }
+    })),
+    'process-upload': images.length > 0 && (() => ({
+      path: '/api/process-upload',
+      body: { imageUrl: pick(images), watermark: true }
+    })),
+    'live-photo': videos.length > 0 && (() => ({
+      path: '/api/convert-to-live-photo',
+      body: { videoUrl: pick(videos), userId: 'load-test' }
+    }))
+  };
+
+  const scenarios = [];
+  for (const { name, weight } of options.scenarios) {
+    if (!(name in available)) {
+      throw new Error(`未知场景: ${name}`);
+    }
+    if (!available[name]) {
+      console.warn(`⚠️  场景 ${name} 缺少测试素材，已跳过${name === 'live-photo' ? '（需要 ffmpeg 或 --videos）' : ''}`);
+      continue;
+    }
+    if (weight > 0) {
+      scenarios.push({ name, weight, build: available[name] });
+    }
+  }
+  if (scenarios.length === 0) {
+    throw new Error('没有可运行的场景');
+  }
+
+  const totalWeight = scenarios.reduce((sum, s) => sum + s.weight, 0);
+  return () => {
+    let r = Math.random() * totalWeight;
+    return scenarios.find(s => (r -= s.weight) < 0) || scenarios[scenarios.length - 1];
+  };
+}
+
+// ==================== 主流程 ====================
+
+/**
+ * 执行一次压测并输出报告
+ * @returns {number} 进程退出码（有 5xx / 请求异常时为 1）
+ */
+async function runLoadTest(options, workDir, log) {
+  log('🧪 准备测试素材...');
+  const images = prepareImages(options, workDir);
+  const videos = prepareVideos(options, workDir);
+  log(`   图片 ${images.length} 张，视频 ${videos.length} 个`);
+
+  const media = new Map([...images, ...videos].map(item => [item.name, item]));
+  const standIn = await startStandInServer(media);
+  installServiceStubs(standIn, options);
+
+  // 替换服务后再加载路由与桥接层
+  const express = require('express');
+  const pythonBridge = require('../services/pythonBridge');
+  // 与 server.js 一致：Ctrl-C 中断压测时结束运行中的 Python 进程组
+  pythonBridge.installShutdownHandlers();
+  const app = express();
+  app.use(express.json({ limit: '10mb' }));
+  app.use('/api', require('../routes/uploadRoutes'));
+  app.use('/api', require('../routes/videoRoutes'));
+  const appServer = await new Promise((resolve) => {
+    const server = app.listen(0, '127.0.0.1', () => resolve(server));
+  });
+  const appUrl = `http://127.0.0.1:${appServer.address().port}`;
+
+  const nextScenario = buildScenarios(options, standIn, images, videos);
+  pythonBridge.resetScriptLatencyStats();
+  pythonBridge.resetCoalescingStats();
+  pythonBridge.resetSchedulerStats();
+
+  if (!options.verbose) {
+    console.log = () => {};
+    console.warn = () => {};
+    console.error = () => {};
+  }
+
+  log(`🚀 并发 ${options.concurrency}，持续 ${options.duration}s，OSS 替身 ${standIn.baseUrl}，应用 ${appUrl}`);
+  log('');
+
+  const agent = new http.Agent({ keepAlive: true, maxSockets: options.concurrency });
+  const scenarioStats = {};
+  const timeseries = [];
+  let issued = 0;
+  let inflight = 0;
+  let windowCompleted = 0;
+  let windowErrors = 0;
+  let peakPython = 0;
+  const startedAt = Date.now();
+  const endAt = startedAt + options.duration * 1000;
+
+  const sampler = setInterval(() => {
+    const scheduler = pythonBridge.getSchedulerStats();
+    const queued = Object.values(scheduler.classes).reduce((sum, cls) => sum + cls.queued, 0);
+    const sample = {
+      t: Math.round((Date.now() - startedAt) / 1000),
+      throughput: windowCompleted / options.interval,
+      errors: windowErrors,
+      inflight,
+      pythonProcesses: countPythonProcesses(pythonBridge),
+      bridgeRunning: scheduler.running,
+      bridgeQueued: queued
+    };
+    peakPython = Math.max(peakPython, sample.pythonProcesses);
+    timeseries.push(sample);
+    windowCompleted = 0;
+    windowErrors = 0;
+    log(`[${String(sample.t).padStart(4)}s] ${sample.throughput.toFixed(2).padStart(7)} req/s  ` +
+      `进行中 ${String(sample.inflight).padStart(3)}  Python进程 ${String(sample.pythonProcesses).padStart(3)}  ` +
+      `排队 ${String(sample.bridgeQueued).padStart(3)}  错误 ${sample.errors}`);
+  }, options.interval * 1000);
+
+  const worker = async () => {
+    while (Date.now() < endAt && issued < options.requests) {
+      issued++;
+      const scenario = nextScenario();
+      const stats = scenarioStats[scenario.name] = scenarioStats[scenario.name] || createScenarioStats();
+      const { path: pathname, body } = scenario.build();
+
+      inflight++;
+      const requestStart = process.hrtime.bigint();
+      try {
+        const res = await postJson(agent, appUrl, pathname, body);
+        if (res.status < 400) {
+          stats.ok++;
+        } else if (res.status < 500) {
+          stats.rejected++;
+        } else {
+          stats.errors++;
+          windowErrors++;
+          stats.lastError = `${res.status} ${res.body.substring(0, 200)}`;
+        }
+      } catch (error) {
+        stats.errors++;
+        windowErrors++;
+        stats.lastError = error.message;
+      } finally {
+        inflight--;
+        windowCompleted++;
+        stats.latency.record(Number(process.hrtime.bigint() - requestStart) / 1e6);
+      }
+    }
+  };
+
+  await Promise.all(Array.from({ length: options.concurrency }, worker));
+  clearInterval(sampler);
+  const elapsedSec = (Date.now() - startedAt) / 1000;
+
+  log('');
+  log('='.repeat(96));
+  log(`📊 压测结果（${elapsedSec.toFixed(1)}s，Python进程峰值 ${peakPython}）`);
+  log('='.repeat(96));
+  log(['场景'.padEnd(14), '请求数'.padStart(4), 'req/s'.padStart(8), 'p50(ms)'.padStart(8),
+    'p90(ms)'.padStart(8), 'p99(ms)'.padStart(8), 'max(ms)'.padStart(8),
+    '4xx率'.padStart(7), '错误率'.padStart(5)].join(' '));
+  for (const [name, stats] of Object.entries(scenarioStats)) {
+    log(formatScenarioRow(name, stats, elapsedSec));
+    if (stats.lastError) {
+      log(`  最近错误: ${stats.lastError}`);
+    }
+  }
+
+  const latency = pythonBridge.getScriptLatencyStats();
+  log('');
+  log('Python脚本耗时 (bridge_total / python_overhead, ms):');
+  for (const [script, entry] of Object.entries(latency)) {
+    const total = entry.stages.bridge_total || {};
+    const overhead = entry.stages.python_overhead || {};
+    log(`  ${script.padEnd(28)} n=${entry.calls}  失败 ${entry.errors}  p50 ${total.p50}  p99 ${total.p99}  ` +
+      `进程开销 p50 ${overhead.p50}`);
+  }
+  const scheduler = pythonBridge.getSchedulerStats();
+  log('');
+  log('调度等待 (ms):');
+  for (const [cls, stats] of Object.entries(scheduler.classes)) {
+    if (stats.enqueued > 0) {
+      log(`  ${cls.padEnd(12)} n=${stats.started}  p50 ${stats.waitMs.p50}  p99 ${stats.waitMs.p99}  ` +
+        `丢弃 ${stats.shed}  过期 ${stats.expired}`);
+    }
+  }
+  log(`OSS 替身: 素材下载 ${standIn.stats.mediaRequests} 次，上传 ${standIn.stats.uploads} 次 ` +
+    `(${(standIn.stats.uploadBytes / 1024 / 1024).toFixed(1)} MB)`);
+
+  if (options.json) {
+    const report = {
+      options: { ...options, requests: Number.isFinite(options.requests) ? options.requests : null },
+      elapsedSec,
+      peakPythonProcesses: peakPython,
+      scenarios: Object.fromEntries(Object.entries(scenarioStats).map(([name, stats]) => [name, {
+        ok: stats.ok,
+        rejected: stats.rejected,
+        errors: stats.errors,
+        throughput: (stats.ok + stats.rejected + stats.errors) / elapsedSec,
+        latency: stats.latency.toJSON(),
+        lastError: stats.lastError
+      }])),
+      bridge: {
+        latency,
+        coalescing: pythonBridge.getCoalescingStats(),
+        scheduler
+      },
+      standIn: standIn.stats,
+      timeseries
+    };
+    fs.writeFileSync(options.json, JSON.stringify(report, null, 2));
+    log(`报告已写入 ${options.json}`);
+  }
+
+  agent.destroy();
+  appServer.close();
+  standIn.server.close();
+
+  const totalErrors = Object.values(scenarioStats).reduce((sum, s) => sum + s.errors, 0);
+  return totalErrors > 0 ? 1 : 0;
+}
+
+async function main() {
+  const options = parseArgs(process.argv.slice(2));
+  const log = console.log.bind(console);
+  const warn = console.warn.bind(console);
+  const error = console.error.bind(console);
+
+  const workDir = fs.mkdtempSync(path.join(os.tmpdir(), 'load-test-'));
+  try {
+    return await runLoadTest(options, workDir, log);
+  } finally {
+    // 非 verbose 模式下压测期间静默了 console，失败时也要恢复，否则错误信息无法输出
+    console.log = log;
+    console.warn = warn;
+    console.error = error;
+    fs.rmSync(workDir, { recursive: true, force: true });
+  }
+}
+
+main().then((exitCode) => {
+  process.exit(exitCode);
+}).catch((error) => {
+  console.error('❌ 压测失败:', error);
+  process.exit(1);
+});
@@ -21,6 +21,7 @@ const cleanupService = require('./services/cleanupService');
 const { recoverPendingTasks, getQueueStats } = require('./services/taskQueueService');
 const { executeArtPhotoTask } = require('./services/artPhotoWorker');
 const { generateArtPhotoInternal } = require('./services/volcengineService');
+const { installShutdownHandlers } = require('./services/pythonBridge');
 
 const app = express();
 // 从环境变量读取端口，默认 3002
@@ -34,6 +35,9 @@ app.use(express.raw({ type: 'application/json', limit: '10mb' }));
 // 初始化微信支付
 initWechatPayment();
 
+// 退出时结束运行中的 Python 进程组
+installShutdownHandlers();
+
 // 健康检查端点
 app.get('/health', (req, res) => {
   res.json({ status: 'ok', timestamp: new Date().toISOString() });
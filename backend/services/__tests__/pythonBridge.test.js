@@ -0,0 +1,451 @@
+/**
+ * Python桥接模块单元测试
+ * 通过 mock child_process.spawn 模拟 Python 进程，不需要真实的 Python 环境
+ */
+
+const fs = require('fs');
+const os = require('os');
+const path = require('path');
+const { EventEmitter } = require('events');
+const { spawn } = require('child_process');
+
+jest.mock('child_process', () => ({ spawn: jest.fn() }));
+
+// 固定调度参数：2 个进程槽位（1 个预留给 interactive），background 最多排队 2 个
+process.env.PYTHON_MAX_CONCURRENCY = '2';
+process.env.PYTHON_BACKGROUND_MAX_QUEUE = '2';
+// 取消时 SIGTERM 到 SIGKILL 的宽限期
+process.env.PYTHON_KILL_GRACE_MS = '50';
+// 数据URI 输入写入临时目录中的共享内存段
+const shmDir = fs.mkdtempSync(path.join(os.tmpdir(), 'bridge-shm-test-'));
+process.env.PY_SHM_DIR = shmDir;
+
+const sigtermListenersBeforeLoad = process.listeners('SIGTERM');
+const pythonBridge = require('../pythonBridge');
+
+let nextPid = 40000;
+
+/**
+ * 创建假的 Python 进程：写入 stdin 后由测试调用 finish() 输出结果并退出
+ */
+function createFakeProcess() {
+  const proc = new EventEmitter();
+  proc.pid = nextPid++;
+  proc.stdout = new EventEmitter();
+  proc.stderr = new EventEmitter();
+  proc.stdin = { write: jest.fn(), end: jest.fn() };
+  proc.kill = jest.fn();
+  proc.finish = (result, code = 0) => {
+    proc.stdout.emit('data', Buffer.from(JSON.stringify(result)));
+    proc.emit('exit', code, null);
+    proc.emit('close', code);
+  };
+  return proc;
+}
+
+describe('pythonBridge', () => {
+  let processes;
+
+  beforeEach(() => {
+    processes = [];
+    spawn.mockImplementation(() => {
+      const proc = createFakeProcess();
+      processes.push(proc);
+      return proc;
+    });
+    pythonBridge.resetCoalescingStats();
+    pythonBridge.resetScriptLatencyStats();
+    pythonBridge.resetSchedulerStats();
+    pythonBridge.resetProcessStats();
+    // 假进程的 pid 不对应真实进程组，拦截发往进程组的信号
+    jest.spyOn(process, 'kill').mockImplementation(() => true);
+    jest.spyOn(console, 'log').mockImplementation(() => {});
+    jest.spyOn(console, 'error').mockImplementation(() => {});
+    jest.spyOn(console, 'warn').mockImplementation(() => {});
+  });
+
+  afterEach(() => {
+    jest.restoreAllMocks();
+    spawn.mockReset();
+  });
+
+  afterAll(() => {
+    fs.rmSync(shmDir, { recursive: true, force: true });
+  });
+
+  describe('stableStringify', () => {
+    test('键顺序不同的等价对象序列化结果相同', () => {
+      const a = pythonBridge.stableStringify({ b: 1, a: { d: [1, { y: 2, x: 1 }], c: 'x' } });
+      const b = pythonBridge.stableStringify({ a: { c: 'x', d: [1, { x: 1, y: 2 }] }, b: 1 });
+      expect(a).toBe(b);
+    });
+
+    test('与JSON.stringify一致地忽略undefined', () => {
+      expect(pythonBridge.stableStringify({ a: 1, b: undefined })).toBe('{"a":1}');
+      expect(pythonBridge.stableStringify([1, undefined])).toBe('[1,null]');
+    });
+  });
+
+  describe('请求合并', () => {
+    test('参数相同的并发调用只启动一个进程并共享结果', async () => {
+      const first = pythonBridge.executePythonScript('extract_faces.py', { image_paths: ['a'], min_face_size: 50 });
+      const second = pythonBridge.executePythonScript('extract_faces.py', { min_face_size: 50, image_paths: ['a'] });
+
+      expect(spawn).toHaveBeenCalledTimes(1);
+      processes[0].finish({ success: true, faces: [] });
+
+      await expect(first).resolves.toEqual({ success: true, faces: [] });
+      await expect(second).resolves.toEqual({ success: true, faces: [] });
+      expect(pythonBridge.getCoalescingStats().scripts['extract_faces.py']).toEqual({
+        calls: 2, executions: 1, coalesced: 1
+      });
+      expect(pythonBridge.getCoalescingStats().inflight).toBe(0);
+    });
+
+    test('相同数据URI 的调用经共享内存段传递后仍合并为一个进程', async () => {
+      const image = `data:image/jpeg;base64,${Buffer.from('same image').toString('base64')}`;
+      const first = pythonBridge.checkFaces([image]);
+      const second = pythonBridge.checkFaces([image]);
+
+      expect(spawn).toHaveBeenCalledTimes(1);
+      const [segmentPath] = JSON.parse(processes[0].stdin.write.mock.calls[0][0]).image_paths;
+      expect(segmentPath.startsWith('shm://')).toBe(true);
+      processes[0].finish({ success: true, results: [] });
+
+      await expect(first).resolves.toEqual({ success: true, results: [] });
+      await expect(second).resolves.toEqual({ success: true, results: [] });
+      expect(pythonBridge.getCoalescingStats().scripts['check_face.py'].coalesced).toBe(1);
+      // 两个调用方都释放后删除段
+      expect(fs.readdirSync(shmDir)).toEqual([]);
+    });
+
+    test('extractFaces 结果的 source_image 保持调用方传入的原始值', async () => {
+      const image = `data:image/jpeg;base64,${Buffer.from('face image').toString('base64')}`;
+      const url = 'https://example.com/a.jpg';
+      const call = pythonBridge.extractFaces([image, url]);
+
+      const [segmentPath, urlPath] = JSON.parse(processes[0].stdin.write.mock.calls[0][0]).image_paths;
+      expect(urlPath).toBe(url);
+      processes[0].finish({
+        success: true,
+        faces: [
+          { bbox: [0, 0, 10, 10], source_image: segmentPath },
+          { bbox: [5, 5, 10, 10], source_image: url }
+        ]
+      });
+
+      const result = await call;
+      expect(result.faces.map(face => face.source_image)).toEqual([image, url]);
+    });
+
+    test('参数不同的调用分别执行', async () => {
+      const first = pythonBridge.executePythonScript('extract_faces.py', { image_paths: ['a'] });
+      const second = pythonBridge.executePythonScript('extract_faces.py', { image_paths: ['b'] });
+
+      expect(spawn).toHaveBeenCalledTimes(2);
+      processes.forEach(proc => proc.finish({ success: true }));
+      await Promise.all([first, second]);
+      expect(pythonBridge.getCoalescingStats().scripts['extract_faces.py'].coalesced).toBe(0);
+    });
+
+    test('执行结束后的相同调用重新执行', async () => {
+      const first = pythonBridge.executePythonScript('check_face.py', { image_path: 'a' });
+      processes[0].finish({ success: true });
+      await first;
+
+      const second = pythonBridge.executePythonScript('check_face.py', { image_path: 'a' });
+      expect(spawn).toHaveBeenCalledTimes(2);
+      processes[1].finish({ success: true });
+      await second;
+    });
+
+    test('失败会传递给所有合并的调用方', async () => {
+      const first = pythonBridge.executePythonScript('check_face.py', { image_path: 'a' });
+      const second = pythonBridge.executePythonScript('check_face.py', { image_path: 'a' });
+      processes[0].finish({ success: false }, 1);
+
+      await expect(first).rejects.toThrow('退出码 1');
+      await expect(second).rejects.toThrow('退出码 1');
+    });
+
+    test('coalesce=false 时不合并', async () => {
+      const first = pythonBridge.executePythonScript('check_face.py', { image_path: 'a' }, 1000, { coalesce: false });
+      const second = pythonBridge.executePythonScript('check_face.py', { image_path: 'a' }, 1000, { coalesce: false });
+      expect(spawn).toHaveBeenCalledTimes(2);
+      processes.forEach(proc => proc.finish({ success: true }));
+      await Promise.all([first, second]);
+    });
+  });
+
+  describe('优先级调度', () => {
+    const scriptOf = (proc) => spawn.mock.calls[processes.indexOf(proc)][1][0];
+
+    test('槽位占满时 interactive 先于更早排队的 normal 执行', async () => {
+      const running = [
+        pythonBridge.executePythonScript('check_face.py', {}),
+        pythonBridge.executePythonScript('compress_image.py', {})
+      ];
+      const normal = pythonBridge.executePythonScript('convert_to_live_photo.py', {});
+      const interactive = pythonBridge.executePythonScript('extract_faces.py', {}, 1000, { priority: 'interactive' });
+      expect(spawn).toHaveBeenCalledTimes(2);
+
+      processes[0].finish({ success: true });
+      await running[0];
+      expect(spawn).toHaveBeenCalledTimes(3);
+      expect(scriptOf(processes[2])).toContain('extract_faces.py');
+
+      processes[1].finish({ success: true });
+      await running[1];
+      expect(scriptOf(processes[3])).toContain('convert_to_live_photo.py');
+      processes.slice(2).forEach(proc => proc.finish({ success: true }));
+      await Promise.all([normal, interactive]);
+    });
+
+    test('background 不占用预留给 interactive 的槽位', async () => {
+      const normal = pythonBridge.executePythonScript('convert_to_live_photo.py', {});
+      const background = pythonBridge.executePythonScript('export_orders_excel.py', {}, 1000, { priority: 'background' });
+      expect(spawn).toHaveBeenCalledTimes(1);
+      expect(pythonBridge.getSchedulerStats().classes.background.queued).toBe(1);
+
+      processes[0].finish({ success: true });
+      await normal;
+      expect(spawn).toHaveBeenCalledTimes(2);
+      processes[1].finish({ success: true });
+      await expect(background).resolves.toEqual({ success: true });
+    });
+
+    test('background 队列已满时直接拒绝', async () => {
+      const normal = pythonBridge.executePythonScript('convert_to_live_photo.py', {});
+      const queued = [1, 2].map(i =>
+        pythonBridge.executePythonScript('export_orders_excel.py', { i }, 1000, { priority: 'background' }));
+      const shed = pythonBridge.executePythonScript('export_orders_excel.py', { i: 3 }, 1000, { priority: 'background' });
+
+      await expect(shed).rejects.toMatchObject({ code: 'QUEUE_SHED' });
+      expect(pythonBridge.getSchedulerStats().classes.background.shed).toBe(1);
+
+      processes[0].finish({ success: true });
+      await normal;
+      processes[1].finish({ success: true });
+      await queued[0];
+      processes[2].finish({ success: true });
+      await queued[1];
+    });
+
+    test('排队超过截止时间的调用被丢弃且不启动进程', async () => {
+      const running = [
+        pythonBridge.executePythonScript('check_face.py', {}),
+        pythonBridge.executePythonScript('compress_image.py', {})
+      ];
+      const late = pythonBridge.executePythonScript('add_watermark.py', {}, 1000, { deadline: Date.now() + 20 });
+
+      await expect(late).rejects.toMatchObject({ code: 'DEADLINE_EXCEEDED' });
+      expect(pythonBridge.getSchedulerStats().classes.normal).toMatchObject({ queued: 0, expired: 1 });
+
+      processes.forEach(proc => proc.finish({ success: true }));
+      await Promise.all(running);
+      expect(spawn).toHaveBeenCalledTimes(2);
+    });
+
+    test('合并的 interactive 调用提升排队中的 background 任务', async () => {
+      const normal = pythonBridge.executePythonScript('convert_to_live_photo.py', {});
+      const background = pythonBridge.executePythonScript('export_orders_excel.py', { id: 1 }, 1000, { priority: 'background' });
+      const interactive = pythonBridge.executePythonScript('export_orders_excel.py', { id: 1 }, 1000, { priority: 'interactive' });
+
+      expect(spawn).toHaveBeenCalledTimes(2);
+      expect(pythonBridge.getSchedulerStats().classes.interactive.started).toBe(1);
+      processes.forEach(proc => proc.finish({ success: true }));
+      await Promise.all([normal, background, interactive]);
+    });
+
+    test('统计各优先级的等待时间', async () => {
+      const call = pythonBridge.executePythonScript('check_face.py', {}, 1000, { priority: 'interactive' });
+      processes[0].finish({ success: true });
+      await call;
+
+      const stats = pythonBridge.getSchedulerStats();
+      expect(stats.running).toBe(0);
+      expect(stats.classes.interactive).toMatchObject({ enqueued: 1, started: 1, completed: 1 });
+      expect(stats.classes.interactive.waitMs.count).toBe(1);
+    });
+
+    test('显式设置为 0 的调度参数保留，并发数至少为 1', () => {
+      const { spawnSync } = jest.requireActual('child_process');
+      const readStats = env => {
+        const result = spawnSync(process.execPath, [
+          '-e', "console.log(JSON.stringify(require('./services/pythonBridge').getSchedulerStats()))"
+        ], { cwd: path.join(__dirname, '..', '..'), env: { ...process.env, ...env }, encoding: 'utf8' });
+        return JSON.parse(result.stdout.trim().split('\n').pop());
+      };
+
+      expect(readStats({
+        PYTHON_MAX_CONCURRENCY: '4', PYTHON_INTERACTIVE_RESERVED: '0', PYTHON_BACKGROUND_MAX_QUEUE: '0'
+      })).toMatchObject({ maxConcurrency: 4, interactiveReserved: 0, backgroundMaxQueue: 0 });
+      expect(readStats({ PYTHON_MAX_CONCURRENCY: '0', PYTHON_BACKGROUND_MAX_QUEUE: 'abc' }))
+        .toMatchObject({ maxConcurrency: 1, interactiveReserved: 0, backgroundMaxQueue: 4 });
+    });
+
+    test('未知优先级直接报错', async () => {
+      await expect(pythonBridge.executePythonScript('check_face.py', {}, 1000, { priority: 'urgent' }))
+        .rejects.toThrow('未知的优先级');
+      expect(spawn).not.toHaveBeenCalled();
+    });
+  });
+  describe('进程组取消', () => {
+    const tick = () => new Promise(resolve => setImmediate(resolve));
+    const exitProcess = (proc, code = 143) => {
+      proc.emit('exit', code, null);
+      proc.emit('close', code);
+    };
+
+    test('以独立进程组启动 Python', async () => {
+      const call = pythonBridge.executePythonScript('check_face.py', {});
+      expect(spawn.mock.calls[0][2]).toMatchObject({ detached: process.platform !== 'win32' });
+      processes[0].finish({ success: true });
+      await call;
+    });
+
+    test('超时先向整个进程组发送 SIGTERM，宽限期后仍未退出再发送 SIGKILL', async () => {
+      const call = pythonBridge.executePythonScript('convert_to_live_photo.py', {}, 20);
+      await expect(call).rejects.toMatchObject({ code: 'TIMEOUT' });
+
+      const pgid = -processes[0].pid;
+      expect(process.kill).toHaveBeenCalledWith(pgid, 'SIGTERM');
+      expect(process.kill).not.toHaveBeenCalledWith(pgid, 'SIGKILL');
+
+      await new Promise(resolve => setTimeout(resolve, 80));
+      expect(process.kill).toHaveBeenCalledWith(pgid, 'SIGKILL');
+      expect(pythonBridge.getProcessStats()).toMatchObject({ timeouts: 1, killed: 1 });
+      exitProcess(processes[0], null);
+    });
+
+    test('宽限期内退出时不再发送 SIGKILL', async () => {
+      const call = pythonBridge.executePythonScript('convert_to_live_photo.py', {}, 20);
+      await expect(call).rejects.toMatchObject({ code: 'TIMEOUT' });
+      exitProcess(processes[0]);
+
+      await new Promise(resolve => setTimeout(resolve, 80));
+      expect(process.kill).not.toHaveBeenCalledWith(-processes[0].pid, 'SIGKILL');
+      expect(pythonBridge.getProcessStats()).toMatchObject({ timeouts: 1, killed: 0 });
+    });
+
+    test('AbortSignal 中止运行中的调用时终止进程组', async () => {
+      const controller = new AbortController();
+      const call = pythonBridge.executePythonScript('check_face.py', {}, 1000, { signal: controller.signal });
+      controller.abort();
+
+      await expect(call).rejects.toMatchObject({ code: 'ABORTED' });
+      await tick();
+      expect(process.kill).toHaveBeenCalledWith(-processes[0].pid, 'SIGTERM');
+      expect(pythonBridge.getProcessStats().aborts).toBe(1);
+      expect(pythonBridge.getSchedulerStats().classes.normal.aborted).toBe(1);
+      exitProcess(processes[0]);
+    });
+
+    test('排队中的调用被中止时直接出队，不启动进程', async () => {
+      const running = [
+        pythonBridge.executePythonScript('check_face.py', {}),
+        pythonBridge.executePythonScript('compress_image.py', {})
+      ];
+      const controller = new AbortController();
+      const queued = pythonBridge.executePythonScript('extract_faces.py', {}, 1000, { signal: controller.signal });
+      controller.abort();
+      await expect(queued).rejects.toMatchObject({ code: 'ABORTED' });
+
+      processes.forEach(proc => proc.finish({ success: true }));
+      await Promise.all(running);
+      expect(spawn).toHaveBeenCalledTimes(2);
+      expect(pythonBridge.getSchedulerStats().classes.normal).toMatchObject({ aborted: 1, started: 2 });
+    });
+
+    test('已中止的 signal 直接拒绝，不进入队列', async () => {
+      const controller = new AbortController();
+      controller.abort();
+      await expect(pythonBridge.executePythonScript('check_face.py', {}, 1000, { signal: controller.signal }))
+        .rejects.toMatchObject({ code: 'ABORTED' });
+      expect(spawn).not.toHaveBeenCalled();
+    });
+
+    test('合并调用中只有部分调用方中止时任务继续执行', async () => {
+      const controller = new AbortController();
+      const first = pythonBridge.executePythonScript('check_face.py', { image_path: 'a.jpg' }, 1000, { signal: controller.signal });
+      const second = pythonBridge.executePythonScript('check_face.py', { image_path: 'a.jpg' });
+      controller.abort();
+
+      await expect(first).rejects.toMatchObject({ code: 'ABORTED' });
+      expect(process.kill).not.toHaveBeenCalled();
+      processes[0].finish({ success: true });
+      await expect(second).resolves.toEqual({ success: true });
+    });
+
+    test('合并的调用方全部中止时终止进程组', async () => {
+      const controllers = [new AbortController(), new AbortController()];
+      const calls = controllers.map(controller =>
+        pythonBridge.executePythonScript('check_face.py', { image_path: 'a.jpg' }, 1000, { signal: controller.signal }));
+      expect(spawn).toHaveBeenCalledTimes(1);
+
+      controllers[0].abort();
+      expect(process.kill).not.toHaveBeenCalled();
+      controllers[1].abort();
+      expect(process.kill).toHaveBeenCalledWith(-processes[0].pid, 'SIGTERM');
+      for (const call of calls) {
+        await expect(call).rejects.toMatchObject({ code: 'ABORTED' });
+      }
+      exitProcess(processes[0]);
+    });
+
+    test('服务关闭时终止所有进程组，宽限期后只对未退出的发送 SIGKILL', async () => {
+      const calls = [
+        pythonBridge.executePythonScript('check_face.py', { image_path: 'a' }).catch(error => error),
+        pythonBridge.executePythonScript('compress_image.py', {}).catch(error => error)
+      ];
+      const shutdown = pythonBridge.terminateAllProcessGroups();
+      processes.forEach(proc => expect(process.kill).toHaveBeenCalledWith(-proc.pid, 'SIGTERM'));
+
+      exitProcess(processes[0]);
+      await new Promise(resolve => setTimeout(resolve, 80));
+      await shutdown;
+      expect(process.kill).not.toHaveBeenCalledWith(-processes[0].pid, 'SIGKILL');
+      expect(process.kill).toHaveBeenCalledWith(-processes[1].pid, 'SIGKILL');
+
+      exitProcess(processes[1], null);
+      await Promise.all(calls);
+      expect(pythonBridge.getProcessStats().running).toBe(0);
+    });
+
+    test('服务关闭时进程组全部退出后立即完成', async () => {
+      const call = pythonBridge.executePythonScript('check_face.py', {}).catch(error => error);
+      const shutdown = pythonBridge.terminateAllProcessGroups();
+      exitProcess(processes[0]);
+      await shutdown;
+      await call;
+      expect(process.kill).not.toHaveBeenCalledWith(-processes[0].pid, 'SIGKILL');
+    });
+
+    test('引用模块不注册信号处理，installShutdownHandlers 重复调用只注册一次', () => {
+      expect(process.listeners('SIGTERM')).toEqual(sigtermListenersBeforeLoad);
+      const sigintBefore = process.listeners('SIGINT');
+
+      pythonBridge.installShutdownHandlers();
+      pythonBridge.installShutdownHandlers();
+      const addedSigterm = process.listeners('SIGTERM').filter(listener => !sigtermListenersBeforeLoad.includes(listener));
+      const addedSigint = process.listeners('SIGINT').filter(listener => !sigintBefore.includes(listener));
+      expect(addedSigterm).toHaveLength(1);
+      expect(addedSigint).toEqual(addedSigterm);
+
+      process.removeListener('SIGTERM', addedSigterm[0]);
+      process.removeListener('SIGINT', addedSigint[0]);
+    });
+
+    (process.platform === 'linux' ? test : test.skip)('Python 退出后回收进程组中残留的子进程', async () => {
+      process.kill.mockRestore();
+      const { spawn: realSpawn } = jest.requireActual('child_process');
+      // 模拟脚本退出时遗留一个后台子进程
+      spawn.mockImplementationOnce((command, args, options) =>
+        realSpawn('sh', ['-c', 'sleep 30 & echo \'{"success": true}\''], options));
+
+      const result = await pythonBridge.executePythonScript('check_face.py', {}, 5000);
+      expect(result).toEqual({ success: true });
+      expect(pythonBridge.getProcessStats()).toMatchObject({ orphansReaped: 1, running: 0 });
+    });
+  });
+});
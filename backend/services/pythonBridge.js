@@ -6,6 +6,15 @@
 const { spawn } = require('child_process');
 const path = require('path');
 const fs = require('fs');
+const os = require('os');
+const { LatencyHistogram } = require('../utils/latencyHistogram');
+const {
+  SHM_OUTPUT,
+  dataUriToSegment,
+  releaseSegment,
+  resolveShmOutputs,
+  sweepStaleSegments
+} = require('../utils/sharedMemory');
 
 // Python 路径优先级：环境变量 > venv > 系统 python3 > python
 const getDefaultPythonPath = () => {
@@ -28,14 +37,629 @@ const getDefaultPythonPath = () => {
 const PYTHON_PATH = process.env.PYTHON_PATH || getDefaultPythonPath();
 const UTILS_PATH = path.join(__dirname, '..', 'utils');
 
+// 各脚本各阶段耗时直方图: scriptName -> { calls, errors, stages: { stageName: LatencyHistogram } }
+// 阶段来自脚本结果中的 timings 字段，另外记录:
+// - bridge_total: 从 spawn 到进程退出的总耗时
+// - python_overhead: bridge_total 减去脚本自报的 total（解释器启动、模块导入、进程间通信）
+const scriptLatencyStats = new Map();
+
+function recordScriptLatency(scriptName, bridgeTotalMs, timings, failed) {
+  let entry = scriptLatencyStats.get(scriptName);
+  if (!entry) {
+    entry = { calls: 0, errors: 0, stages: {} };
+    scriptLatencyStats.set(scriptName, entry);
+  }
+  entry.calls++;
+  if (failed) {
+    entry.errors++;
+  }
+  
+  const recordStage = (stage, ms) => {
+    if (!entry.stages[stage]) {
+      entry.stages[stage] = new LatencyHistogram();
+    }
+    entry.stages[stage].record(ms);
+  };
+  
+  recordStage('bridge_total', bridgeTotalMs);
+  if (timings && typeof timings === 'object') {
+    for (const [stage, ms] of Object.entries(timings)) {
+      recordStage(stage, ms);
+    }
+    if (typeof timings.total === 'number') {
+      recordStage('python_overhead', Math.max(bridgeTotalMs - timings.total, 0));
+    }
+  }
+}
+
+/**
+ * 获取各脚本各阶段的耗时统计
+ * @returns {Object} { scriptName: { calls, errors, stages: { stageName: { count, mean, p50, p90, p99, ... } } } }
+ */
+function getScriptLatencyStats() {
+  const stats = {};
+  for (const [scriptName, entry] of scriptLatencyStats) {
+    const stages = {};
+    for (const [stage, hist] of Object.entries(entry.stages)) {
+      stages[stage] = hist.toJSON();
+    }
+    stats[scriptName] = { calls: entry.calls, errors: entry.errors, stages };
+  }
+  return stats;
+}
+
+/**
+ * 清空耗时统计
+ */
+function resetScriptLatencyStats() {
+  scriptLatencyStats.clear();
+}
+
+// 请求合并（singleflight）：脚本名 + 规范化参数相同的进行中调用共享同一次执行
+// key -> Promise
+const inflightCalls = new Map();
+// scriptName -> { calls, executions, coalesced }
+const coalescingStats = new Map();
+
+/**
+ * 稳定序列化：对象键排序后再序列化，保证键顺序不同的等价参数得到相同的 key
+ * 与 JSON.stringify 一致地忽略 undefined / 函数值
+ */
+function stableStringify(value) {
+  if (value === null || typeof value !== 'object') {
+    return JSON.stringify(value);
+  }
+  if (typeof value.toJSON === 'function') {
+    return stableStringify(value.toJSON());
+  }
+  if (Array.isArray(value)) {
+    return `[${value.map(item => (item === undefined || typeof item === 'function' ? 'null' : stableStringify(item))).join(',')}]`;
+  }
+  const entries = Object.keys(value)
+    .sort()
+    .filter(key => value[key] !== undefined && typeof value[key] !== 'function')
+    .map(key => `${JSON.stringify(key)}:${stableStringify(value[key])}`);
+  return `{${entries.join(',')}}`;
+}
+
+function countCoalescing(scriptName, coalesced) {
+  let entry = coalescingStats.get(scriptName);
+  if (!entry) {
+    entry = { calls: 0, executions: 0, coalesced: 0 };
+    coalescingStats.set(scriptName, entry);
+  }
+  entry.calls++;
+  if (coalesced) {
+    entry.coalesced++;
+  } else {
+    entry.executions++;
+  }
+}
+
+/**
+ * 获取请求合并统计
+ * @returns {Object} { inflight, scripts: { scriptName: { calls, executions, coalesced } } }
+ */
+function getCoalescingStats() {
+  const scripts = {};
+  for (const [scriptName, entry] of coalescingStats) {
+    scripts[scriptName] = { ...entry };
+  }
+  return { inflight: inflightCalls.size, scripts };
+}
+
+/**
+ * 清空请求合并统计（不影响进行中的调用）
+ */
+function resetCoalescingStats() {
+  coalescingStats.clear();
+}
+
+/**
+ * 读取整数环境变量：未设置或无法解析时使用默认值，显式设置的 0 保留
+ */
+function envInt(name, defaultValue) {
+  const parsed = parseInt(process.env[name], 10);
+  return Number.isFinite(parsed) ? parsed : defaultValue;
+}
+
+// 优先级调度：interactive（上传链路等用户在等的调用）> normal > background（导出、批处理）
+// 同时运行的 Python 进程数不超过 PYTHON_MAX_CONCURRENCY，超出的调用按优先级排队
+const PRIORITY_CLASSES = ['interactive', 'normal', 'background'];
+const MAX_CONCURRENCY = Math.max(envInt('PYTHON_MAX_CONCURRENCY', os.cpus().length), 1);
+// 为 interactive 预留的进程槽位：background 只能使用剩余槽位（0 表示不预留）
+const INTERACTIVE_RESERVED = Math.max(
+  Math.min(envInt('PYTHON_INTERACTIVE_RESERVED', 1), MAX_CONCURRENCY - 1),
+  0
+);
+// background 排队数上限，超出时直接拒绝（卸载负载）；0 表示不排队，没有空闲槽位时立即拒绝
+const BACKGROUND_MAX_QUEUE = Math.max(envInt('PYTHON_BACKGROUND_MAX_QUEUE', MAX_CONCURRENCY * 4), 0);
+
+const runQueues = { interactive: [], normal: [], background: [] };
+let runningCount = 0;
+let runningBackground = 0;
+
+function createClassStats() {
+  return {
+    enqueued: 0,
+    started: 0,
+    completed: 0,
+    failed: 0,
+    shed: 0,
+    expired: 0,
+    aborted: 0,
+    waitMs: new LatencyHistogram()
+  };
+}
+const schedulerStats = Object.fromEntries(PRIORITY_CLASSES.map(cls => [cls, createClassStats()]));
+
+function schedulerError(message, code) {
+  const error = new Error(message);
+  error.code = code;
+  return error;
+}
+
+function abortError(scriptName) {
+  return schedulerError(`Python脚本 ${scriptName} 已取消`, 'ABORTED');
+}
+
+function removeFromQueue(job) {
+  const queue = runQueues[job.priority];
+  const idx = queue.indexOf(job);
+  if (idx !== -1) {
+    queue.splice(idx, 1);
+  }
+}
+
+/**
+ * 按优先级取出下一个可运行的任务，顺带丢弃已过期的任务
+ */
+function nextRunnableJob() {
+  for (const cls of PRIORITY_CLASSES) {
+    if (cls === 'background' && runningCount >= MAX_CONCURRENCY - INTERACTIVE_RESERVED) {
+      return null;
+    }
+    const queue = runQueues[cls];
+    while (queue.length > 0) {
+      const job = queue.shift();
+      if (job.deadline && Date.now() > job.deadline) {
+        expireJob(job);
+        continue;
+      }
+      return job;
+    }
+  }
+  return null;
+}
+
+function expireJob(job) {
+  clearTimeout(job.deadlineTimer);
+  job.state = 'expired';
+  schedulerStats[job.priority].expired++;
+  console.warn(`[PythonBridge] ${job.scriptName} 排队超过截止时间，已丢弃 (${job.priority})`);
+  job.reject(schedulerError(`Python脚本 ${job.scriptName} 排队超过截止时间，未执行`, 'DEADLINE_EXCEEDED'));
+}
+
+function dispatchJobs() {
+  while (runningCount < MAX_CONCURRENCY) {
+    const job = nextRunnableJob();
+    if (!job) {
+      return;
+    }
+    clearTimeout(job.deadlineTimer);
+    job.state = 'running';
+    runningCount++;
+    if (job.priority === 'background') {
+      runningBackground++;
+    }
+    const stats = schedulerStats[job.priority];
+    stats.started++;
+    stats.waitMs.record(Date.now() - job.enqueuedAt);
+    
+    spawnPythonScript(job.scriptName, job.params, job.timeout, job.controller.signal)
+      .then(
+        (result) => {
+          stats.completed++;
+          job.resolve(result);
+        },
+        (error) => {
+          if (error.code === 'ABORTED') {
+            stats.aborted++;
+          } else {
+            stats.failed++;
+          }
+          job.reject(error);
+        }
+      )
+      .finally(() => {
+        runningCount--;
+        if (job.priority === 'background') {
+          runningBackground--;
+        }
+        dispatchJobs();
+      });
+  }
+}
+
+/**
+ * 把调用放入对应优先级的队列并尝试调度
+ */
+function scheduleJob(scriptName, params, timeout, priority, deadline) {
+  let job;
+  const promise = new Promise((resolve, reject) => {
+    job = {
+      scriptName, params, timeout, priority, deadline,
+      enqueuedAt: Date.now(),
+      state: 'queued',
+      // 仍在等待结果的调用方数，降为 0 时取消任务（见 waitForJob）
+      waiters: 0,
+      controller: new AbortController(),
+      resolve, reject
+    };
+  });
+  
+  const stats = schedulerStats[priority];
+  // 能立即启动的 background 任务不占排队名额（有空闲槽位且没有任何任务在排队）
+  const canStartNow = runningCount < MAX_CONCURRENCY - INTERACTIVE_RESERVED &&
+    PRIORITY_CLASSES.every(cls => runQueues[cls].length === 0);
+  if (priority === 'background' && !canStartNow && runQueues.background.length >= BACKGROUND_MAX_QUEUE) {
+    stats.shed++;
+    console.warn(`[PythonBridge] background 队列已满，拒绝 ${scriptName}`);
+    job.state = 'shed';
+    job.reject(schedulerError(`Python任务队列繁忙，已拒绝后台任务 ${scriptName}`, 'QUEUE_SHED'));
+    return { job, promise };
+  }
+  
+  stats.enqueued++;
+  runQueues[priority].push(job);
+  if (deadline) {
+    // 截止时间到达时仍在排队则立即丢弃，调用方不必等到轮到它
+    job.deadlineTimer = setTimeout(() => {
+      if (job.state === 'queued') {
+        removeFromQueue(job);
+        expireJob(job);
+      }
+    }, Math.max(deadline - Date.now(), 0));
+  }
+  dispatchJobs();
+  return { job, promise };
+}
+
+/**
+ * 取消任务：排队中的直接移出队列，运行中的终止整个进程组
+ */
+function cancelJob(job) {
+  if (job.state === 'queued') {
+    clearTimeout(job.deadlineTimer);
+    removeFromQueue(job);
+    job.state = 'aborted';
+    schedulerStats[job.priority].aborted++;
+    console.warn(`[PythonBridge] ${job.scriptName} 排队中被取消 (${job.priority})`);
+    job.reject(abortError(job.scriptName));
+  } else if (job.state === 'running') {
+    job.controller.abort();
+  }
+}
+
+/**
+ * 调用方等待任务结果
+ * 调用方的 signal 中止时该调用方立即以 ABORTED 返回；合并到同一任务的调用方都已中止
+ * （且没有不带 signal 的调用方）时才取消任务本身
+ */
+function waitForJob(job, promise, signal) {
+  job.waiters++;
+  if (!signal) {
+    return promise;
+  }
+  return new Promise((resolve, reject) => {
+    const onAbort = () => {
+      reject(abortError(job.scriptName));
+      job.waiters--;
+      if (job.waiters === 0) {
+        cancelJob(job);
+      }
+    };
+    signal.addEventListener('abort', onAbort, { once: true });
+    promise
+      .then(resolve, reject)
+      .finally(() => signal.removeEventListener('abort', onAbort));
+  });
+}
+
+/**
+ * 合并调用时提升仍在排队的任务：取更高的优先级与更晚的截止时间
+ */
+function promoteJob(job, priority, deadline) {
+  if (job.state !== 'queued') {
+    return;
+  }
+  if (!deadline || !job.deadline) {
+    job.deadline = null;
+    clearTimeout(job.deadlineTimer);
+  } else if (deadline > job.deadline) {
+    job.deadline = deadline;
+    clearTimeout(job.deadlineTimer);
+    job.deadlineTimer = setTimeout(() => {
+      if (job.state === 'queued') {
+        removeFromQueue(job);
+        expireJob(job);
+      }
+    }, Math.max(deadline - Date.now(), 0));
+  }
+  if (PRIORITY_CLASSES.indexOf(priority) < PRIORITY_CLASSES.indexOf(job.priority)) {
+    removeFromQueue(job);
+    job.priority = priority;
+    runQueues[priority].push(job);
+    dispatchJobs();
+  }
+}
+
+/**
+ * 获取调度统计
+ * @returns {Object} { maxConcurrency, interactiveReserved, backgroundMaxQueue, running, runningBackground, classes: { cls: { queued, enqueued, started, completed, failed, shed, expired, waitMs } } }
+ */
+function getSchedulerStats() {
+  const classes = {};
+  for (const cls of PRIORITY_CLASSES) {
+    const { waitMs, ...counters } = schedulerStats[cls];
+    classes[cls] = { queued: runQueues[cls].length, ...counters, waitMs: waitMs.toJSON() };
+  }
+  return {
+    maxConcurrency: MAX_CONCURRENCY,
+    interactiveReserved: INTERACTIVE_RESERVED,
+    backgroundMaxQueue: BACKGROUND_MAX_QUEUE,
+    running: runningCount,
+    runningBackground,
+    classes
+  };
+}
+
+/**
+ * 清空调度统计（不影响排队和运行中的任务）
+ */
+function resetSchedulerStats() {
+  for (const cls of PRIORITY_CLASSES) {
+    schedulerStats[cls] = createClassStats();
+  }
+}
+
+// 进程组取消：Python 以独立进程组启动（进程组 ID 即其 pid），ffmpeg 等子进程与之同组
+// 超时或取消时先向整个进程组发送 SIGTERM（Python 端 cancellation.py 清理临时文件后退出），
+// 宽限期后仍未退出再发送 SIGKILL；Python 退出后进程组中残留的子进程视为孤儿进程并强制结束
+const USE_PROCESS_GROUPS = process.platform !== 'win32';
+const KILL_GRACE_MS = Math.max(envInt('PYTHON_KILL_GRACE_MS', 2000), 0);
+
+const runningProcesses = new Set();
+
+function createProcessStats() {
+  return {
+    timeouts: 0,
+    aborts: 0,
+    // 宽限期后仍未退出、升级为 SIGKILL 的次数
+    killed: 0,
+    orphansReaped: 0
+  };
+}
+let processStats = createProcessStats();
+
+/**
+ * 向 Python 进程所在的整个进程组发送信号（进程组已不存在时忽略）
+ */
+function signalProcessGroup(child, signal) {
+  try {
+    if (USE_PROCESS_GROUPS && child.pid) {
+      process.kill(-child.pid, signal);
+    } else {
+      child.kill(signal);
+    }
+  } catch (error) {
+    if (error.code !== 'ESRCH') {
+      console.error(`[PythonBridge] 发送 ${signal} 失败:`, error.message);
+    }
+  }
+}
+
+/**
+ * 统计进程组中仍存活（非僵尸）的进程数；没有 /proc 时按 1 计
+ */
+function countProcessGroupMembers(pgid) {
+  let names;
+  try {
+    names = fs.readdirSync('/proc');
+  } catch (error) {
+    return 1;
+  }
+  let count = 0;
+  for (const name of names) {
+    if (!/^\d+$/.test(name)) {
+      continue;
+    }
+    try {
+      const stat = fs.readFileSync(`/proc/${name}/stat`, 'utf8');
+      // 格式: pid (comm) state ppid pgrp ...，comm 可能含空格，从最后一个 ')' 之后解析
+      const fields = stat.slice(stat.lastIndexOf(')') + 2).split(' ');
+      if (fields[0] !== 'Z' && Number(fields[2]) === pgid) {
+        count++;
+      }
+    } catch (error) {
+      // 进程已退出
+    }
+  }
+  return count;
+}
+
+/**
+ * Python 进程退出后强制结束进程组中残留的子进程
+ * @returns {number} 结束的孤儿进程数
+ */
+function reapOrphans(child, scriptName) {
+  if (!USE_PROCESS_GROUPS || !child.pid) {
+    return 0;
+  }
+  try {
+    process.kill(-child.pid, 0);
+  } catch (error) {
+    // 进程组已没有成员
+    return 0;
+  }
+  const orphans = countProcessGroupMembers(child.pid);
+  if (orphans === 0) {
+    return 0;
+  }
+  signalProcessGroup(child, 'SIGKILL');
+  processStats.orphansReaped += orphans;
+  console.warn(`[PythonBridge] ${scriptName} 退出后进程组中残留 ${orphans} 个子进程，已强制结束`);
+  return orphans;
+}
+
+/**
+ * 结束所有运行中的 Python 进程组：先 SIGTERM，宽限期后仍有未退出的再 SIGKILL
+ * @returns {Promise<void>} 全部退出或已发送 SIGKILL 后 resolve
+ */
+function terminateAllProcessGroups() {
+  const children = [...runningProcesses];
+  if (children.length === 0) {
+    return Promise.resolve();
+  }
+  children.forEach(child => signalProcessGroup(child, 'SIGTERM'));
+  return new Promise((resolve) => {
+    const killTimer = setTimeout(() => {
+      for (const child of runningProcesses) {
+        signalProcessGroup(child, 'SIGKILL');
+      }
+      resolve();
+    }, KILL_GRACE_MS);
+    const onExit = () => {
+      if (children.every(child => !runningProcesses.has(child))) {
+        clearTimeout(killTimer);
+        resolve();
+      }
+    };
+    children.forEach(child => child.once('exit', onExit));
+  });
+}
+
+// 独立进程组不会随终端 Ctrl-C / docker stop 的信号一起退出，而 Node 被信号终止时不会触发 'exit'，
+// 因此在 SIGINT / SIGTERM 时先结束所有进程组再退出；再次收到信号时立即退出（由 'exit' 兜底 SIGKILL）
+let shuttingDown = false;
+let shutdownHandlersInstalled = false;
+function handleShutdownSignal(signal) {
+  const exitCode = 128 + os.constants.signals[signal];
+  if (shuttingDown) {
+    process.exit(exitCode);
+  }
+  shuttingDown = true;
+  if (runningProcesses.size > 0) {
+    console.log(`[PythonBridge] 收到 ${signal}，结束 ${runningProcesses.size} 个运行中的 Python 进程组后退出`);
+  }
+  terminateAllProcessGroups().then(() => process.exit(exitCode));
+}
+
+/**
+ * 注册 SIGINT / SIGTERM 处理：结束所有 Python 进程组后退出
+ * 由服务入口（server.js）调用；只引用本模块的脚本与测试不会改变进程的信号行为。重复调用只注册一次
+ */
+function installShutdownHandlers() {
+  if (shutdownHandlersInstalled) {
+    return;
+  }
+  shutdownHandlersInstalled = true;
+  process.on('SIGINT', handleShutdownSignal);
+  process.on('SIGTERM', handleShutdownSignal);
+}
+
+// 服务退出时结束仍在运行的 Python 进程组
+process.on('exit', () => {
+  for (const child of runningProcesses) {
+    signalProcessGroup(child, 'SIGKILL');
+  }
+});
+
+/**
+ * 获取进程取消统计
+ * @returns {Object} { running, killGraceMs, timeouts, aborts, killed, orphansReaped }
+ */
+function getProcessStats() {
+  return { running: runningProcesses.size, killGraceMs: KILL_GRACE_MS, ...processStats };
+}
+
+/**
+ * 清空进程取消统计（不影响运行中的进程）
+ */
+function resetProcessStats() {
+  processStats = createProcessStats();
+}
+
 /**
  * 通用Python脚本执行函数
  * 通过 stdin 传递参数，避免命令行参数过长导致 E2BIG 错误
+ * 脚本与参数完全相同的并发调用会合并为一次执行，后到的调用直接等待首个调用的结果
+ * （结果对象在调用方之间共享，调用方不应修改）
+ * @param scriptName 脚本名称
+ * @param params 参数对象
+ * @param timeout 超时时间(毫秒)，从进程启动开始计算，不含排队时间
+ * @param options 可选项 {
+ *   priority: 优先级 interactive / normal（默认）/ background,
+ *   deadline: 截止时间（Date.now() 毫秒时间戳），排队超过截止时间的调用直接丢弃（错误码 DEADLINE_EXCEEDED）,
+ *   profile: 开启 cProfile/tracemalloc 剖析（仅供服务端内部调用，不由请求参数控制）, requestId: 剖析结果目录名,
+ *   coalesce: 是否参与请求合并（默认 true，剖析调用不合并）,
+ *   signal: AbortSignal，中止时调用方以错误码 ABORTED 返回，无其他调用方等待时取消排队或终止进程组
+ * }
+ * background 队列满时直接拒绝（错误码 QUEUE_SHED）
+ * 剖析也可通过环境变量 PY_PROFILE=1 对所有调用开启（子进程继承环境变量）
+ */
+async function executePythonScript(scriptName, params, timeout = 60000, options = {}) {
+  const priority = options.priority || 'normal';
+  if (!PRIORITY_CLASSES.includes(priority)) {
+    throw new Error(`未知的优先级: ${priority}`);
+  }
+  const deadline = options.deadline || null;
+  const signal = options.signal || null;
+  if (signal && signal.aborted) {
+    throw abortError(scriptName);
+  }
+  
+  if (options.profile) {
+    params = { ...params, _profile: true, _request_id: options.requestId };
+  }
+  
+  if (options.coalesce === false || options.profile) {
+    countCoalescing(scriptName, false);
+    const { job, promise } = scheduleJob(scriptName, params, timeout, priority, deadline);
+    return waitForJob(job, promise, signal);
+  }
+  
+  const key = `${scriptName}\n${stableStringify(params)}`;
+  const inflight = inflightCalls.get(key);
+  // 正在被取消的任务不再接收新的调用方
+  if (inflight && inflight.job.state !== 'aborted' && !inflight.job.controller.signal.aborted) {
+    countCoalescing(scriptName, true);
+    console.log(`[PythonBridge] 合并到进行中的调用: ${scriptName}`);
+    promoteJob(inflight.job, priority, deadline);
+    return waitForJob(inflight.job, inflight.promise, signal);
+  }
+  
+  countCoalescing(scriptName, false);
+  const { job, promise } = scheduleJob(scriptName, params, timeout, priority, deadline);
+  const entry = { job, promise };
+  inflightCalls.set(key, entry);
+  const release = () => {
+    if (inflightCalls.get(key) === entry) {
+      inflightCalls.delete(key);
+    }
+  };
+  promise.then(release, release);
+  return waitForJob(job, promise, signal);
+}
+
+/**
+ * 启动Python进程执行脚本
  * @param scriptName 脚本名称
  * @param params 参数对象
  * @param timeout 超时时间(毫秒)
+ * @param signal AbortSignal（可选），中止时终止整个进程组
  */
-async function executePythonScript(scriptName, params, timeout = 60000) {
+function spawnPythonScript(scriptName, params, timeout, signal = null) {
   return new Promise((resolve, reject) => {
     try {
       const scriptPath = path.join(UTILS_PATH, scriptName);
@@ -51,8 +675,34 @@ async function executePythonScript(scriptName, params, timeout = 60000) {
       console.log(`[PythonBridge] 参数:`, JSON.stringify(params).substring(0, 200));
       
       // 不再通过命令行参数传递，改用 stdin
+      const startedAt = process.hrtime.bigint();
+      const elapsedMs = () => Number(process.hrtime.bigint() - startedAt) / 1e6;
       const pythonProcess = spawn(PYTHON_PATH, [scriptPath], {
-        stdio: ['pipe', 'pipe', 'pipe']
+        stdio: ['pipe', 'pipe', 'pipe'],
+        // 独立进程组，取消时连同子进程一起终止
+        detached: USE_PROCESS_GROUPS
+      });
+      runningProcesses.add(pythonProcess);
+      
+      // 先 SIGTERM 让 Python 清理，宽限期后 SIGKILL
+      let killTimer = null;
+      const terminate = (reason) => {
+        if (killTimer) {
+          return;
+        }
+        processStats[reason]++;
+        signalProcessGroup(pythonProcess, 'SIGTERM');
+        killTimer = setTimeout(() => {
+          processStats.killed++;
+          console.warn(`[PythonBridge] ${scriptName} 宽限期 ${KILL_GRACE_MS}ms 后仍未退出，发送 SIGKILL`);
+          signalProcessGroup(pythonProcess, 'SIGKILL');
+        }, KILL_GRACE_MS);
+      };
+      
+      pythonProcess.on('exit', () => {
+        clearTimeout(killTimer);
+        runningProcesses.delete(pythonProcess);
+        reapOrphans(pythonProcess, scriptName);
       });
       
       let stdout = '';
@@ -76,6 +726,7 @@ async function executePythonScript(scriptName, params, timeout = 60000) {
           console.error(`退出码: ${code}`);
           console.error(`stderr: ${stderr}`);
           console.error(`stdout: ${stdout}`);
+          recordScriptLatency(scriptName, elapsedMs(), null, true);
           reject(new Error(`Python脚本执行失败 (退出码 ${code}): ${stderr || stdout || '未知错误'}`));
           return;
         }
@@ -85,31 +736,52 @@ async function executePythonScript(scriptName, params, timeout = 60000) {
           if (!stdout || stdout.trim() === '') {
             console.error(`Python脚本 ${scriptName} 没有输出`);
             console.error(`stderr: ${stderr}`);
+            recordScriptLatency(scriptName, elapsedMs(), null, true);
             reject(new Error(`Python脚本没有输出: ${stderr || '未知错误'}`));
             return;
           }
           
           const result = JSON.parse(stdout);
+          recordScriptLatency(scriptName, elapsedMs(), result.timings, result.success === false);
+          if (result.profile) {
+            console.log(`[PythonBridge] ${scriptName} 剖析结果: ${result.profile.dump_dir}`);
+          }
           resolve(result);
         } catch (parseError) {
           console.error('解析Python脚本输出失败:', parseError);
           console.error('stdout内容:', stdout);
           console.error('stderr内容:', stderr);
+          recordScriptLatency(scriptName, elapsedMs(), null, true);
           reject(new Error(`解析Python脚本输出失败: ${parseError.message}. stdout: ${stdout.substring(0, 200)}`));
         }
       });
       
       pythonProcess.on('error', (error) => {
         console.error(`Python进程错误 ${scriptName}:`, error);
+        runningProcesses.delete(pythonProcess);
         reject(new Error(`Python进程启动失败: ${error.message}. 请确保Python已安装且路径正确: ${PYTHON_PATH}`));
       });
       
       const timeoutId = setTimeout(() => {
-        pythonProcess.kill();
-        reject(new Error(`Python脚本 ${scriptName} 执行超时 (${timeout}ms)`));
+        terminate('timeouts');
+        reject(schedulerError(`Python脚本 ${scriptName} 执行超时 (${timeout}ms)`, 'TIMEOUT'));
       }, timeout);
       
-      pythonProcess.on('close', () => clearTimeout(timeoutId));
+      const onAbort = () => {
+        console.warn(`[PythonBridge] ${scriptName} 已取消，终止进程组`);
+        terminate('aborts');
+        reject(abortError(scriptName));
+      };
+      if (signal) {
+        signal.addEventListener('abort', onAbort, { once: true });
+      }
+      
+      pythonProcess.on('close', () => {
+        clearTimeout(timeoutId);
+        if (signal) {
+          signal.removeEventListener('abort', onAbort);
+        }
+      });
       
       // 通过 stdin 传递参数（避免 E2BIG 错误）
       try {
@@ -119,7 +791,7 @@ async function executePythonScript(scriptName, params, timeout = 60000) {
         pythonProcess.stdin.end();
       } catch (stdinError) {
         console.error(`[PythonBridge] stdin写入失败:`, stdinError);
-        pythonProcess.kill();
+        signalProcessGroup(pythonProcess, 'SIGKILL');
         reject(new Error(`参数传递失败: ${stdinError.message}`));
       }
       
@@ -130,30 +802,126 @@ async function executePythonScript(scriptName, params, timeout = 60000) {
   });
 }
 
+// 定期清理进程超时被杀等情况下遗留的共享内存段
+setInterval(sweepStaleSegments, 5 * 60 * 1000).unref();
+
+/**
+ * 把 Base64 数据URI 写入共享内存段，Python 端直接映射解码，不再经过 stdin JSON 与 Base64
+ * @returns {Object} { path: 传给 Python 的路径（非数据URI 原样返回）, segment: 段信息或 null }
+ */
+function toShmInput(imagePath) {
+  const segment = dataUriToSegment(imagePath);
+  return { path: segment ? segment.ref : imagePath, segment };
+}
+
+/**
+ * 批量人脸校验：多张图片在同一个 Python 进程中并行检测
+ * @param imageUrls 图片URL或Base64数据URI数组
+ * @param options 可选 { minFaceSize, confidenceThreshold, gate: 是否先在缩小图上粗检测, signal: AbortSignal }
+ * @returns {Object} { success, results: 逐张结果（与 imageUrls 对应）, summary, message }
+ */
+async function checkFaces(imageUrls, options = {}) {
+  const inputs = imageUrls.map(toShmInput);
+  const params = {
+    image_paths: inputs.map(input => input.path),
+    min_face_size: options.minFaceSize ?? 80,
+    confidence_threshold: options.confidenceThreshold ?? 0.7,
+    gate: options.gate ?? true
+  };
+  
+  try {
+    return await executePythonScript('check_face.py', params, 60000, { priority: 'interactive', signal: options.signal });
+  } finally {
+    inputs.forEach(input => input.segment && releaseSegment(input.segment.name));
+  }
+}
+
 /**
  * 提取人脸
- * @param imageUrls 图片URL数组
+ * 裁剪图经共享内存段返回，结果中仍以 image_base64 提供
+ * @param imageUrls 图片URL或Base64数据URI数组
+ * @param options 可选 {
+ *   cropSize: 统一裁剪尺寸（正方形边长），cropMargin: 人脸框每侧边距比例，cropFormat: png / jpeg,
+ *   pack: array / sprite（需指定 cropSize），打包结果在 result.packed 中（data_base64 / image_base64）,
+ *   signal: AbortSignal，客户端断开时取消
+ * }
  */
-async function extractFaces(imageUrls) {
+async function extractFaces(imageUrls, options = {}) {
+  const inputs = imageUrls.map(toShmInput);
   const params = {
-    image_paths: imageUrls,
+    image_paths: inputs.map(input => input.path),
+    output_dir: SHM_OUTPUT,
     min_face_size: 50,
     confidence_threshold: 0.3
   };
+  if (options.cropSize) {
+    params.crop_size = options.cropSize;
+    params.crop_margin = options.cropMargin ?? 0.1;
+    params.crop_format = options.cropFormat || 'png';
+    if (options.pack) {
+      params.pack = options.pack;
+    }
+  }
   
-  const result = await executePythonScript('extract_faces.py', params, 60000);
-  return result;
+  try {
+    const result = resolveShmOutputs(
+      await executePythonScript('extract_faces.py', params, 60000, { priority: 'interactive', signal: options.signal })
+    );
+    // 共享内存段引用只在服务端内部使用，source_image 还原为调用方传入的原始值
+    // （合并调用共享结果对象，这里复制后再改写）
+    const originals = new Map(inputs.map((input, i) => [input.path, imageUrls[i]]));
+    if (!Array.isArray(result.faces)) {
+      return result;
+    }
+    return {
+      ...result,
+      faces: result.faces.map(face => (
+        originals.has(face.source_image) ? { ...face, source_image: originals.get(face.source_image) } : face
+      ))
+    };
+  } finally {
+    inputs.forEach(input => input.segment && releaseSegment(input.segment.name));
+  }
+}
+
+/**
+ * 上传图片组合处理：一次进程调用、一次解码完成人脸校验/人脸提取/压缩/加水印
+ * @param imagePath 图片路径、URL或Base64数据URI（数据URI 经共享内存段传给 Python）
+ * @param stages 阶段列表 check_face / extract_faces / compress / watermark
+ * @param options 各阶段参数 { check_face: {...}, extract_faces: {...}, compress: {...}, watermark: {...} }
+ *                输出路径 / output_dir 设为 SHM_OUTPUT 时，结果以 output_buffer / image_base64 返回
+ * @param stopOnFail check_face 未通过时是否跳过后续阶段
+ * @param callOptions 可选 { signal: AbortSignal }
+ */
+async function processUpload(imagePath, stages = ['check_face', 'extract_faces', 'compress'], options = {}, stopOnFail = true, callOptions = {}) {
+  const input = toShmInput(imagePath);
+  const params = {
+    image_path: input.path,
+    stages: stages,
+    options: options,
+    stop_on_fail: stopOnFail
+  };
+  
+  try {
+    const result = await executePythonScript('process_upload.py', params, 120000, { priority: 'interactive', signal: callOptions.signal });
+    return resolveShmOutputs(result);
+  } finally {
+    if (input.segment) {
+      releaseSegment(input.segment.name);
+    }
+  }
 }
 
 /**
  * 添加水印
- * @param imagePath 图片路径
- * @param outputPath 输出路径
+ * @param imagePath 图片路径或共享内存段引用
+ * @param outputPath 输出路径，为 SHM_OUTPUT 时结果以 output_buffer 返回
  * @param watermarkText 水印文字
  * @param qrUrl 二维码URL
  * @param position 水印位置
+ * @param callOptions 可选 { signal: AbortSignal }
  */
-async function addWatermark(imagePath, outputPath = null, watermarkText = 'AI全家福制作\n扫码去水印', qrUrl = 'https://your-domain.com/pay', position = 'center') {
+async function addWatermark(imagePath, outputPath = null, watermarkText = 'AI全家福制作\n扫码去水印', qrUrl = 'https://your-domain.com/pay', position = 'center', callOptions = {}) {
   const params = {
     image_path: imagePath,
     output_path: outputPath,
@@ -162,7 +930,9 @@ async function addWatermark(imagePath, outputPath = null, watermarkText = 'AI全
     position: position
   };
   
-  const result = await executePythonScript('add_watermark.py', params, 30000);
+  const result = resolveShmOutputs(
+    await executePythonScript('add_watermark.py', params, 30000, { priority: 'interactive', signal: callOptions.signal })
+  );
   
   if (!result.success) {
     throw new Error(result.message || '水印添加失败');
@@ -175,14 +945,15 @@ async function addWatermark(imagePath, outputPath = null, watermarkText = 'AI全
  * 转换为Live Photo格式
  * @param videoUrl 视频URL
  * @param outputPath 输出路径
+ * @param callOptions 可选 { signal: AbortSignal }
  */
-async function convertToLivePhoto(videoUrl, outputPath = null) {
+async function convertToLivePhoto(videoUrl, outputPath = null, callOptions = {}) {
   const params = {
     video_url: videoUrl,
     output_path: outputPath
   };
   
-  const result = await executePythonScript('convert_to_live_photo.py', params, 60000);
+  const result = await executePythonScript('convert_to_live_photo.py', params, 60000, { signal: callOptions.signal });
   
   if (!result.success) {
     throw new Error(result.message || 'Live Photo转换失败');
@@ -195,14 +966,25 @@ async function convertToLivePhoto(videoUrl, outputPath = null) {
  * 导出订单Excel
  * @param orders 订单数据数组
  * @param outputPath 输出路径
+ * @param options 增量导出选项 {
+ *   incremental, manifestPath, mode: 'delta' | 'append',
+ *   deferManifest: 不由 Python 保存清单，新清单在 result.manifest 中返回，由调用方在文件交付后写入
+ * }
  */
-async function exportOrdersExcel(orders, outputPath = null) {
+async function exportOrdersExcel(orders, outputPath = null, options = {}) {
   const params = {
     orders: orders,
     output_path: outputPath
   };
   
-  const result = await executePythonScript('export_orders_excel.py', params, 30000);
+  if (options.incremental) {
+    params.incremental = true;
+    params.manifest_path = options.manifestPath;
+    params.mode = options.mode || 'delta';
+    params.commit_manifest = !options.deferManifest;
+  }
+  
+  const result = await executePythonScript('export_orders_excel.py', params, 30000, { priority: 'background' });
   
   if (!result.success) {
     throw new Error(result.message || 'Excel导出失败');
@@ -212,8 +994,23 @@ async function exportOrdersExcel(orders, outputPath = null) {
 }
 
 module.exports = {
+  PYTHON_PATH,
+  SHM_OUTPUT,
   executePythonScript,
+  stableStringify,
+  getScriptLatencyStats,
+  resetScriptLatencyStats,
+  getCoalescingStats,
+  resetCoalescingStats,
+  getSchedulerStats,
+  resetSchedulerStats,
+  getProcessStats,
+  resetProcessStats,
+  terminateAllProcessGroups,
+  installShutdownHandlers,
+  checkFaces,
   extractFaces,
+  processUpload,
   addWatermark,
   convertToLivePhoto,
   exportOrdersExcel
@@ -0,0 +1,78 @@
+/**
+ * 平铺水印测试（add_watermark.py）
+ * 直接调用 Python 函数，需要本机可用的 Python（PYTHON_PATH，与 pythonBridge 相同）及 Pillow / NumPy / qrcode，不可用时跳过
+ */
+
+const path = require('path');
+const { spawnSync } = require('child_process');
+const { PYTHON_PATH } = require('../../services/pythonBridge');
+
+const UTILS_DIR = path.join(__dirname, '..');
+
+const imagingAvailable = !spawnSync(PYTHON_PATH, ['--version']).error &&
+  spawnSync(PYTHON_PATH, ['-c', 'import numpy, PIL, qrcode']).status === 0;
+
+/**
+ * 在 utils 目录下执行 Python 代码，stdin 传入 JSON，返回解析后的 stdout
+ */
+function callFunction(code, input) {
+  const result = spawnSync(PYTHON_PATH, ['-c', `import json, sys\n${code}`], {
+    cwd: UTILS_DIR,
+    input: JSON.stringify(input),
+    encoding: 'utf8'
+  });
+  if (result.status !== 0) {
+    throw new Error(result.stderr || result.stdout);
+  }
+  return JSON.parse(result.stdout.trim().split('\n').pop());
+}
+
+// 定点合成结果与两种参考实现比较：
+// - RGBA 路径：图块按周期贴到整图大小的透明图层，Image.alpha_composite 后转回 RGB
+// - 浮点路径：px * (1 - a / 255) + color * a / 255 后四舍五入
+// 图片短边小于 640 时图块基准尺寸固定为 160；宽高取整数个图块再加半个不透明区域，
+// 右/下边缘的图块被截断且截断部分包含水印
+const COMPARE_REFERENCE = `
+import numpy as np
+from PIL import Image
+from add_watermark import apply_watermark, _render_tile
+position = json.load(sys.stdin)
+tile = _render_tile('AI全家福制作\\n扫码去水印', 'https://your-domain.com/pay', 160, position == 'diagonal')
+tile_alpha = np.asarray(tile)[:, :, 3]
+rows, cols = np.flatnonzero(tile_alpha.any(axis=1)), np.flatnonzero(tile_alpha.any(axis=0))
+width = tile.width * 3 + (cols[0] + cols[-1]) // 2
+height = tile.height * 2 + (rows[0] + rows[-1]) // 2
+src = np.random.default_rng(1).integers(0, 256, (height, width, 3), dtype=np.uint8)
+
+layer = Image.new('RGBA', (width, height), (0, 0, 0, 0))
+for y in range(0, height, tile.height):
+    for x in range(0, width, tile.width):
+        layer.paste(tile, (x, y))
+rgba_reference = np.asarray(Image.alpha_composite(Image.fromarray(src).convert('RGBA'), layer).convert('RGB'), np.int16)
+overlay = np.asarray(layer, np.float64)
+alpha = overlay[:, :, 3:4] / 255
+float_reference = np.rint(src * (1 - alpha) + overlay[:, :, :3] * alpha)
+
+output = np.asarray(apply_watermark(Image.fromarray(src), position=position), np.int16)
+edge_x, edge_y = width - width % tile.width, height - height % tile.height
+print(json.dumps({
+    'short_side': int(min(width, height)),
+    'partial_edges': [int(width % tile.width), int(height % tile.height)],
+    'edge_blended': [bool((output[:, edge_x:] != src[:, edge_x:]).any()), bool((output[edge_y:] != src[edge_y:]).any())],
+    'rgba_max_diff': int(np.abs(output - rgba_reference).max()),
+    'float_max_diff': int(np.abs(output - float_reference).max())
+}))
+`;
+
+(imagingAvailable ? describe : describe.skip)('平铺水印定点合成', () => {
+  ['tiled', 'diagonal'].forEach(position => {
+    test(`${position} 与 RGBA / 浮点参考实现逐通道相差不超过 1（含截断的边缘图块）`, () => {
+      const result = callFunction(COMPARE_REFERENCE, position);
+      expect(result.short_side).toBeLessThan(640);
+      result.partial_edges.forEach(remainder => expect(remainder).toBeGreaterThan(0));
+      expect(result.edge_blended).toEqual([true, true]);
+      expect(result.rgba_max_diff).toBeLessThanOrEqual(1);
+      expect(result.float_max_diff).toBeLessThanOrEqual(1);
+    });
+  });
+});
@@ -0,0 +1,157 @@
+/**
+ * 订单增量导出测试（export_orders_excel.py）
+ * 直接调用 Python 函数与脚本，需要本机可用的 Python（PYTHON_PATH，与 pythonBridge 相同），不可用时跳过；
+ * 写文件的用例另外需要 openpyxl
+ */
+
+const fs = require('fs');
+const os = require('os');
+const path = require('path');
+const { spawnSync } = require('child_process');
+const { PYTHON_PATH } = require('../../services/pythonBridge');
+
+const UTILS_DIR = path.join(__dirname, '..');
+
+const pythonAvailable = !spawnSync(PYTHON_PATH, ['--version']).error;
+const openpyxlAvailable = pythonAvailable && spawnSync(PYTHON_PATH, ['-c', 'import openpyxl']).status === 0;
+
+/**
+ * 在 utils 目录下执行 Python 代码，stdin 传入 JSON，返回解析后的 stdout
+ */
+function runPython(args, input) {
+  const result = spawnSync(PYTHON_PATH, args, {
+    cwd: UTILS_DIR,
+    input: input === undefined ? '' : JSON.stringify(input),
+    encoding: 'utf8'
+  });
+  if (result.status !== 0) {
+    throw new Error(result.stderr || result.stdout);
+  }
+  return JSON.parse(result.stdout);
+}
+
+const callFunction = (code, input) => runPython(['-c', `import json, sys\nfrom export_orders_excel import *\n${code}`], input);
+
+const runExport = params => runPython(['export_orders_excel.py'], params);
+
+function order(orderId, createTime) {
+  return {
+    order_id: orderId, user_name: '张三', phone: '13800000000', address: '北京',
+    product_type: 'crystal', image_url: '', create_time: createTime
+  };
+}
+
+(pythonAvailable ? describe : describe.skip)('订单增量导出', () => {
+  let workDir;
+
+  beforeEach(() => {
+    workDir = fs.mkdtempSync(path.join(os.tmpdir(), 'order-export-test-'));
+  });
+
+  afterEach(() => {
+    fs.rmSync(workDir, { recursive: true, force: true });
+  });
+
+  describe('filter_new_orders', () => {
+    const filterIds = (orders, manifest) => callFunction(
+      'params = json.load(sys.stdin)\n' +
+      "print(json.dumps([o['order_id'] for o in filter_new_orders(params['orders'], params['manifest'])]))",
+      { orders, manifest }
+    );
+
+    test('没有清单时返回全部订单并按下单时间升序排列', () => {
+      const orders = [order('b', '2024-01-02T00:00:00Z'), order('a', '2024-01-01T00:00:00Z')];
+      expect(filterIds(orders, {})).toEqual(['a', 'b']);
+    });
+
+    test('下单时间相同时按订单编号决定是否已导出', () => {
+      const time = '2024-01-01T08:00:00Z';
+      const orders = [order('c', time), order('a', time), order('b', time), order('d', '2024-01-01T07:59:59Z')];
+      expect(filterIds(orders, { last_create_time: time, last_order_id: 'b' })).toEqual(['c']);
+    });
+
+    test('不同时区表示的同一时刻按 UTC 比较', () => {
+      const orders = [order('a', '2024-01-01T16:00:00+08:00'), order('b', '2024-01-01T08:00:01Z')];
+      expect(filterIds(orders, { last_create_time: '2024-01-01T08:00:00Z', last_order_id: 'a' })).toEqual(['b']);
+    });
+  });
+
+  describe('清单读写', () => {
+    test('写入后读取内容一致，且不留下临时文件', () => {
+      const manifestPath = path.join(workDir, 'nested', 'manifest.json');
+      const manifest = { last_create_time: '2024-01-01T08:00:00Z', last_order_id: 'b', exported_count: 3, chunk_count: 1 };
+      const loaded = callFunction(
+        'params = json.load(sys.stdin)\n' +
+        "save_manifest(params['path'], params['manifest'])\n" +
+        "print(json.dumps(load_manifest(params['path'])))",
+        { path: manifestPath, manifest }
+      );
+      expect(loaded).toEqual(manifest);
+      expect(fs.readdirSync(path.dirname(manifestPath))).toEqual(['manifest.json']);
+    });
+
+    test('清单不存在或损坏时视为空清单', () => {
+      const corrupted = path.join(workDir, 'corrupted.json');
+      fs.writeFileSync(corrupted, '{"last_create_time": ');
+      const loaded = callFunction(
+        'params = json.load(sys.stdin)\n' +
+        "print(json.dumps([load_manifest(params['missing']), load_manifest(params['corrupted'])]))",
+        { missing: path.join(workDir, 'missing.json'), corrupted }
+      );
+      expect(loaded).toEqual([{}, {}]);
+    });
+  });
+
+  (openpyxlAvailable ? describe : describe.skip)('增量导出脚本', () => {
+    const countRows = file => callFunction(
+      'from openpyxl import load_workbook\n' +
+      'print(load_workbook(json.load(sys.stdin)).active.max_row - 1)',
+      file
+    );
+
+    test('只导出高水位线之后的订单', () => {
+      const manifestPath = path.join(workDir, 'manifest.json');
+      const first = [order('a', '2024-01-01T00:00:00Z'), order('b', '2024-01-02T00:00:00Z')];
+      const firstResult = runExport({
+        orders: first, incremental: true, manifest_path: manifestPath, output_path: path.join(workDir, 'first.xlsx')
+      });
+      expect(firstResult.order_count).toBe(2);
+
+      const secondResult = runExport({
+        orders: [...first, order('c', '2024-01-03T00:00:00Z')],
+        incremental: true, manifest_path: manifestPath, output_path: path.join(workDir, 'second.xlsx')
+      });
+      expect(secondResult.order_count).toBe(1);
+      expect(secondResult.since).toEqual({ create_time: '2024-01-02T00:00:00Z', order_id: 'b' });
+      expect(countRows(secondResult.output_path)).toBe(1);
+
+      const thirdResult = runExport({ orders: [], incremental: true, manifest_path: manifestPath });
+      expect(thirdResult).toMatchObject({ success: true, order_count: 0, output_path: null });
+    });
+
+    test('commit_manifest=false 时不写清单，新清单随结果返回', () => {
+      const manifestPath = path.join(workDir, 'manifest.json');
+      const result = runExport({
+        orders: [order('a', '2024-01-01T00:00:00Z')], incremental: true, manifest_path: manifestPath,
+        output_path: path.join(workDir, 'delta.xlsx'), commit_manifest: false
+      });
+      expect(result.manifest).toMatchObject({ last_create_time: '2024-01-01T00:00:00Z', last_order_id: 'a', exported_count: 1 });
+      expect(fs.existsSync(manifestPath)).toBe(false);
+    });
+
+    test('append 模式每次只写入新增订单的分片', () => {
+      const manifestPath = path.join(workDir, 'manifest.json');
+      const rollingDir = path.join(workDir, 'rolling');
+      const orders = [order('a', '2024-01-01T00:00:00Z'), order('b', '2024-01-02T00:00:00Z')];
+      const params = { incremental: true, manifest_path: manifestPath, output_path: rollingDir, mode: 'append' };
+
+      const first = runExport({ ...params, orders });
+      expect(first).toMatchObject({ chunk: 1, total_rows: 2, output_path: path.join(rollingDir, 'part-00001.xlsx') });
+
+      const second = runExport({ ...params, orders: [...orders, order('c', '2024-01-03T00:00:00Z')] });
+      expect(second).toMatchObject({ chunk: 2, total_rows: 3, order_count: 1 });
+      expect(countRows(second.output_path)).toBe(1);
+      expect(fs.readdirSync(rollingDir)).toEqual(['part-00001.xlsx', 'part-00002.xlsx']);
+    });
+  });
+});
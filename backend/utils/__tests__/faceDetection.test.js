@@ -0,0 +1,114 @@
+/**
+ * 人脸检测线程池测试（face_detection.py / check_face.py）
+ * 直接调用 Python 函数，需要本机可用的 Python（PYTHON_PATH，与 pythonBridge 相同）及 OpenCV，不可用时跳过；
+ * 测试图片使用前端资源中带人脸的图片
+ */
+
+const path = require('path');
+const { spawnSync } = require('child_process');
+const { PYTHON_PATH } = require('../../services/pythonBridge');
+
+const UTILS_DIR = path.join(__dirname, '..');
+const ASSETS_DIR = path.join(__dirname, '..', '..', '..', 'src', 'assets');
+
+const IMAGES = [
+  'Image (3).jpg',
+  'Image (4).jpg',
+  'templates/transform/fHPym5Te7.jpg',
+  'video-frame.png'
+].map(name => path.join(ASSETS_DIR, name));
+
+const opencvAvailable = !spawnSync(PYTHON_PATH, ['--version']).error &&
+  spawnSync(PYTHON_PATH, ['-c', 'import cv2, numpy']).status === 0;
+
+/**
+ * 在 utils 目录下执行 Python 代码，stdin 传入 JSON，返回解析后的 stdout
+ */
+function callFunction(code, input) {
+  const result = spawnSync(PYTHON_PATH, ['-c', `import json, sys\n${code}`], {
+    cwd: UTILS_DIR,
+    input: JSON.stringify(input),
+    encoding: 'utf8'
+  });
+  if (result.status !== 0) {
+    throw new Error(result.stderr || result.stdout);
+  }
+  return JSON.parse(result.stdout.trim().split('\n').pop());
+}
+
+// 同一批图片：主线程逐张检测 vs. 两次经线程池批量检测；
+// 模型加载后统计 CascadeClassifier 的创建线程，验证每个工作线程只加载一次分类器
+const COMPARE_BATCH = `
+import threading
+import cv2
+import face_detection
+from face_detection import load_face_cascade, detect_faces_tiled
+from check_face import check_faces, check_face_image
+
+paths = json.load(sys.stdin)
+cascade = load_face_cascade()
+created = []
+CascadeClassifier = cv2.CascadeClassifier
+def counting_classifier(*args):
+    created.append(threading.current_thread().name)
+    return CascadeClassifier(*args)
+cv2.CascadeClassifier = counting_classifier
+
+def boxes(result):
+    return [[face['x'], face['y'], face['width'], face['height']] for face in result['faces']]
+
+sequential = [boxes(check_face_image(cv2.imread(path), 40, 0.3, face_cascade=cascade, tiled=False)) for path in paths]
+first = check_faces(paths, 40, 0.3, max_workers=2)
+batch_pool = face_detection._worker_pools[('batch', 2)]
+batch_threads = set(batch_pool._threads)
+created_by_first = len(created)
+second = check_faces(paths, 40, 0.3, max_workers=2)
+created_by_second = len(created) - created_by_first
+
+gray = cv2.cvtColor(cv2.imread(paths[2]), cv2.COLOR_BGR2GRAY)
+tiled_first = detect_faces_tiled(gray, 40, max_workers=2).tolist()
+tile_pool = face_detection._worker_pools[('tile', 2)]
+created_by_tiled_first = len(created)
+tiled_second = detect_faces_tiled(gray, 40, max_workers=2).tolist()
+created_by_tiled_second = len(created) - created_by_tiled_first
+
+print(json.dumps({
+    'sequential': sequential,
+    'first': [boxes(result) for result in first['results']],
+    'second': [boxes(result) for result in second['results']],
+    'pools': sorted(purpose for purpose, _ in face_detection._worker_pools),
+    'batch_pool_reused': face_detection._worker_pools[('batch', 2)] is batch_pool,
+    'batch_threads_reused': set(batch_pool._threads) == batch_threads,
+    'tile_pool_reused': face_detection._worker_pools[('tile', 2)] is tile_pool,
+    'tiled_repeatable': tiled_first == tiled_second,
+    'classifiers_created': sorted(created),
+    'classifiers_created_on_reuse': created_by_second + created_by_tiled_second
+}))
+`;
+
+(opencvAvailable ? describe : describe.skip)('人脸检测线程池', () => {
+  let result;
+
+  beforeAll(() => {
+    result = callFunction(COMPARE_BATCH, IMAGES);
+  });
+
+  test('经线程池批量检测与逐张检测的人脸框一致', () => {
+    expect(result.sequential.every(faces => faces.length > 0)).toBe(true);
+    expect(result.first).toEqual(result.sequential);
+    expect(result.second).toEqual(result.sequential);
+  });
+
+  test('重复调用复用同一个线程池，每个工作线程只加载一次分类器', () => {
+    expect(result.pools).toEqual(['batch', 'tile']);
+    expect(result.batch_pool_reused).toBe(true);
+    expect(result.batch_threads_reused).toBe(true);
+    expect(result.tile_pool_reused).toBe(true);
+    expect(result.tiled_repeatable).toBe(true);
+    // 线程池按需启动线程（最多 2 个），每个线程只创建一个分类器，再次调用不再创建
+    const created = result.classifiers_created;
+    expect(new Set(created).size).toBe(created.length);
+    created.forEach(name => expect(name).toMatch(/^face-(batch|tile)_[01]$/));
+    expect(result.classifiers_created_on_reuse).toBe(0);
+  });
+});
@@ -0,0 +1,50 @@
+/**
+ * 延迟直方图工具测试
+ */
+
+const { LatencyHistogram } = require('../latencyHistogram');
+
+describe('LatencyHistogram', () => {
+  test('无样本时分位数为null', () => {
+    const hist = new LatencyHistogram();
+    expect(hist.percentile(50)).toBeNull();
+    expect(hist.toJSON()).toMatchObject({ count: 0, mean: null, p50: null });
+  });
+
+  test('记录count/sum/min/max并忽略非法样本', () => {
+    const hist = new LatencyHistogram();
+    [3, 7, 40, NaN, -1, 'x'].forEach(ms => hist.record(ms));
+    expect(hist.count).toBe(3);
+    expect(hist.sum).toBe(50);
+    expect(hist.min).toBe(3);
+    expect(hist.max).toBe(40);
+  });
+
+  test('分位数估算落在样本所在桶内', () => {
+    const hist = new LatencyHistogram();
+    for (let i = 0; i < 90; i++) hist.record(15);
+    for (let i = 0; i < 10; i++) hist.record(800);
+    const p50 = hist.percentile(50);
+    const p99 = hist.percentile(99);
+    expect(p50).toBeGreaterThanOrEqual(10);
+    expect(p50).toBeLessThanOrEqual(20);
+    expect(p99).toBeGreaterThan(500);
+    expect(p99).toBeLessThanOrEqual(800);
+  });
+
+  test('超出最大边界的样本进入最后一个桶且不超过max', () => {
+    const hist = new LatencyHistogram([10, 100, Infinity]);
+    hist.record(5000);
+    expect(hist.counts).toEqual([0, 0, 1]);
+    expect(hist.percentile(99)).toBe(5000);
+    expect(hist.toJSON().buckets).toEqual({ le_inf: 1 });
+  });
+
+  test('reset清空所有统计', () => {
+    const hist = new LatencyHistogram();
+    hist.record(12);
+    hist.reset();
+    expect(hist.count).toBe(0);
+    expect(hist.counts.every(c => c === 0)).toBe(true);
+  });
+});
@@ -0,0 +1,93 @@
+/**
+ * 上传图片组合处理测试（process_upload.py）
+ * 直接调用 Python 函数，需要本机可用的 Python（PYTHON_PATH，与 pythonBridge 相同）及 OpenCV / Pillow，不可用时跳过
+ */
+
+const fs = require('fs');
+const os = require('os');
+const path = require('path');
+const { spawnSync } = require('child_process');
+const { PYTHON_PATH } = require('../../services/pythonBridge');
+
+const UTILS_DIR = path.join(__dirname, '..');
+
+const imagingAvailable = !spawnSync(PYTHON_PATH, ['--version']).error &&
+  spawnSync(PYTHON_PATH, ['-c', 'import cv2, numpy, PIL']).status === 0;
+
+/**
+ * 在 utils 目录下执行 Python 代码，stdin 传入 JSON，返回解析后的 stdout
+ */
+function callFunction(code, input) {
+  const result = spawnSync(PYTHON_PATH, ['-c', `import json, sys\n${code}`], {
+    cwd: UTILS_DIR,
+    input: JSON.stringify(input),
+    encoding: 'utf8'
+  });
+  if (result.status !== 0) {
+    throw new Error(result.stderr || result.stdout);
+  }
+  return JSON.parse(result.stdout.trim().split('\n').pop());
+}
+
+// 生成测试图片：带渐变透明度的 PNG、调色板透明 PNG、EXIF 方向为 6（需顺时针旋转 90°）的 JPEG
+const CREATE_IMAGES = `
+import numpy as np
+from PIL import Image
+work_dir = json.load(sys.stdin)
+rng = np.random.default_rng(0)
+rgba = rng.integers(0, 255, (30, 40, 4), dtype=np.uint8)
+rgba[..., 3] = np.linspace(0, 255, 40, dtype=np.uint8)
+Image.fromarray(rgba, 'RGBA').save(f'{work_dir}/alpha.png')
+Image.fromarray(rgba[..., :3]).convert('P').save(f'{work_dir}/palette.png', transparency=0)
+exif = Image.Exif()
+exif[0x0112] = 6
+Image.fromarray(rgba[..., :3]).save(f'{work_dir}/rotated.jpg', exif=exif)
+print('null')
+`;
+
+// 同一张图片分别经 process_upload（Base64 输入）与 compress_image.py 压缩，返回两份输出的字节是否一致及输出模式/尺寸
+const COMPARE_COMPRESS = `
+import base64
+from PIL import Image
+from process_upload import process_upload
+from compress_image import compress_image
+params = json.load(sys.stdin)
+src = params['src']
+with open(src, 'rb') as f:
+    uri = 'data:image/png;base64,' + base64.b64encode(f.read()).decode()
+combined = process_upload(uri, ['compress', 'watermark'], {
+    'compress': {'output_path': src + '.combined.png'},
+    'watermark': {'output_path': src + '.combined.jpg'}
+}, stop_on_fail=False)
+standalone = compress_image(src, src + '.standalone.png')
+with open(src + '.combined.png', 'rb') as a, open(src + '.standalone.png', 'rb') as b:
+    identical = a.read() == b.read()
+output = Image.open(src + '.combined.png')
+print(json.dumps({
+    'success': combined['success'] and standalone['success'],
+    'identical': identical,
+    'mode': output.mode,
+    'size': list(output.size)
+}))
+`;
+
+(imagingAvailable ? describe : describe.skip)('process_upload 压缩阶段', () => {
+  let workDir;
+
+  beforeAll(() => {
+    workDir = fs.mkdtempSync(path.join(os.tmpdir(), 'process-upload-test-'));
+    callFunction(CREATE_IMAGES, workDir);
+  });
+
+  afterAll(() => {
+    fs.rmSync(workDir, { recursive: true, force: true });
+  });
+
+  // PNG 保留透明度，EXIF 方向不旋转（与单独的 compress_image.py 一致）
+  [['alpha.png', 'RGBA'], ['palette.png', 'RGBA'], ['rotated.jpg', 'RGB']].forEach(([name, mode]) => {
+    test(`${name} 的压缩结果与单独压缩逐字节一致`, () => {
+      const result = callFunction(COMPARE_COMPRESS, { src: path.join(workDir, name) });
+      expect(result).toEqual({ success: true, identical: true, mode, size: [40, 30] });
+    });
+  });
+});
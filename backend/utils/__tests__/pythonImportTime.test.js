@@ -0,0 +1,82 @@
+/**
+ * utils Python 脚本冷启动导入耗时预算
+ * 用 python -X importtime 测量导入每个脚本模块的累计耗时，并检查 cv2 / numpy / PIL / requests /
+ * openpyxl / qrcode 等重依赖只在用到的代码路径中导入（参数校验失败等路径不加载）
+ * 需要本机可用的 Python（PYTHON_PATH，与 pythonBridge 相同），不可用时跳过
+ */
+
+const path = require('path');
+const { spawnSync } = require('child_process');
+const { PYTHON_PATH } = require('../../services/pythonBridge');
+
+const UTILS_DIR = path.join(__dirname, '..');
+
+// 各脚本模块导入耗时预算（毫秒，取多次测量的最小值）；重依赖单个导入通常就在 100ms 以上
+const IMPORT_BUDGET_MS = {
+  check_face: 120,
+  extract_faces: 120,
+  compress_image: 100,
+  add_watermark: 100,
+  convert_to_live_photo: 100,
+  export_orders_excel: 100,
+  process_upload: 150
+};
+
+const HEAVY_MODULES = ['cv2', 'numpy', 'PIL', 'requests', 'openpyxl', 'qrcode'];
+
+const RUNS = 3;
+
+const pythonAvailable = !spawnSync(PYTHON_PATH, ['--version']).error;
+
+/**
+ * 解析 -X importtime 输出
+ * @returns {Object} { modules: 已导入的顶层包名集合, cumulativeMs: { 模块名: 累计耗时 } }
+ */
+function parseImportTime(stderr) {
+  const modules = new Set();
+  const cumulativeMs = {};
+  for (const line of stderr.split('\n')) {
+    const match = line.match(/^import time:\s+(\d+) \|\s+(\d+) \|( *)(\S+)$/);
+    if (!match) {
+      continue;
+    }
+    const [, , cumulative, indent, name] = match;
+    modules.add(name.split('.')[0]);
+    if (indent.length <= 1) {
+      cumulativeMs[name] = Number(cumulative) / 1000;
+    }
+  }
+  return { modules, cumulativeMs };
+}
+
+function runPython(args) {
+  const result = spawnSync(PYTHON_PATH, ['-X', 'importtime', ...args], {
+    cwd: UTILS_DIR,
+    encoding: 'utf8'
+  });
+  return { stdout: result.stdout, ...parseImportTime(result.stderr) };
+}
+
+(pythonAvailable ? describe : describe.skip)('utils 脚本导入耗时', () => {
+  for (const [script, budgetMs] of Object.entries(IMPORT_BUDGET_MS)) {
+    test(`${script} 导入不加载重依赖且在 ${budgetMs}ms 预算内`, () => {
+      // 第一次导入会编译字节码，不计入
+      runPython(['-c', `import ${script}`]);
+
+      let best = Infinity;
+      for (let i = 0; i < RUNS; i++) {
+        const { modules, cumulativeMs } = runPython(['-c', `import ${script}`]);
+        expect(HEAVY_MODULES.filter(name => modules.has(name))).toEqual([]);
+        expect(cumulativeMs[script]).toBeDefined();
+        best = Math.min(best, cumulativeMs[script]);
+      }
+      expect(best).toBeLessThanOrEqual(budgetMs);
+    });
+
+    test(`${script} 参数校验失败时不加载重依赖`, () => {
+      const { stdout, modules } = runPython([`${script}.py`, '{}']);
+      expect(JSON.parse(stdout).success).toBe(false);
+      expect(HEAVY_MODULES.filter(name => modules.has(name))).toEqual([]);
+    });
+  }
+});
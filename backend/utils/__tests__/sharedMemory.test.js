@@ -0,0 +1,122 @@
+/**
+ * 共享内存交接工具测试
+ * 段目录指向临时目录，不依赖 /dev/shm
+ */
+
+const fs = require('fs');
+const os = require('os');
+const path = require('path');
+
+const shmDir = fs.mkdtempSync(path.join(os.tmpdir(), 'shm-test-'));
+process.env.PY_SHM_DIR = shmDir;
+
+const {
+  SHM_DIR,
+  writeSegment,
+  dataUriToSegment,
+  releaseSegment,
+  resolveShmOutputs,
+  sweepStaleSegments
+} = require('../sharedMemory');
+
+/**
+ * 模拟 Python 端写出的段：多个输出依次拼接在同一个段中
+ */
+function writePythonSegment(name, parts) {
+  fs.writeFileSync(path.join(shmDir, name), Buffer.concat(parts));
+  let offset = 0;
+  return parts.map((part) => {
+    const ref = { name, offset, length: part.length };
+    offset += part.length;
+    return ref;
+  });
+}
+
+describe('sharedMemory', () => {
+  afterAll(() => {
+    fs.rmSync(shmDir, { recursive: true, force: true });
+  });
+
+  test('段目录可通过 PY_SHM_DIR 指定', () => {
+    expect(SHM_DIR).toBe(shmDir);
+  });
+
+  test('写入段并生成带偏移和长度的引用', () => {
+    const segment = writeSegment(Buffer.from('hello'));
+    expect(segment.ref).toBe(`shm://${segment.name}?offset=0&length=5`);
+    expect(fs.readFileSync(path.join(shmDir, segment.name)).toString()).toBe('hello');
+
+    releaseSegment(segment.ref);
+    expect(fs.existsSync(path.join(shmDir, segment.name))).toBe(false);
+    // 重复删除不报错
+    releaseSegment(segment.name);
+  });
+
+  test('只有数据URI 会写入段，内容为解码后的字节', () => {
+    expect(dataUriToSegment('https://example.com/a.jpg')).toBeNull();
+
+    const segment = dataUriToSegment(`data:image/png;base64,${Buffer.from([1, 2, 3]).toString('base64')}`);
+    expect([...fs.readFileSync(path.join(shmDir, segment.name))]).toEqual([1, 2, 3]);
+    releaseSegment(segment);
+  });
+
+  test('内容相同的段共用同一个引用，全部释放后才删除', () => {
+    const first = writeSegment(Buffer.from('same'));
+    const second = writeSegment(Buffer.from('same'));
+    const other = writeSegment(Buffer.from('other'));
+    expect(second.ref).toBe(first.ref);
+    expect(other.name).not.toBe(first.name);
+
+    releaseSegment(first);
+    expect(fs.existsSync(path.join(shmDir, first.name))).toBe(true);
+    releaseSegment(second);
+    expect(fs.existsSync(path.join(shmDir, first.name))).toBe(false);
+    releaseSegment(other);
+  });
+
+  test('拒绝非法段名', () => {
+    expect(() => releaseSegment('../etc/passwd')).toThrow('非法的共享内存段名');
+  });
+
+  test('把结果中的段引用换成 Buffer / Base64 并删除段', () => {
+    const [faceA, faceB] = writePythonSegment('aiart-py-1-faces', [Buffer.from('AAA'), Buffer.from('BB')]);
+    const [output, packed] = writePythonSegment('aiart-py-1-output', [Buffer.from('jpeg'), Buffer.from([7, 8])]);
+    const result = {
+      success: true,
+      stages: {
+        extract_faces: { faces: [{ image_shm: faceA }, { image_shm: faceB }], packed: { data_shm: packed } },
+        watermark: { output_shm: output }
+      }
+    };
+
+    resolveShmOutputs(result);
+    expect(result.stages.extract_faces.faces.map(face => face.image_base64)).toEqual([
+      Buffer.from('AAA').toString('base64'),
+      Buffer.from('BB').toString('base64')
+    ]);
+    expect(result.stages.watermark.output_buffer.toString()).toBe('jpeg');
+    expect(result.stages.watermark.output_shm).toBeUndefined();
+    expect(result.stages.extract_faces.packed.data_base64).toBe(Buffer.from([7, 8]).toString('base64'));
+    expect(fs.existsSync(path.join(shmDir, 'aiart-py-1-faces'))).toBe(false);
+
+    // 合并调用的其他调用方再次处理同一个结果时不受影响
+    expect(() => resolveShmOutputs(result)).not.toThrow();
+    expect(result.stages.watermark.output_buffer.toString()).toBe('jpeg');
+  });
+
+  test('清理过期的遗留段，只处理本服务前缀', () => {
+    const stale = path.join(shmDir, 'aiart-py-2-stale');
+    const other = path.join(shmDir, 'other-file');
+    fs.writeFileSync(stale, 'x');
+    fs.writeFileSync(other, 'x');
+    const past = new Date(Date.now() - 60 * 60 * 1000);
+    fs.utimesSync(stale, past, past);
+    fs.utimesSync(other, past, past);
+    const fresh = writeSegment(Buffer.from('fresh'));
+
+    expect(sweepStaleSegments()).toBe(1);
+    expect(fs.existsSync(stale)).toBe(false);
+    expect(fs.existsSync(other)).toBe(true);
+    expect(fs.existsSync(path.join(shmDir, fresh.name))).toBe(true);
+  });
+});
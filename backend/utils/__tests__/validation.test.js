@@ -6,6 +6,7 @@ const {
   validateRequiredFields,
   validateStringLength,
   validateUrl,
+  validateImageInput,
   validateArrayLength,
   validateEnum,
   validateNumberRange,
@@ -16,6 +17,8 @@ const {
   validateWechatPaymentParams,
   validateUploadImageParams,
   validateExtractFacesParams,
+  validateCheckFacesParams,
+  validateProcessUploadParams,
   validateCreateProductOrderParams,
   validateGenerateVideoParams
 } = require('../validation');
@@ -75,6 +78,22 @@ describe('基础校验函数', () => {
     });
   });
 
+  describe('validateImageInput', () => {
+    test('接受http/https地址与Base64图片', () => {
+      expect(validateImageInput('https://example.com/a.jpg')).toBe(true);
+      expect(validateImageInput('http://example.com/a.jpg')).toBe(true);
+      expect(validateImageInput('data:image/png;base64,iVBORw0KGgo=')).toBe(true);
+    });
+
+    test('拒绝共享内存引用、本地文件与其他协议', () => {
+      expect(validateImageInput('shm://aiart-node-1-abc?offset=0&length=10')).toBe(false);
+      expect(validateImageInput('file:///etc/passwd')).toBe(false);
+      expect(validateImageInput('/tmp/a.jpg')).toBe(false);
+      expect(validateImageInput('data:text/plain;base64,aGk=')).toBe(false);
+      expect(validateImageInput(null)).toBe(false);
+    });
+  });
+
   describe('validateArrayLength', () => {
     test('数组长度在范围内返回true', () => {
       expect(validateArrayLength([1, 2, 3], 1, 5)).toBe(true);
@@ -269,6 +288,95 @@ describe('业务校验函数', () => {
       const result = validateExtractFacesParams(params);
       expect(result.valid).toBe(false);
     });
+
+    test('统一裁剪与打包参数', () => {
+      const imageUrls = ['https://example.com/image.jpg'];
+      expect(validateExtractFacesParams({ imageUrls, cropSize: 256, cropFormat: 'jpeg', pack: 'sprite' }).valid).toBe(true);
+      expect(validateExtractFacesParams({ imageUrls, cropSize: 16 }).valid).toBe(false);
+      expect(validateExtractFacesParams({ imageUrls, cropSize: 128.5 }).valid).toBe(false);
+      expect(validateExtractFacesParams({ imageUrls, cropSize: 128, cropFormat: 'webp' }).valid).toBe(false);
+      expect(validateExtractFacesParams({ imageUrls, pack: 'array' }).errors).toContain('pack需要同时指定cropSize');
+    });
+
+    test('imageUrls只接受http/https地址与Base64图片', () => {
+      expect(validateExtractFacesParams({ imageUrls: ['data:image/jpeg;base64,/9j/4AAQ'] }).valid).toBe(true);
+      expect(validateExtractFacesParams({ imageUrls: ['shm://aiart-node-1-abc?offset=0&length=10'] }).errors)
+        .toContain('imageUrls[0]必须是http/https地址或Base64图片');
+      expect(validateExtractFacesParams({ imageUrls: ['https://example.com/a.jpg', 'file:///etc/passwd'] }).errors)
+        .toContain('imageUrls[1]必须是http/https地址或Base64图片');
+    });
+  });
+
+  describe('validateCheckFacesParams', () => {
+    test('有效参数返回valid=true', () => {
+      const imageUrls = Array(6).fill('https://example.com/image.jpg');
+      expect(validateCheckFacesParams({ imageUrls }).valid).toBe(true);
+      expect(validateCheckFacesParams({ imageUrls, gate: false }).valid).toBe(true);
+    });
+
+    test('无效参数返回错误', () => {
+      expect(validateCheckFacesParams({}).valid).toBe(false);
+      expect(validateCheckFacesParams({ imageUrls: [] }).valid).toBe(false);
+      expect(validateCheckFacesParams({ imageUrls: ['not-a-url'] }).valid).toBe(false);
+      expect(validateCheckFacesParams({ imageUrls: ['https://example.com/a.jpg'], gate: 'yes' }).errors).toContain('gate必须是布尔值');
+    });
+
+    test('shm://与file://地址不能由客户端传入', () => {
+      expect(validateCheckFacesParams({ imageUrls: ['data:image/jpeg;base64,/9j/4AAQ'] }).valid).toBe(true);
+      expect(validateCheckFacesParams({ imageUrls: ['file:///etc/passwd'] }).errors)
+        .toContain('imageUrls[0]必须是http/https地址或Base64图片');
+    });
+
+    test('validateRequest对shm://输入返回400', () => {
+      const { validateRequest } = require('../validation');
+      const middleware = validateRequest(validateCheckFacesParams);
+      const req = { body: { imageUrls: ['https://example.com/a.jpg', 'shm://aiart-node-1-abc?offset=0&length=10'] } };
+      const res = { status: jest.fn().mockReturnThis(), json: jest.fn() };
+      const next = jest.fn();
+
+      middleware(req, res, next);
+
+      expect(res.status).toHaveBeenCalledWith(400);
+      expect(res.json).toHaveBeenCalledWith({
+        success: false,
+        error: '参数校验失败',
+        details: ['imageUrls[1]必须是http/https地址或Base64图片']
+      });
+      expect(next).not.toHaveBeenCalled();
+    });
+  });
+
+  describe('validateProcessUploadParams', () => {
+    const image = 'data:image/png;base64,iVBORw0KGgoAAAANSUhEUgAAAAEAAAABCAYAAAAfFcSJAAAADUlEQVR42mNk+M9QDwADhgGAWjR9awAAAABJRU5ErkJggg==';
+
+    test('有效参数返回valid=true', () => {
+      expect(validateProcessUploadParams({ image }).valid).toBe(true);
+      expect(validateProcessUploadParams({ imageUrl: 'https://example.com/a.jpg', watermark: true }).valid).toBe(true);
+    });
+
+    test('image与imageUrl必须且只能提供一个', () => {
+      expect(validateProcessUploadParams({}).errors).toContain('缺少必需参数: image 或 imageUrl');
+      expect(validateProcessUploadParams({ image, imageUrl: 'https://example.com/a.jpg' }).errors)
+        .toContain('image和imageUrl只能提供一个');
+    });
+
+    test('image类型、格式与大小', () => {
+      expect(validateProcessUploadParams({ image: 123 }).errors).toContain('image必须是字符串');
+      expect(validateProcessUploadParams({ image: 'not-base64' }).valid).toBe(false);
+      const oversized = `data:image/jpeg;base64,${'A'.repeat(Math.ceil(5 * 1024 * 1024 * 4 / 3) + 4)}`;
+      expect(validateProcessUploadParams({ image: oversized }).errors).toContain('image解码后不能超过5MB');
+    });
+
+    test('imageUrl只接受http/https地址', () => {
+      for (const imageUrl of ['/etc/passwd', 'file:///etc/passwd', 'shm://aiart-node-1?offset=0&length=1', 42]) {
+        expect(validateProcessUploadParams({ imageUrl }).errors).toContain('imageUrl必须是有效的http/https地址');
+      }
+      expect(validateProcessUploadParams({ imageUrl: `https://example.com/${'a'.repeat(2048)}` }).valid).toBe(false);
+    });
+
+    test('watermark必须是布尔值', () => {
+      expect(validateProcessUploadParams({ image, watermark: 'yes' }).errors).toContain('watermark必须是布尔值');
+    });
   });
 
   describe('validateCreateProductOrderParams', () => {
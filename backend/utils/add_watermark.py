@@ -8,35 +8,181 @@ Requirements: 3.1, 3.2
 import sys
 import json
 import os
-from PIL import Image, ImageDraw, ImageFont
-import qrcode
+import io
+from contextlib import nullcontext
+from functools import lru_cache
+import cancellation
+from stage_timer import StageTimer
+from profiling import run_profiled
+from shm_io import SHM_OUTPUT, is_shm_ref, is_shm_output, open_shm_file, write_shm
 
 
-def add_watermark(image_path, output_path=None, watermark_text="AI全家福制作\n扫码去水印", 
-                  qr_url="https://your-domain.com/pay", position="center"):
+TILED_POSITIONS = ('tiled', 'diagonal')
+DIAGONAL_ANGLE = 30
+
+
+def _load_font(font_size):
+    """加载中文字体，依次尝试 macOS/Linux、Windows 字体，都不可用时使用默认字体"""
+    from PIL import ImageFont
+    
+    try:
+        try:
+            # macOS/Linux
+            return ImageFont.truetype("/System/Library/Fonts/PingFang.ttc", font_size)
+        except:
+            try:
+                # Windows
+                return ImageFont.truetype("C:/Windows/Fonts/msyh.ttc", font_size)
+            except:
+                # 使用默认字体
+                return ImageFont.load_default()
+    except:
+        return ImageFont.load_default()
+
+
+def _make_qr(qr_url, size):
+    import qrcode
+    from PIL import Image
+    
+    qr = qrcode.QRCode(
+        version=1,
+        error_correction=qrcode.constants.ERROR_CORRECT_H,
+        box_size=10,
+        border=2
+    )
+    qr.add_data(qr_url)
+    qr.make(fit=True)
+    qr_img = qr.make_image(fill_color="black", back_color="white")
+    return qr_img.resize((size, size), Image.Resampling.LANCZOS)
+
+
+def _render_tile(watermark_text, qr_url, unit, diagonal):
     """
-    在图片上添加水印
+    绘制平铺水印的单个图块：二维码 + 文字，四周留出间隔
+
+    Args:
+        unit: 图块基准尺寸（像素），随图片短边缩放
+        diagonal: 是否把图块内容旋转为斜向
+
+    Returns:
+        PIL Image: RGBA 图块
+    """
+    from PIL import Image, ImageDraw
+    
+    qr_size = max(unit // 3, 48)
+    font = _load_font(max(unit // 10, 12))
+
+    # 先水平排版：二维码 + 文字
+    probe = ImageDraw.Draw(Image.new('RGBA', (1, 1)))
+    left, top, right, bottom = probe.multiline_textbbox((0, 0), watermark_text, font=font, stroke_width=1)
+    content_w = qr_size + unit // 12 + (right - left)
+    content_h = max(qr_size, bottom - top)
+    content = Image.new('RGBA', (content_w, content_h), (0, 0, 0, 0))
+
+    qr_img = _make_qr(qr_url, qr_size).convert('RGBA')
+    qr_img.putalpha(150)
+    content.paste(qr_img, (0, (content_h - qr_size) // 2))
+    ImageDraw.Draw(content).multiline_text(
+        (qr_size + unit // 12 - left, (content_h - (bottom - top)) // 2 - top),
+        watermark_text,
+        fill=(0, 0, 0, 120),
+        font=font,
+        stroke_width=1,
+        stroke_fill=(255, 255, 255, 120)
+    )
+    if diagonal:
+        content = content.rotate(DIAGONAL_ANGLE, resample=Image.Resampling.BICUBIC, expand=True)
+
+    # 四周留出间隔，平铺后相邻图块不相接
+    gap = unit // 3
+    tile = Image.new('RGBA', (content.width + gap, content.height + gap), (0, 0, 0, 0))
+    tile.paste(content, (gap // 2, gap // 2))
+    return tile
+
+
+@lru_cache(maxsize=8)
+def _watermark_tile(watermark_text, qr_url, unit, diagonal):
+    """
+    生成平铺水印图块的定点合成数据（按参数缓存，批量处理同尺寸图片时只生成一次）
+
+    Returns:
+        (premul, inv_alpha, bbox): 预乘后的颜色加舍入项 uint16 (h, w, 3)、
+        定点透明度的补 256 - alpha uint16 (h, w, 1)（alpha 为 0-256），以及透明度非零区域 (y0, y1, x0, x1)
+    """
+    import numpy as np
+    
+    rgba = np.asarray(_render_tile(watermark_text, qr_url, unit, diagonal), np.uint16)
+    alpha = rgba[:, :, 3:4]
+    # 0-255 映射到 0-256，合成时用 >> 8 代替除以 255
+    alpha = alpha + (alpha >> 7)
+    # 合成时 (px * (256 - alpha) + premul + 128) >> 8，舍入项预先加到 premul 中
+    premul = rgba[:, :, :3] * alpha + 128
+    rows = np.flatnonzero(alpha.any(axis=(1, 2)))
+    cols = np.flatnonzero(alpha.any(axis=(0, 2)))
+    return premul, 256 - alpha, (rows[0], rows[-1] + 1, cols[0], cols[-1] + 1)
+
+
+def _blend_tiled(arr, premul, inv_alpha, bbox):
+    """
+    把图块按周期平铺合成到 arr（uint8 RGB，原地修改）
+    逐个图块只处理透明度非零区域：在复用的 uint16 缓冲区上原地乘加移位后写回，
+    不为整图生成临时数组；右/下边缘的图块按剩余尺寸截断
+    """
+    import numpy as np
+    
+    tile_h, tile_w = inv_alpha.shape[:2]
+    by0, by1, bx0, bx1 = bbox
+    height, width = arr.shape[:2]
+    scratch = np.empty((by1 - by0, bx1 - bx0, 3), np.uint16)
+    
+    for tile_y in range(0, height, tile_h):
+        y0, y1 = tile_y + by0, min(tile_y + by1, height)
+        if y0 >= y1:
+            continue
+        for tile_x in range(0, width, tile_w):
+            x0, x1 = tile_x + bx0, min(tile_x + bx1, width)
+            if x0 >= x1:
+                continue
+            h, w = y1 - y0, x1 - x0
+            block = arr[y0:y1, x0:x1]
+            blended = scratch[:h, :w]
+            np.multiply(block, inv_alpha[by0:by0 + h, bx0:bx0 + w], out=blended)
+            blended += premul[by0:by0 + h, bx0:bx0 + w]
+            blended >>= 8
+            block[...] = blended
+
+
+def apply_watermark(img, watermark_text="AI全家福制作\n扫码去水印",
+                    qr_url="https://your-domain.com/pay", position="center", timer=None):
+    """
+    在已解码的图片上合成水印（供 process_upload 等复用解码结果）
     
     Args:
-        image_path: 输入图片路径
-        output_path: 输出图片路径（可选）
+        img: PIL Image（任意模式，内部转换为 RGBA 合成）
         watermark_text: 水印文字
         qr_url: 二维码URL
-        position: 水印位置（center/bottom-right）
+        position: 水印位置（center/bottom-right/tiled/diagonal）
+            tiled / diagonal 在整张图上重复平铺（diagonal 为斜向），不易被裁掉
+        timer: 阶段计时器（可选）
         
     Returns:
-        dict: {success: bool, output_path: str, message: str}
+        PIL Image: 合成水印后的 RGB 图片
     """
-    try:
-        # 打开图片
-        img = Image.open(image_path)
-        
-        # 转换为RGBA模式以支持透明度
-        if img.mode != 'RGBA':
+    from PIL import Image, ImageDraw
+    
+    timer = timer or StageTimer()
+    
+    if position in TILED_POSITIONS:
+        return _apply_tiled_watermark(img, watermark_text, qr_url, position == 'diagonal', timer)
+    
+    # 转换为RGBA模式以支持透明度
+    if img.mode != 'RGBA':
+        with timer.stage('decode'):
             img = img.convert('RGBA')
-        
-        width, height = img.size
-        
+    
+    width, height = img.size
+    
+    with timer.stage('compose'):
         # 创建水印层
         watermark = Image.new('RGBA', (width, height), (0, 0, 0, 0))
         draw = ImageDraw.Draw(watermark)
@@ -48,22 +194,13 @@ def add_watermark(image_path, output_path=None, watermark_text="AI全家福制
         # 确保水印不会太小
         watermark_height = max(watermark_height, 100)
         watermark_width = max(watermark_width, 300)
-        
-        # 生成二维码
-        qr = qrcode.QRCode(
-            version=1,
-            error_correction=qrcode.constants.ERROR_CORRECT_H,
-            box_size=10,
-            border=2
-        )
-        qr.add_data(qr_url)
-        qr.make(fit=True)
-        qr_img = qr.make_image(fill_color="black", back_color="white")
-        
-        # 调整二维码大小
+    
+    with timer.stage('qrcode'):
+        # 生成二维码并调整大小
         qr_size = min(watermark_height, 150)
-        qr_img = qr_img.resize((qr_size, qr_size), Image.Resampling.LANCZOS)
-        
+        qr_img = _make_qr(qr_url, qr_size)
+    
+    with timer.stage('compose'):
         # 计算水印位置
         if position == "center":
             x = (width - watermark_width) // 2
@@ -90,21 +227,7 @@ def add_watermark(image_path, output_path=None, watermark_text="AI全家福制
         watermark.paste(qr_img_rgba, (qr_x, qr_y), qr_img_rgba)
         
         # 绘制文字
-        try:
-            # 尝试使用系统字体
-            font_size = int(watermark_height * 0.25)
-            try:
-                # macOS/Linux
-                font = ImageFont.truetype("/System/Library/Fonts/PingFang.ttc", font_size)
-            except:
-                try:
-                    # Windows
-                    font = ImageFont.truetype("C:/Windows/Fonts/msyh.ttc", font_size)
-                except:
-                    # 使用默认字体
-                    font = ImageFont.load_default()
-        except:
-            font = ImageFont.load_default()
+        font = _load_font(int(watermark_height * 0.25))
         
         # 计算文字位置
         text_x = qr_x + qr_size + 20
@@ -123,17 +246,85 @@ def add_watermark(image_path, output_path=None, watermark_text="AI全家福制
         
         # 转换回RGB模式
         img = img.convert('RGB')
+    
+    return img
+
+
+def _apply_tiled_watermark(img, watermark_text, qr_url, diagonal, timer):
+    """
+    平铺水印：图块只生成一次，用 NumPy 定点运算合成，不逐块调用 PIL
+    直接在 RGB 上合成（不经过 RGBA），输入图片可能被调用方复用（如 process_upload），只复制一次
+    """
+    import numpy as np
+    from PIL import Image
+    
+    if img.mode != 'RGB':
+        with timer.stage('decode'):
+            img = img.convert('RGB')
+    
+    with timer.stage('qrcode'):
+        unit = max(min(img.size) // 4, 160)
+        premul, inv_alpha, bbox = _watermark_tile(watermark_text, qr_url, unit, diagonal)
+    
+    with timer.stage('compose'):
+        arr = np.array(img)
+        _blend_tiled(arr, premul, inv_alpha, bbox)
+        return Image.fromarray(arr)
+
+
+def add_watermark(image_path, output_path=None, watermark_text="AI全家福制作\n扫码去水印", 
+                  qr_url="https://your-domain.com/pay", position="center", timer=None):
+    """
+    在图片上添加水印
+    
+    Args:
+        image_path: 输入图片路径或共享内存引用（shm://...）
+        output_path: 输出图片路径（可选），为 'shm://' 时写入共享内存段
+        watermark_text: 水印文字
+        qr_url: 二维码URL
+        position: 水印位置（center/bottom-right/tiled/diagonal）
+        timer: 阶段计时器（可选）
+        
+    Returns:
+        dict: {success: bool, output_path | output_shm, message: str}
+    """
+    from PIL import Image
+    
+    timer = timer or StageTimer()
+    try:
+        source = open_shm_file(image_path) if is_shm_ref(image_path) else nullcontext(image_path)
+        with timer.stage('decode'), source as fp:
+            # 打开图片（共享内存引用在 with 块结束后失效，需在块内完成解码）
+            img = Image.open(fp)
+            img.load()
+            
+            # 转换为RGBA模式以支持透明度（平铺水印直接在 RGB 上合成，不需要转换）
+            if img.mode != 'RGBA' and position not in TILED_POSITIONS:
+                img = img.convert('RGBA')
+        
+        img = apply_watermark(img, watermark_text, qr_url, position, timer)
         
         # 保存
         if output_path is None:
-            base, ext = os.path.splitext(image_path)
-            output_path = f"{base}_watermarked{ext}"
+            if is_shm_ref(image_path):
+                output_path = SHM_OUTPUT
+            else:
+                base, ext = os.path.splitext(image_path)
+                output_path = f"{base}_watermarked{ext}"
         
-        img.save(output_path, 'JPEG', quality=95)
+        if is_shm_output(output_path):
+            with timer.stage('encode'):
+                buffer = io.BytesIO()
+                img.save(buffer, 'JPEG', quality=95)
+            output = {'output_shm': write_shm(buffer.getbuffer())}
+        else:
+            with timer.stage('encode'):
+                img.save(output_path, 'JPEG', quality=95)
+            output = {'output_path': output_path}
         
         return {
             'success': True,
-            'output_path': output_path,
+            **output,
             'message': '水印添加成功'
         }
     
@@ -152,9 +343,14 @@ def main():
         "output_path": "...",
         "watermark_text": "...",
         "qr_url": "...",
-        "position": "center"
+        "position": "center"（center / bottom-right / tiled / diagonal）
     }
+    输出结果附带 timings 字段（各阶段耗时，毫秒）
+    可选参数 _profile / _request_id 开启按需剖析（见 profiling.py）
+    image_path 可为共享内存引用 shm://...，output_path 为 shm:// 时结果写入共享内存段（见 shm_io.py）
     """
+    cancellation.install()
+    timer = StageTimer()
     try:
         # 从命令行参数读取JSON
         if len(sys.argv) > 1:
@@ -175,15 +371,17 @@ def main():
                 'message': '缺少必需参数: image_path'
             }
         else:
-            result = add_watermark(image_path, output_path, watermark_text, qr_url, position)
+            result = run_profiled('add_watermark', params, add_watermark, image_path, output_path, watermark_text, qr_url, position, timer)
         
         # 输出JSON结果
+        result['timings'] = timer.as_dict()
         print(json.dumps(result, ensure_ascii=False))
         
     except Exception as e:
         result = {
             'success': False,
-            'message': f'脚本执行失败: {str(e)}'
+            'message': f'脚本执行失败: {str(e)}',
+            'timings': timer.as_dict()
         }
         print(json.dumps(result, ensure_ascii=False))
         sys.exit(1)
@@ -0,0 +1,92 @@
+#!/usr/bin/env python3
+"""
+协作式取消
+pythonBridge.js 以独立进程组启动脚本（Python 进程为组长，ffmpeg 等子进程与之同组），
+超时或客户端断开时向整个进程组发送 SIGTERM，宽限期后仍未退出再发送 SIGKILL。
+
+install() 注册 SIGTERM 处理:
+    1. 删除通过 scratch_file() 登记的临时文件
+    2. 在主线程抛出 Cancelled（SystemExit 子类，退出码 143），不会被脚本里的 except Exception 吞掉；
+       正在执行的 subprocess.run 会随之结束子进程，with / finally 中的清理
+       （如 ShmWriter 丢弃未交付的共享内存段）照常执行
+工作线程不会收到异常，需要在开始新任务前检查 is_cancelled()
+"""
+
+import os
+import signal
+import tempfile
+import threading
+
+
+EXIT_CANCELLED = 128 + signal.SIGTERM
+
+_scratch_files = set()
+_lock = threading.RLock()
+_cancelled = threading.Event()
+
+
+class Cancelled(SystemExit):
+    """收到 SIGTERM 后在主线程抛出"""
+
+    def __init__(self):
+        super().__init__(EXIT_CANCELLED)
+
+
+def is_cancelled():
+    """是否已收到取消信号"""
+    return _cancelled.is_set()
+
+
+def scratch_file(suffix=''):
+    """
+    创建临时文件并登记，进程被取消时删除
+
+    Returns:
+        临时文件路径（已关闭，可直接交给 ffmpeg 等外部程序写入）
+    """
+    fd, path = tempfile.mkstemp(suffix=suffix)
+    os.close(fd)
+    with _lock:
+        _scratch_files.add(path)
+    return path
+
+
+def keep(path):
+    """取消登记：文件作为结果交给调用方，之后由调用方负责删除"""
+    with _lock:
+        _scratch_files.discard(path)
+
+
+def discard(path):
+    """删除临时文件并取消登记（文件不存在时忽略）"""
+    keep(path)
+    try:
+        os.unlink(path)
+    except OSError:
+        pass
+
+
+def cleanup():
+    """删除所有仍登记的临时文件"""
+    with _lock:
+        paths = list(_scratch_files)
+        _scratch_files.clear()
+    for path in paths:
+        try:
+            os.unlink(path)
+        except OSError:
+            pass
+
+
+def _handle_sigterm(signum, frame):
+    # 宽限期内重复收到信号时不再重复处理
+    if _cancelled.is_set():
+        return
+    _cancelled.set()
+    cleanup()
+    raise Cancelled()
+
+
+def install():
+    """在主线程注册 SIGTERM 处理（脚本 main() 开头调用）"""
+    signal.signal(signal.SIGTERM, _handle_sigterm)
@@ -3,29 +3,55 @@
 人脸检测脚本
 使用OpenCV检测人脸，最小人脸尺寸80x80，置信度阈值0.7
 Requirements: 7.2, 7.3, 7.4
+
+门控模式（gate=True，上传校验用）:
+    先把灰度图缩小到长边 FACE_GATE_SIZE 做粗检测，人脸框映射回原图后按原图评分，
+    只要有一张人脸达到阈值就直接返回；粗检测没有合格人脸时才在原图上完整检测。
+    结果中 decided_by 标明由哪一级得出结论: coarse / full
+
+批量检测（image_paths）:
+    多张图片（本地路径、URL、Base64 数据URI 或共享内存引用）在线程池中并行下载、解码、检测
+    （OpenCV 解码/检测期间释放 GIL），模型文件只加载一次，每个工作线程使用自己的分类器实例；
+    返回逐张结果与汇总，全部图片都检测到清晰人脸时 success 为 True
 """
 
+import os
 import sys
 import json
-import cv2
-import numpy as np
+import base64
+import cancellation
+from stage_timer import StageTimer
+from profiling import run_profiled
+from shm_io import is_shm_ref, shm_view
+
 
+# 门控粗检测的长边尺寸；原图不大于该尺寸时直接完整检测
+FACE_GATE_SIZE = int(os.environ.get('FACE_GATE_SIZE', 640))
+# Haar 模型的检测窗口边长，粗检测的最小人脸尺寸不能低于它
+CASCADE_WINDOW = 24
+# 批量检测的线程数，0 表示按图片数与 CPU 核数自动确定
+FACE_BATCH_WORKERS = int(os.environ.get('FACE_BATCH_WORKERS', 0))
 
-def check_face(image_path, min_face_size=80, confidence_threshold=0.7):
+
+def check_face(image_path, min_face_size=80, confidence_threshold=0.7, timer=None, gate=False):
     """
     检测图片中是否包含清晰人脸
     
     Args:
-        image_path: 图片路径
+        image_path: 图片路径、URL、Base64数据或共享内存引用
         min_face_size: 最小人脸尺寸（像素）
         confidence_threshold: 置信度阈值
+        timer: 阶段计时器（可选）
+        gate: 是否使用两级门控检测（先缩小图粗检测，未通过再检测原图）
         
     Returns:
         dict: {success: bool, face_count: int, confidence: float, faces: list, message: str}
+              门控模式下另有 decided_by: 'coarse' / 'full'
     """
+    timer = timer or StageTimer()
     try:
-        # 读取图片
-        img = cv2.imread(image_path)
+        # 读取并解码图片
+        img = load_image(image_path, timer)
         if img is None:
             return {
                 'success': False,
@@ -33,29 +59,97 @@ def check_face(image_path, min_face_size=80, confidence_threshold=0.7):
                 'message': '无法读取图片文件'
             }
         
+        return check_face_image(img, min_face_size, confidence_threshold, timer, gate=gate)
+    
+    except Exception as e:
+        return {
+            'success': False,
+            'face_count': 0,
+            'message': f'人脸检测失败: {str(e)}'
+        }
+
+
+def _valid_faces(gray, faces, confidence_threshold):
+    """对人脸框批量评分，返回达到阈值的人脸列表"""
+    from face_quality import score_faces, quality_breakdown
+    
+    # 清晰度/曝光/对比度/相对尺寸综合评分（所有人脸一次向量化计算）
+    scores = score_faces(gray, faces)
+    valid_faces = []
+    for i, (x, y, w, h) in enumerate(faces):
+        confidence = scores['confidence'][i]
+        
+        if confidence >= confidence_threshold:
+            valid_faces.append({
+                'x': int(x),
+                'y': int(y),
+                'width': int(w),
+                'height': int(h),
+                'confidence': round(float(confidence), 3),
+                'quality': quality_breakdown(scores, i)
+            })
+    return valid_faces
+
+
+def _coarse_faces(face_cascade, gray, min_face_size):
+    """
+    在缩小图上粗检测，返回映射回原图坐标的人脸框；原图不大于 FACE_GATE_SIZE 时返回 None
+    """
+    import cv2
+    import numpy as np
+    from face_detection import detect_faces
+    
+    height, width = gray.shape[:2]
+    scale = FACE_GATE_SIZE / max(height, width)
+    if scale >= 1:
+        return None
+    
+    small = cv2.resize(gray, (round(width * scale), round(height * scale)), interpolation=cv2.INTER_AREA)
+    coarse_min = max(round(min_face_size * scale), CASCADE_WINDOW)
+    faces = detect_faces(face_cascade, small, coarse_min, scale_factor=1.1, min_neighbors=5, tiled=False)
+    if len(faces) == 0:
+        return np.empty((0, 4), np.int32)
+    
+    # 映射回原图并裁到图片范围内
+    boxes = np.rint(np.asarray(faces, np.float64) / scale).astype(np.int32)
+    boxes[:, 0] = np.clip(boxes[:, 0], 0, width - 1)
+    boxes[:, 1] = np.clip(boxes[:, 1], 0, height - 1)
+    boxes[:, 2] = np.minimum(boxes[:, 2], width - boxes[:, 0])
+    boxes[:, 3] = np.minimum(boxes[:, 3], height - boxes[:, 1])
+    return boxes[(boxes[:, 2] >= min_face_size) & (boxes[:, 3] >= min_face_size)]
+
+
+def check_face_image(img, min_face_size=80, confidence_threshold=0.7, timer=None, gray=None, gate=False,
+                     face_cascade=None, tiled=None):
+    """
+    在已解码的图片上检测清晰人脸（供 process_upload 等复用解码结果）
+    
+    Args:
+        img: BGR 图片数组
+        min_face_size: 最小人脸尺寸（像素）
+        confidence_threshold: 置信度阈值
+        timer: 阶段计时器（可选）
+        gray: 已转换好的灰度图（可选，避免重复转换）
+        gate: 是否使用两级门控检测
+        face_cascade: 使用的分类器（可选，默认进程内共享的分类器；多线程时传入线程专用实例）
+        tiled: 是否分块并行检测（见 face_detection.detect_faces）
+        
+    Returns:
+        dict: 同 check_face
+    """
+    import cv2
+    from face_detection import load_face_cascade, detect_faces
+    
+    timer = timer or StageTimer()
+    try:
         # 转换为灰度图
-        gray = cv2.cvtColor(img, cv2.COLOR_BGR2GRAY)
-        
-        # 使用OpenCV的DNN人脸检测器（更准确）
-        # 尝试多个可能的模型路径
-        cascade_paths = [
-            'haarcascade_frontalface_default.xml',  # 当前目录
-            cv2.data.haarcascades + 'haarcascade_frontalface_default.xml' if hasattr(cv2, 'data') else None,  # OpenCV数据目录
-            '/usr/share/opencv4/haarcascades/haarcascade_frontalface_default.xml',  # Alpine Linux
-            '/usr/local/share/opencv4/haarcascades/haarcascade_frontalface_default.xml',  # 其他Linux
-        ]
-        
-        face_cascade = None
-        for path in cascade_paths:
-            if path is None:
-                continue
-            try:
-                cascade = cv2.CascadeClassifier(path)
-                if not cascade.empty():
-                    face_cascade = cascade
-                    break
-            except:
-                continue
+        if gray is None:
+            with timer.stage('decode'):
+                gray = cv2.cvtColor(img, cv2.COLOR_BGR2GRAY)
+        
+        if face_cascade is None:
+            with timer.stage('load_model'):
+                face_cascade = load_face_cascade()
         
         if face_cascade is None or face_cascade.empty():
             return {
@@ -64,77 +158,191 @@ def check_face(image_path, min_face_size=80, confidence_threshold=0.7):
                 'message': '无法加载人脸检测模型'
             }
         
+        # 门控粗检测：缩小图上找到一张合格人脸即可放行
+        if gate:
+            with timer.stage('detect_coarse'):
+                faces = _coarse_faces(face_cascade, gray, min_face_size)
+            if faces is not None and len(faces) > 0:
+                with timer.stage('score_coarse'):
+                    valid_faces = _valid_faces(gray, faces, confidence_threshold)
+                if valid_faces:
+                    result = _face_result(valid_faces, len(faces), confidence_threshold)
+                    result['decided_by'] = 'coarse'
+                    return result
+        
         # 检测人脸
-        faces = face_cascade.detectMultiScale(
-            gray,
-            scaleFactor=1.1,
-            minNeighbors=5,
-            minSize=(min_face_size, min_face_size)
-        )
-        
-        # 处理检测结果
-        face_count = len(faces)
-        valid_faces = []
-        
-        if face_count > 0:
-            for (x, y, w, h) in faces:
-                # 计算人脸区域的清晰度（使用拉普拉斯算子）
-                face_roi = gray[y:y+h, x:x+w]
-                laplacian_var = cv2.Laplacian(face_roi, cv2.CV_64F).var()
-                
-                # 归一化置信度（基于清晰度）
-                # 清晰度越高，置信度越高
-                confidence = min(laplacian_var / 500.0, 1.0)
-                
-                if confidence >= confidence_threshold:
-                    valid_faces.append({
-                        'x': int(x),
-                        'y': int(y),
-                        'width': int(w),
-                        'height': int(h),
-                        'confidence': round(float(confidence), 3)
-                    })
-        
-        # 判断是否检测到有效人脸
-        if len(valid_faces) > 0:
-            max_confidence = max(face['confidence'] for face in valid_faces)
-            return {
-                'success': True,
-                'face_count': len(valid_faces),
-                'confidence': round(max_confidence, 3),
-                'faces': valid_faces,
-                'message': f'检测到 {len(valid_faces)} 张清晰人脸'
-            }
-        elif face_count > 0:
+        with timer.stage('detect'):
+            faces = detect_faces(face_cascade, gray, min_face_size, scale_factor=1.1, min_neighbors=5, tiled=tiled)
+        
+        with timer.stage('score'):
+            valid_faces = _valid_faces(gray, faces, confidence_threshold)
+        
+        result = _face_result(valid_faces, len(faces), confidence_threshold)
+        if gate:
+            result['decided_by'] = 'full'
+        return result
+    
+    except Exception as e:
+        return {
+            'success': False,
+            'face_count': 0,
+            'message': f'人脸检测失败: {str(e)}'
+        }
+
+
+def load_image(image_path, timer):
+    """
+    读取并解码图片，支持本地路径、http(s) URL、Base64 数据URI 与共享内存引用
+
+    Returns:
+        BGR 图片数组，无法解码时为 None
+    """
+    import cv2
+    import numpy as np
+    
+    if is_shm_ref(image_path):
+        with timer.stage('decode'), shm_view(image_path) as data:
+            return cv2.imdecode(data, cv2.IMREAD_COLOR)
+    if image_path.startswith('data:image/'):
+        with timer.stage('decode'):
+            data = base64.b64decode(image_path.split(',')[1] if ',' in image_path else image_path)
+            return cv2.imdecode(np.frombuffer(data, np.uint8), cv2.IMREAD_COLOR)
+    if image_path.startswith('http://') or image_path.startswith('https://'):
+        import requests
+        
+        with timer.stage('download'):
+            response = requests.get(image_path.strip(), timeout=30)
+            response.raise_for_status()
+        with timer.stage('decode'):
+            return cv2.imdecode(np.frombuffer(response.content, np.uint8), cv2.IMREAD_COLOR)
+    with timer.stage('decode'):
+        return cv2.imread(image_path)
+
+
+def check_faces(image_paths, min_face_size=80, confidence_threshold=0.7, timer=None, gate=False, max_workers=None):
+    """
+    批量检测多张图片，线程池并行处理
+    
+    Args:
+        image_paths: 图片路径、URL、Base64数据或共享内存引用（shm://...）列表
+        min_face_size: 最小人脸尺寸（像素）
+        confidence_threshold: 置信度阈值
+        timer: 阶段计时器（可选，各阶段耗时为所有线程之和）
+        gate: 是否使用两级门控检测
+        max_workers: 线程数（默认 FACE_BATCH_WORKERS，未设置时取图片数与 CPU 核数的较小值）；
+                     只有一张图片时在当前线程检测
+        
+    Returns:
+        dict: {success: bool, results: list, summary: {total, passed, failed, failed_indices, face_count}, message: str}
+              results 与 image_paths 一一对应，每项为 check_face 的结果并附带 index
+    """
+    from face_detection import load_face_cascade, thread_face_cascade, worker_pool
+    
+    timer = timer or StageTimer()
+    with timer.stage('load_model'):
+        face_cascade = load_face_cascade()
+    
+    if face_cascade is None or face_cascade.empty():
+        return {
+            'success': False,
+            'results': [],
+            'message': '无法加载人脸检测模型'
+        }
+    
+    # 多张图片已经按图并行，单张图片内不再分块，避免线程数成倍增加
+    tiled = None if len(image_paths) == 1 else False
+    
+    def check_one(image_path):
+        # 已取消时跳过尚未开始的图片，让线程池尽快退出
+        if cancellation.is_cancelled():
             return {
                 'success': False,
-                'face_count': face_count,
-                'confidence': 0.0,
-                'faces': [],
-                'message': f'检测到 {face_count} 张人脸，但清晰度不足（置信度 < {confidence_threshold}）'
+                'face_count': 0,
+                'message': '任务已取消'
             }
-        else:
+        try:
+            img = load_image(image_path, timer)
+            if img is None:
+                return {
+                    'success': False,
+                    'face_count': 0,
+                    'message': '无法读取图片文件'
+                }
+            return check_face_image(img, min_face_size, confidence_threshold, timer, gate=gate,
+                                    face_cascade=thread_face_cascade(), tiled=tiled)
+        except Exception as e:
             return {
                 'success': False,
                 'face_count': 0,
-                'confidence': 0.0,
-                'faces': [],
-                'message': '未检测到人脸，请上传清晰的正面照'
+                'message': f'人脸检测失败: {str(e)}'
             }
     
-    except Exception as e:
+    if len(image_paths) == 1:
+        # 单张图片可能分块检测，分块使用独立的线程池
+        results = [check_one(image_paths[0])]
+    else:
+        workers = max_workers or FACE_BATCH_WORKERS or min(len(image_paths), os.cpu_count() or 1, 8)
+        results = list(worker_pool('batch', max(workers, 1)).map(check_one, image_paths))
+    
+    for idx, result in enumerate(results):
+        result['index'] = idx
+    failed_indices = [result['index'] for result in results if not result['success']]
+    passed = len(results) - len(failed_indices)
+    
+    return {
+        'success': len(results) > 0 and not failed_indices,
+        'results': results,
+        'summary': {
+            'total': len(results),
+            'passed': passed,
+            'failed': len(failed_indices),
+            'failed_indices': failed_indices,
+            'face_count': sum(result['face_count'] for result in results if result['success'])
+        },
+        'message': f'{passed}/{len(results)} 张图片检测到清晰人脸'
+    }
+
+
+def _face_result(valid_faces, face_count, confidence_threshold):
+    """根据合格人脸和检测到的人脸总数生成结果"""
+    # 判断是否检测到有效人脸
+    if len(valid_faces) > 0:
+        max_confidence = max(face['confidence'] for face in valid_faces)
+        return {
+            'success': True,
+            'face_count': len(valid_faces),
+            'confidence': round(max_confidence, 3),
+            'faces': valid_faces,
+            'message': f'检测到 {len(valid_faces)} 张清晰人脸'
+        }
+    elif face_count > 0:
+        return {
+            'success': False,
+            'face_count': face_count,
+            'confidence': 0.0,
+            'faces': [],
+            'message': f'检测到 {face_count} 张人脸，但清晰度不足（置信度 < {confidence_threshold}）'
+        }
+    else:
         return {
             'success': False,
             'face_count': 0,
-            'message': f'人脸检测失败: {str(e)}'
+            'confidence': 0.0,
+            'faces': [],
+            'message': '未检测到人脸，请上传清晰的正面照'
         }
 
 
 def main():
     """
     命令行入口
-    接收JSON格式的参数: {"image_path": "...", "min_face_size": 80, "confidence_threshold": 0.7}
+    接收JSON格式的参数: {"image_path": "...", "min_face_size": 80, "confidence_threshold": 0.7, "gate": false}
+    批量检测时用 image_paths 列表代替 image_path
+    输出结果附带 timings 字段（各阶段耗时，毫秒）
+    可选参数 _profile / _request_id 开启按需剖析（见 profiling.py）
     """
+    cancellation.install()
+    timer = StageTimer()
     try:
         # 从命令行参数读取JSON
         if len(sys.argv) > 1:
@@ -144,26 +352,32 @@ def main():
             params = json.load(sys.stdin)
         
         image_path = params.get('image_path')
+        image_paths = params.get('image_paths')
         min_face_size = params.get('min_face_size', 80)
         confidence_threshold = params.get('confidence_threshold', 0.7)
+        gate = params.get('gate', False)
         
-        if not image_path:
+        if image_paths:
+            result = run_profiled('check_face', params, check_faces, image_paths, min_face_size, confidence_threshold, timer, gate=gate)
+        elif not image_path:
             result = {
                 'success': False,
                 'face_count': 0,
-                'message': '缺少必需参数: image_path'
+                'message': '缺少必需参数: image_path 或 image_paths'
             }
         else:
-            result = check_face(image_path, min_face_size, confidence_threshold)
+            result = run_profiled('check_face', params, check_face, image_path, min_face_size, confidence_threshold, timer, gate=gate)
         
         # 输出JSON结果
+        result['timings'] = timer.as_dict()
         print(json.dumps(result, ensure_ascii=False))
         
     except Exception as e:
         result = {
             'success': False,
             'face_count': 0,
-            'message': f'脚本执行失败: {str(e)}'
+            'message': f'脚本执行失败: {str(e)}',
+            'timings': timer.as_dict()
         }
         print(json.dumps(result, ensure_ascii=False))
         sys.exit(1)
@@ -8,39 +8,86 @@ Requirements: 7.1
 import sys
 import json
 import os
-from PIL import Image
 import io
+from contextlib import nullcontext
+import cancellation
+from stage_timer import StageTimer
+from profiling import run_profiled
+from shm_io import SHM_OUTPUT, is_shm_ref, open_shm_file, write_output
 
 
-def compress_image(input_path, output_path=None, max_size_mb=2):
+def normalize_pil_mode(img):
+    """
+    转换为压缩支持的模式：带透明度的图片（RGBA / LA / 调色板）保留透明度，其余转换为 RGB
+    （process_upload 的 PIL 视图同样经过这里，保证与单独压缩的结果一致）
+    """
+    if img.mode in ('RGBA', 'LA', 'P'):
+        # 保留透明度
+        if img.mode == 'P':
+            img = img.convert('RGBA')
+    elif img.mode != 'RGB':
+        img = img.convert('RGB')
+    return img
+
+
+def compress_image(input_path, output_path=None, max_size_mb=2, timer=None):
     """
     压缩图片到指定大小以内
     
     Args:
-        input_path: 输入图片路径
-        output_path: 输出图片路径（可选，默认覆盖原文件）
+        input_path: 输入图片路径或共享内存引用（shm://...）
+        output_path: 输出图片路径（可选），为 'shm://' 时写入共享内存段
         max_size_mb: 最大文件大小（MB）
+        timer: 阶段计时器（可选）
         
     Returns:
-        dict: {success: bool, output_path: str, size_kb: float, message: str}
+        dict: {success: bool, output_path | output_shm, size_kb: float, message: str}
     """
+    from PIL import Image
+    
+    timer = timer or StageTimer()
     try:
-        # 打开图片
-        img = Image.open(input_path)
-        
-        # 转换为RGB模式（PNG需要）
-        if img.mode in ('RGBA', 'LA', 'P'):
-            # 保留透明度
-            if img.mode == 'P':
-                img = img.convert('RGBA')
-        elif img.mode != 'RGB':
-            img = img.convert('RGB')
+        source = open_shm_file(input_path) if is_shm_ref(input_path) else nullcontext(input_path)
+        with timer.stage('decode'), source as fp:
+            # 打开图片（Pillow 延迟解码，显式 load 以便计入解码阶段）
+            img = Image.open(fp)
+            img.load()
+            img = normalize_pil_mode(img)
         
         # 如果没有指定输出路径，使用输入路径
         if output_path is None:
-            base, _ = os.path.splitext(input_path)
-            output_path = f"{base}_compressed.png"
+            if is_shm_ref(input_path):
+                output_path = SHM_OUTPUT
+            else:
+                base, _ = os.path.splitext(input_path)
+                output_path = f"{base}_compressed.png"
+        
+        return compress_pil_image(img, output_path, max_size_mb, timer)
+    
+    except Exception as e:
+        return {
+            'success': False,
+            'message': f'图片压缩失败: {str(e)}'
+        }
+
+
+def compress_pil_image(img, output_path, max_size_mb=2, timer=None):
+    """
+    将已解码的图片压缩为PNG写入 output_path（供 process_upload 等复用解码结果）
+    
+    Args:
+        img: PIL Image（RGB 或 RGBA）
+        output_path: 输出图片路径，为 'shm://' 时写入共享内存段
+        max_size_mb: 最大文件大小（MB）
+        timer: 阶段计时器（可选）
         
+    Returns:
+        dict: 同 compress_image
+    """
+    from PIL import Image
+    
+    timer = timer or StageTimer()
+    try:
         # 目标大小（字节）
         max_size_bytes = max_size_mb * 1024 * 1024
         
@@ -53,35 +100,36 @@ def compress_image(input_path, output_path=None, max_size_mb=2):
         
         # 尝试压缩
         while True:
-            # 调整尺寸
-            if scale < 1.0:
-                new_width = int(original_width * scale)
-                new_height = int(original_height * scale)
-                resized_img = img.resize((new_width, new_height), Image.Resampling.LANCZOS)
-            else:
-                resized_img = img
-            
-            # 保存到内存缓冲区
-            buffer = io.BytesIO()
-            
-            # PNG格式保存
-            if resized_img.mode == 'RGBA':
-                resized_img.save(buffer, format='PNG', optimize=True)
-            else:
-                resized_img.save(buffer, format='PNG', optimize=True)
+            with timer.stage('encode'):
+                # 调整尺寸
+                if scale < 1.0:
+                    new_width = int(original_width * scale)
+                    new_height = int(original_height * scale)
+                    resized_img = img.resize((new_width, new_height), Image.Resampling.LANCZOS)
+                else:
+                    resized_img = img
+                
+                # 保存到内存缓冲区
+                buffer = io.BytesIO()
+                
+                # PNG格式保存
+                if resized_img.mode == 'RGBA':
+                    resized_img.save(buffer, format='PNG', optimize=True)
+                else:
+                    resized_img.save(buffer, format='PNG', optimize=True)
             
             # 获取大小
             size = buffer.tell()
             
             # 如果大小满足要求，保存文件
             if size <= max_size_bytes:
-                with open(output_path, 'wb') as f:
-                    f.write(buffer.getvalue())
+                with timer.stage('write'):
+                    output = write_output(output_path, buffer.getbuffer())
                 
                 size_kb = size / 1024
                 return {
                     'success': True,
-                    'output_path': output_path,
+                    **output,
                     'size_kb': round(size_kb, 2),
                     'original_size': f"{original_width}x{original_height}",
                     'compressed_size': f"{resized_img.size[0]}x{resized_img.size[1]}",
@@ -95,13 +143,13 @@ def compress_image(input_path, output_path=None, max_size_mb=2):
                 scale -= 0.1
             else:
                 # 已经尽力了，保存当前版本
-                with open(output_path, 'wb') as f:
-                    f.write(buffer.getvalue())
+                with timer.stage('write'):
+                    output = write_output(output_path, buffer.getbuffer())
                 
                 size_kb = size / 1024
                 return {
                     'success': True,
-                    'output_path': output_path,
+                    **output,
                     'size_kb': round(size_kb, 2),
                     'original_size': f"{original_width}x{original_height}",
                     'compressed_size': f"{resized_img.size[0]}x{resized_img.size[1]}",
@@ -119,7 +167,12 @@ def main():
     """
     命令行入口
     接收JSON格式的参数: {"input_path": "...", "output_path": "...", "max_size_mb": 2}
+    输出结果附带 timings 字段（各阶段耗时，毫秒）
+    可选参数 _profile / _request_id 开启按需剖析（见 profiling.py）
+    input_path 可为共享内存引用 shm://...，output_path 为 shm:// 时结果写入共享内存段（见 shm_io.py）
     """
+    cancellation.install()
+    timer = StageTimer()
     try:
         # 从命令行参数读取JSON
         if len(sys.argv) > 1:
@@ -138,15 +191,17 @@ def main():
                 'message': '缺少必需参数: input_path'
             }
         else:
-            result = compress_image(input_path, output_path, max_size_mb)
+            result = run_profiled('compress_image', params, compress_image, input_path, output_path, max_size_mb, timer)
         
         # 输出JSON结果
+        result['timings'] = timer.as_dict()
         print(json.dumps(result, ensure_ascii=False))
         
     except Exception as e:
         result = {
             'success': False,
-            'message': f'脚本执行失败: {str(e)}'
+            'message': f'脚本执行失败: {str(e)}',
+            'timings': timer.as_dict()
         }
         print(json.dumps(result, ensure_ascii=False))
         sys.exit(1)
@@ -8,29 +8,37 @@ import sys
 import json
 import subprocess
 import os
-import tempfile
-import urllib.request
+import cancellation
+from stage_timer import StageTimer
+from profiling import run_profiled
 
-def convert_to_live_photo(video_url, output_path=None):
+def convert_to_live_photo(video_url, output_path=None, timer=None):
     """
     将MP4视频转换为Live Photo格式
     
     Args:
         video_url: 视频URL或本地路径
         output_path: 输出文件路径(可选)
+        timer: 阶段计时器(可选)
     
     Returns:
         dict: 包含success状态和输出文件路径的字典
     """
+    timer = timer or StageTimer()
+    # 本次调用创建的临时文件（被取消时由 cancellation 删除）
+    temp_input = None
+    temp_output = None
     try:
         # 如果是URL，先下载到临时文件
         if video_url.startswith('http://') or video_url.startswith('https://'):
-            temp_input = tempfile.NamedTemporaryFile(suffix='.mp4', delete=False)
-            temp_input.close()
+            import urllib.request
+            
+            temp_input = cancellation.scratch_file('.mp4')
             
             print(f"正在下载视频: {video_url}", file=sys.stderr)
-            urllib.request.urlretrieve(video_url, temp_input.name)
-            input_path = temp_input.name
+            with timer.stage('download'):
+                urllib.request.urlretrieve(video_url, temp_input)
+            input_path = temp_input
         else:
             input_path = video_url
         
@@ -43,9 +51,8 @@ def convert_to_live_photo(video_url, output_path=None):
         
         # 如果没有指定输出路径，使用临时文件
         if output_path is None:
-            temp_output = tempfile.NamedTemporaryFile(suffix='.mov', delete=False)
-            temp_output.close()
-            output_path = temp_output.name
+            temp_output = cancellation.scratch_file('.mov')
+            output_path = temp_output
         
         # 使用FFmpeg转换为Live Photo格式
         # -c:v hevc: 使用HEVC编码
@@ -66,12 +73,13 @@ def convert_to_live_photo(video_url, output_path=None):
         print(f"正在转换视频格式: {' '.join(ffmpeg_command)}", file=sys.stderr)
         
         # 执行FFmpeg命令
-        result = subprocess.run(
-            ffmpeg_command,
-            stdout=subprocess.PIPE,
-            stderr=subprocess.PIPE,
-            timeout=60  # 60秒超时
-        )
+        with timer.stage('transcode'):
+            result = subprocess.run(
+                ffmpeg_command,
+                stdout=subprocess.PIPE,
+                stderr=subprocess.PIPE,
+                timeout=60  # 60秒超时
+            )
         
         if result.returncode != 0:
             error_message = result.stderr.decode('utf-8', errors='ignore')
@@ -90,12 +98,10 @@ def convert_to_live_photo(video_url, output_path=None):
         # 获取文件大小
         file_size = os.path.getsize(output_path)
         
-        # 清理临时输入文件
-        if video_url.startswith('http://') or video_url.startswith('https://'):
-            try:
-                os.unlink(input_path)
-            except:
-                pass
+        # 输出文件交给调用方（由 Node 上传后删除）
+        if temp_output:
+            cancellation.keep(temp_output)
+            temp_output = None
         
         return {
             'success': True,
@@ -114,9 +120,20 @@ def convert_to_live_photo(video_url, output_path=None):
             'success': False,
             'message': f'转换过程中发生错误: {str(e)}'
         }
+    finally:
+        # 清理临时输入文件，以及失败时未交付的临时输出文件
+        if temp_input:
+            cancellation.discard(temp_input)
+        if temp_output:
+            cancellation.discard(temp_output)
 
 def main():
-    """主函数"""
+    """
+    主函数，输出结果附带 timings 字段(各阶段耗时，毫秒)
+    可选参数 _profile / _request_id 开启按需剖析(见 profiling.py)
+    """
+    cancellation.install()
+    timer = StageTimer()
     try:
         # 从命令行参数读取JSON，如果没有则从stdin读取
         if len(sys.argv) > 1:
@@ -130,26 +147,30 @@ def main():
         if not video_url:
             print(json.dumps({
                 'success': False,
-                'message': '缺少video_url参数'
+                'message': '缺少video_url参数',
+                'timings': timer.as_dict()
             }))
             sys.exit(1)
         
         # 执行转换
-        result = convert_to_live_photo(video_url, output_path)
+        result = run_profiled('convert_to_live_photo', params, convert_to_live_photo, video_url, output_path, timer)
         
         # 输出结果
+        result['timings'] = timer.as_dict()
         print(json.dumps(result))
         
     except json.JSONDecodeError:
         print(json.dumps({
             'success': False,
-            'message': '参数格式错误，需要JSON格式'
+            'message': '参数格式错误，需要JSON格式',
+            'timings': timer.as_dict()
         }))
         sys.exit(1)
     except Exception as e:
         print(json.dumps({
             'success': False,
-            'message': f'执行失败: {str(e)}'
+            'message': f'执行失败: {str(e)}',
+            'timings': timer.as_dict()
         }))
         sys.exit(1)
 
@@ -2,17 +2,151 @@
 """
 订单Excel导出脚本
 使用openpyxl生成Excel文件，包含所有订单必要信息
+支持增量导出：通过清单文件记录高水位线，只导出新增订单
+（append 模式把每批新增订单写成滚动目录下按序编号的分片文件，不重写历史数据）
 Requirements: 8.4, 8.5
 """
 
 import sys
+import os
 import json
-from openpyxl import Workbook
-from openpyxl.styles import Font, Alignment, PatternFill, Border, Side
-from datetime import datetime
+from datetime import datetime, timezone
+from functools import lru_cache
+import cancellation
+from stage_timer import StageTimer
+from profiling import run_profiled
 
 
-def export_orders_excel(orders, output_path=None):
+# 表头
+HEADERS = [
+    "订单编号",
+    "用户姓名",
+    "联系电话",
+    "收货地址",
+    "产品类型",
+    "艺术照URL",
+    "下单时间"
+]
+
+# 列宽
+COLUMN_WIDTHS = {
+    'A': 20,  # 订单编号
+    'B': 15,  # 用户姓名
+    'C': 15,  # 联系电话
+    'D': 40,  # 收货地址
+    'E': 12,  # 产品类型
+    'F': 50,  # 艺术照URL
+    'G': 20   # 下单时间
+}
+
+# 产品类型映射
+PRODUCT_TYPE_MAP = {
+    'crystal': '晶瓷画',
+    'scroll': '卷轴'
+}
+
+
+@lru_cache(maxsize=1)
+def _thin_border():
+    """边框样式（所有单元格共用一个对象）"""
+    from openpyxl.styles import Border, Side
+    
+    return Border(
+        left=Side(style='thin'),
+        right=Side(style='thin'),
+        top=Side(style='thin'),
+        bottom=Side(style='thin')
+    )
+
+
+def _create_workbook():
+    """
+    创建带表头样式的空工作簿
+    
+    Returns:
+        tuple: (Workbook, Worksheet)
+    """
+    from openpyxl import Workbook
+    from openpyxl.styles import Font, Alignment, PatternFill
+    
+    wb = Workbook()
+    ws = wb.active
+    ws.title = "实体产品订单"
+    
+    # 设置表头样式
+    header_font = Font(name='微软雅黑', size=12, bold=True, color='FFFFFF')
+    header_fill = PatternFill(start_color='4472C4', end_color='4472C4', fill_type='solid')
+    header_alignment = Alignment(horizontal='center', vertical='center')
+    
+    # 写入表头
+    for col_idx, header in enumerate(HEADERS, start=1):
+        cell = ws.cell(row=1, column=col_idx, value=header)
+        cell.font = header_font
+        cell.fill = header_fill
+        cell.alignment = header_alignment
+        cell.border = _thin_border()
+    
+    # 设置列宽
+    for col, width in COLUMN_WIDTHS.items():
+        ws.column_dimensions[col].width = width
+    
+    # 冻结首行
+    ws.freeze_panes = 'A2'
+    
+    return wb, ws
+
+
+def _write_order_rows(ws, orders, start_row=2):
+    """
+    从指定行开始写入订单数据
+    
+    Args:
+        ws: 工作表
+        orders: 订单数据列表
+        start_row: 起始行号
+    """
+    from openpyxl.styles import Font, Alignment
+    
+    data_alignment = Alignment(horizontal='left', vertical='center', wrap_text=True)
+    url_font = Font(name='微软雅黑', size=10, color='0563C1', underline='single')
+    
+    for row_idx, order in enumerate(orders, start=start_row):
+        # 格式化时间
+        create_time = order.get('create_time', '')
+        if isinstance(create_time, str):
+            try:
+                dt = datetime.fromisoformat(create_time.replace('Z', '+00:00'))
+                create_time = dt.strftime('%Y-%m-%d %H:%M:%S')
+            except:
+                pass
+        
+        row_data = [
+            order.get('order_id', ''),
+            order.get('user_name', ''),
+            order.get('phone', ''),
+            order.get('address', ''),
+            PRODUCT_TYPE_MAP.get(order.get('product_type', ''), order.get('product_type', '')),
+            order.get('image_url', ''),
+            create_time
+        ]
+        
+        # 写入数据
+        for col_idx, value in enumerate(row_data, start=1):
+            cell = ws.cell(row=row_idx, column=col_idx, value=value)
+            cell.alignment = data_alignment
+            cell.border = _thin_border()
+            
+            # URL列使用蓝色字体
+            if col_idx == 6:
+                cell.font = url_font
+
+
+def _default_output_path():
+    timestamp = datetime.now().strftime('%Y%m%d_%H%M%S')
+    return f"product_orders_{timestamp}.xlsx"
+
+
+def export_orders_excel(orders, output_path=None, timer=None):
     """
     将实体产品订单导出为Excel文件
     
@@ -22,108 +156,23 @@ def export_orders_excel(orders, output_path=None):
             product_type, image_url, create_time
         }]
         output_path: 输出文件路径（可选）
+        timer: 阶段计时器（可选）
         
     Returns:
         dict: {success: bool, output_path: str, order_count: int, message: str}
     """
+    timer = timer or StageTimer()
     try:
-        # 创建工作簿
-        wb = Workbook()
-        ws = wb.active
-        ws.title = "实体产品订单"
-        
-        # 定义表头
-        headers = [
-            "订单编号",
-            "用户姓名",
-            "联系电话",
-            "收货地址",
-            "产品类型",
-            "艺术照URL",
-            "下单时间"
-        ]
-        
-        # 设置表头样式
-        header_font = Font(name='微软雅黑', size=12, bold=True, color='FFFFFF')
-        header_fill = PatternFill(start_color='4472C4', end_color='4472C4', fill_type='solid')
-        header_alignment = Alignment(horizontal='center', vertical='center')
-        
-        # 边框样式
-        thin_border = Border(
-            left=Side(style='thin'),
-            right=Side(style='thin'),
-            top=Side(style='thin'),
-            bottom=Side(style='thin')
-        )
-        
-        # 写入表头
-        for col_idx, header in enumerate(headers, start=1):
-            cell = ws.cell(row=1, column=col_idx, value=header)
-            cell.font = header_font
-            cell.fill = header_fill
-            cell.alignment = header_alignment
-            cell.border = thin_border
-        
-        # 设置列宽
-        column_widths = {
-            'A': 20,  # 订单编号
-            'B': 15,  # 用户姓名
-            'C': 15,  # 联系电话
-            'D': 40,  # 收货地址
-            'E': 12,  # 产品类型
-            'F': 50,  # 艺术照URL
-            'G': 20   # 下单时间
-        }
-        
-        for col, width in column_widths.items():
-            ws.column_dimensions[col].width = width
-        
-        # 写入订单数据
-        for row_idx, order in enumerate(orders, start=2):
-            # 产品类型映射
-            product_type_map = {
-                'crystal': '晶瓷画',
-                'scroll': '卷轴'
-            }
-            
-            # 格式化时间
-            create_time = order.get('create_time', '')
-            if isinstance(create_time, str):
-                try:
-                    dt = datetime.fromisoformat(create_time.replace('Z', '+00:00'))
-                    create_time = dt.strftime('%Y-%m-%d %H:%M:%S')
-                except:
-                    pass
-            
-            row_data = [
-                order.get('order_id', ''),
-                order.get('user_name', ''),
-                order.get('phone', ''),
-                order.get('address', ''),
-                product_type_map.get(order.get('product_type', ''), order.get('product_type', '')),
-                order.get('image_url', ''),
-                create_time
-            ]
-            
-            # 写入数据
-            for col_idx, value in enumerate(row_data, start=1):
-                cell = ws.cell(row=row_idx, column=col_idx, value=value)
-                cell.alignment = Alignment(horizontal='left', vertical='center', wrap_text=True)
-                cell.border = thin_border
-                
-                # URL列使用蓝色字体
-                if col_idx == 6:
-                    cell.font = Font(name='微软雅黑', size=10, color='0563C1', underline='single')
-        
-        # 冻结首行
-        ws.freeze_panes = 'A2'
+        with timer.stage('build'):
+            wb, ws = _create_workbook()
+            _write_order_rows(ws, orders)
         
         # 保存文件
         if output_path is None:
-            timestamp = datetime.now().strftime('%Y%m%d_%H%M%S')
-            output_path = f"product_orders_{timestamp}.xlsx"
+            output_path = _default_output_path()
         
-        wb.save(output_path)
+        with timer.stage('write'):
+            wb.save(output_path)
         
         return {
             'success': True,
@@ -139,6 +188,156 @@ def export_orders_excel(orders, output_path=None):
         }
 
 
+def _parse_create_time(value):
+    """
+    将下单时间解析为UTC naive datetime，用于排序和比较
+    """
+    if isinstance(value, datetime):
+        dt = value
+    else:
+        try:
+            dt = datetime.fromisoformat(str(value).replace('Z', '+00:00'))
+        except ValueError:
+            return datetime.min
+    if dt.tzinfo is not None:
+        dt = dt.astimezone(timezone.utc).replace(tzinfo=None)
+    return dt
+
+
+def _order_sort_key(order):
+    return (_parse_create_time(order.get('create_time', '')), str(order.get('order_id', '')))
+
+
+def load_manifest(manifest_path):
+    """
+    读取增量导出清单，不存在或损坏时返回空清单
+    
+    Returns:
+        dict: {last_create_time, last_order_id, exported_count, chunk_count, updated_at}
+    """
+    try:
+        with open(manifest_path, 'r', encoding='utf-8') as f:
+            manifest = json.load(f)
+        return manifest if isinstance(manifest, dict) else {}
+    except (OSError, ValueError):
+        return {}
+
+
+def save_manifest(manifest_path, manifest):
+    """
+    原子写入增量导出清单（先写临时文件再替换），避免中断时留下半个文件
+    """
+    manifest_dir = os.path.dirname(manifest_path)
+    if manifest_dir:
+        os.makedirs(manifest_dir, exist_ok=True)
+    tmp_path = f"{manifest_path}.tmp"
+    with open(tmp_path, 'w', encoding='utf-8') as f:
+        json.dump(manifest, f, ensure_ascii=False, indent=2)
+    os.replace(tmp_path, manifest_path)
+
+
+def filter_new_orders(orders, manifest):
+    """
+    返回高水位线 (last_create_time, last_order_id) 之后的订单，按下单时间升序排列
+    """
+    if manifest.get('last_create_time'):
+        watermark = (
+            _parse_create_time(manifest['last_create_time']),
+            str(manifest.get('last_order_id', ''))
+        )
+        orders = [order for order in orders if _order_sort_key(order) > watermark]
+    return sorted(orders, key=_order_sort_key)
+
+
+def export_orders_incremental(orders, manifest_path, output_path=None, mode='delta', timer=None,
+                              commit_manifest=True):
+    """
+    增量导出：只导出清单高水位线之后的新订单，成功后推进高水位线
+    
+    Args:
+        orders: 订单数据列表（可包含已导出订单，会被过滤）
+        manifest_path: 增量导出清单路径（不同模式应使用不同的清单）
+        output_path: 输出文件路径；append 模式下为滚动目录，新增订单写入其中的 part-NNNNN.xlsx
+        mode: delta（新增订单单独成文件）/ append（追加为滚动目录中的下一个分片）
+        timer: 阶段计时器（可选）
+        commit_manifest: 是否在文件写入后立即保存清单；为 False 时新清单通过 manifest 字段返回，
+                         由调用方在文件成功交付后再写入
+        
+    Returns:
+        dict: {success: bool, output_path: str, order_count: int, incremental: True,
+               mode: str, since: dict, message: str, manifest?: dict, chunk?: int, total_rows?: int}
+    """
+    if mode not in ('delta', 'append'):
+        return {
+            'success': False,
+            'message': f'不支持的增量导出模式: {mode}'
+        }
+    
+    timer = timer or StageTimer()
+    with timer.stage('manifest'):
+        manifest = load_manifest(manifest_path)
+        new_orders = filter_new_orders(orders, manifest)
+    since = {
+        'create_time': manifest.get('last_create_time'),
+        'order_id': manifest.get('last_order_id')
+    }
+    
+    if not new_orders:
+        return {
+            'success': True,
+            'output_path': None,
+            'order_count': 0,
+            'incremental': True,
+            'mode': mode,
+            'since': since,
+            'message': '没有新增订单'
+        }
+    
+    exported_count = manifest.get('exported_count', 0) + len(new_orders)
+    chunk_count = manifest.get('chunk_count', 0)
+    if mode == 'append':
+        # 每次追加写一个只含新增订单的分片，耗时与新增订单数成正比；
+        # 分片序号取自清单，清单未推进时下次会覆盖同一个分片
+        if output_path is None:
+            output_path = os.path.join(os.path.dirname(manifest_path), 'product_orders_rolling')
+        os.makedirs(output_path, exist_ok=True)
+        chunk_count += 1
+        output_path = os.path.join(output_path, f'part-{chunk_count:05d}.xlsx')
+    
+    result = export_orders_excel(new_orders, output_path, timer)
+    if not result['success']:
+        return result
+    
+    # 文件写入成功后才推进高水位线，失败时下次会重新导出同一批订单
+    last_order = new_orders[-1]
+    last_create_time = last_order.get('create_time', '')
+    new_manifest = {
+        'last_create_time': last_create_time if isinstance(last_create_time, str) else str(last_create_time),
+        'last_order_id': str(last_order.get('order_id', '')),
+        'exported_count': exported_count,
+        'chunk_count': chunk_count,
+        'updated_at': datetime.now().isoformat(timespec='seconds')
+    }
+    if commit_manifest:
+        with timer.stage('manifest'):
+            save_manifest(manifest_path, new_manifest)
+    else:
+        result['manifest'] = new_manifest
+    
+    result.update({
+        'incremental': True,
+        'mode': mode,
+        'since': since
+    })
+    if mode == 'append':
+        result.update({
+            'chunk': chunk_count,
+            'total_rows': exported_count,
+            'message': f'成功追加 {len(new_orders)} 条订单（分片 {chunk_count}）'
+        })
+    return result
+
+
 def main():
     """
     命令行入口
@@ -152,9 +351,17 @@ def main():
             "image_url": "...",
             "create_time": "..."
         }],
-        "output_path": "..."
+        "output_path": "...",
+        "incremental": false,
+        "manifest_path": "...",
+        "mode": "delta|append",
+        "commit_manifest": true
     }
+    输出结果附带 timings 字段（各阶段耗时，毫秒）
+    可选参数 _profile / _request_id 开启按需剖析（见 profiling.py）
     """
+    cancellation.install()
+    timer = StageTimer()
     try:
         # 从命令行参数读取JSON
         if len(sys.argv) > 1:
@@ -165,22 +372,36 @@ def main():
         
         orders = params.get('orders', [])
         output_path = params.get('output_path')
+        incremental = params.get('incremental', False)
+        manifest_path = params.get('manifest_path')
         
-        if not orders:
+        if incremental and not manifest_path:
+            result = {
+                'success': False,
+                'message': '增量导出缺少必需参数: manifest_path'
+            }
+        elif incremental:
+            # 增量模式下 orders 可以为空（例如服务端已按高水位线过滤）
+            result = run_profiled('export_orders_excel', params, export_orders_incremental,
+                                  orders, manifest_path, output_path, params.get('mode', 'delta'), timer,
+                                  params.get('commit_manifest', True))
+        elif not orders:
             result = {
                 'success': False,
                 'message': '缺少必需参数: orders'
             }
         else:
-            result = export_orders_excel(orders, output_path)
+            result = run_profiled('export_orders_excel', params, export_orders_excel, orders, output_path, timer)
         
         # 输出JSON结果
+        result['timings'] = timer.as_dict()
         print(json.dumps(result, ensure_ascii=False))
         
     except Exception as e:
         result = {
             'success': False,
-            'message': f'脚本执行失败: {str(e)}'
+            'message': f'脚本执行失败: {str(e)}',
+            'timings': timer.as_dict()
         }
         print(json.dumps(result, ensure_ascii=False))
         sys.exit(1)
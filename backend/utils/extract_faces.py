@@ -7,25 +7,32 @@ Requirements: 9.1
 
 import sys
 import json
-import cv2
 import os
 import base64
-import requests
 from io import BytesIO
-from PIL import Image
-import numpy as np
+import cancellation
+from stage_timer import StageTimer
+from profiling import run_profiled
+from shm_io import ShmWriter, is_shm_ref, is_shm_output, shm_view
 
 
-def download_image_from_url(url):
+def download_image_from_url(url, timer=None):
     """
     从URL下载图片
     
     Args:
         url: 图片URL
+        timer: 阶段计时器（可选），下载与解码分别计入 download / decode
         
     Returns:
         numpy.ndarray: OpenCV图片对象
     """
+    import cv2
+    import numpy as np
+    import requests
+    from PIL import Image
+    
+    timer = timer or StageTimer()
     try:
         # 验证URL格式
         if not url or not isinstance(url, str):
@@ -38,14 +45,16 @@ def download_image_from_url(url):
         
         print(f'正在下载图片: {url}', file=sys.stderr)
         
-        response = requests.get(url, timeout=30)
-        response.raise_for_status()
-        
-        # 将响应内容转换为PIL Image
-        pil_image = Image.open(BytesIO(response.content))
+        with timer.stage('download'):
+            response = requests.get(url, timeout=30)
+            response.raise_for_status()
         
-        # 转换为OpenCV格式
-        opencv_image = cv2.cvtColor(np.array(pil_image), cv2.COLOR_RGB2BGR)
+        with timer.stage('decode'):
+            # 将响应内容转换为PIL Image
+            pil_image = Image.open(BytesIO(response.content))
+            
+            # 转换为OpenCV格式
+            opencv_image = cv2.cvtColor(np.array(pil_image), cv2.COLOR_RGB2BGR)
         
         return opencv_image
     except requests.exceptions.RequestException as e:
@@ -54,52 +63,270 @@ def download_image_from_url(url):
         raise Exception(f'处理图片失败 ({url}): {str(e)}')
 
 
-def extract_faces(image_paths, output_dir=None, min_face_size=80, confidence_threshold=0.7):
+# 裁剪图格式: (扩展名, JPEG 质量)
+CROP_FORMATS = {'png': ('.png', None), 'jpeg': ('.jpg', 90)}
+PACK_MODES = ('array', 'sprite')
+
+
+def normalized_face_crop(img, x, y, w, h, crop_size, margin=0.1):
     """
-    从上传的照片中提取人脸区域
+    以人脸框中心取正方形区域（边长 = 人脸边长 * (1 + 2 * margin)），缩放为 crop_size x crop_size
+    超出图片的部分复制边缘像素，保证所有裁剪图的边距比例一致
+    """
+    import cv2
+    
+    side = int(round(max(w, h) * (1 + 2 * margin)))
+    x1 = int(round(x + w / 2 - side / 2))
+    y1 = int(round(y + h / 2 - side / 2))
+    x2, y2 = x1 + side, y1 + side
+    height, width = img.shape[:2]
+
+    crop = img[max(y1, 0):min(y2, height), max(x1, 0):min(x2, width)]
+    pad = (max(-y1, 0), max(y2 - height, 0), max(-x1, 0), max(x2 - width, 0))
+    if any(pad):
+        crop = cv2.copyMakeBorder(crop, *pad, cv2.BORDER_REPLICATE)
+    interpolation = cv2.INTER_AREA if side > crop_size else cv2.INTER_CUBIC
+    return cv2.resize(crop, (crop_size, crop_size), interpolation=interpolation)
+
+
+def _encode_params(crop_format):
+    """裁剪图编码参数（cv2.imencode / imwrite）"""
+    import cv2
+    
+    quality = CROP_FORMATS[crop_format][1]
+    return [cv2.IMWRITE_JPEG_QUALITY, quality] if quality else []
+
+
+def encode_face_crop(face_img, crop_format='png'):
+    """按 crop_format（png/jpeg）编码裁剪图，返回编码后的字节数组"""
+    import cv2
+    
+    _, buffer = cv2.imencode(CROP_FORMATS[crop_format][0], face_img, _encode_params(crop_format))
+    return buffer
+
+
+def pack_face_crops(crops, mode, crop_format='png'):
+    """
+    把同尺寸的裁剪图打包为一份输出
+
+    Args:
+        crops: BGR 裁剪图列表（尺寸相同）
+        mode: array（(N, S, S, 3) RGB uint8 原始数组）或 sprite（网格拼图，编码一次）
+        crop_format: sprite 的编码格式
+
+    Returns:
+        (data, info, offsets): 待输出的字节、打包信息、各裁剪图在拼图中的位置（array 模式为 None）
+    """
+    import cv2
+    import numpy as np
+    
+    size = crops[0].shape[0]
+    if mode == 'array':
+        stack = np.stack([cv2.cvtColor(crop, cv2.COLOR_BGR2RGB) for crop in crops])
+        return stack, {'format': 'array', 'shape': list(stack.shape), 'dtype': 'uint8', 'channels': 'RGB'}, None
+
+    cols = int(np.ceil(np.sqrt(len(crops))))
+    rows = -(-len(crops) // cols)
+    sheet = np.zeros((rows * size, cols * size, 3), np.uint8)
+    offsets = []
+    for i, crop in enumerate(crops):
+        row, col = divmod(i, cols)
+        sheet[row * size:(row + 1) * size, col * size:(col + 1) * size] = crop
+        offsets.append({'x': col * size, 'y': row * size})
+    info = {
+        'format': 'sprite',
+        'image_format': crop_format,
+        'width': cols * size,
+        'height': rows * size,
+        'tile_size': size
+    }
+    return encode_face_crop(sheet, crop_format), info, offsets
+
+
+def extract_faces_from_image(img, source_image, image_idx=0, output_dir=None, min_face_size=80,
+                             confidence_threshold=0.7, timer=None, gray=None, shm_writer=None,
+                             crop_size=None, crop_margin=0.1, crop_format='png', packed=None):
+    """
+    从一张已解码的图片中提取人脸（供 process_upload 等复用解码结果）
     
     Args:
-        image_paths: 图片路径、URL或Base64数据列表
-        output_dir: 输出目录(可选)
+        img: BGR 图片数组
+        source_image: 来源标识（写入结果的 source_image 字段）
+        image_idx: 图片序号（用于输出文件名）
+        output_dir: 输出目录(可选)，不指定时返回 Base64
         min_face_size: 最小人脸尺寸(像素)
         confidence_threshold: 置信度阈值
+        timer: 阶段计时器（可选）
+        gray: 已转换好的灰度图（可选，避免重复转换）
+        shm_writer: 共享内存段写入器（可选），指定时裁剪图写入段中并返回 image_shm 引用
+        crop_size: 统一裁剪尺寸（可选），指定时输出 crop_size x crop_size 的正方形裁剪图
+        crop_margin: 统一裁剪时人脸框每侧的边距比例
+        crop_format: 裁剪图编码格式 png / jpeg
+        packed: 打包收集列表（可选），指定时裁剪图不单独编码，追加到列表并在结果中记录 pack_index
         
     Returns:
-        dict: {success: bool, faces: list, message: str}
+        list: 人脸数据列表 [{image_url|image_base64|image_shm, bbox, confidence, source_image}]
     """
-    try:
-        all_faces = []
+    import cv2
+    from face_detection import load_face_cascade, detect_faces
+    from face_quality import score_faces, quality_breakdown
+    
+    timer = timer or StageTimer()
+    faces_data = []
+    
+    with timer.stage('load_model'):
+        face_cascade = load_face_cascade(verbose=True)
+    if face_cascade is None or face_cascade.empty():
+        raise Exception('无法加载人脸检测模型，请确保OpenCV已正确安装')
+    
+    # 转换为灰度图
+    if gray is None:
+        with timer.stage('decode'):
+            gray = cv2.cvtColor(img, cv2.COLOR_BGR2GRAY)
+    
+    # 检测人脸 (使用更宽松的参数)
+    with timer.stage('detect'):
+        faces = detect_faces(face_cascade, gray, min_face_size, scale_factor=1.05, min_neighbors=3)
+    
+    # 清晰度/曝光/对比度/相对尺寸综合评分（所有人脸一次向量化计算）
+    with timer.stage('score'):
+        scores = score_faces(gray, faces)
+    
+    # 提取每个人脸
+    for face_idx, (x, y, w, h) in enumerate(faces):
+        confidence = scores['confidence'][face_idx]
         
-        # 加载人脸检测模型
-        # 尝试多个可能的模型路径
-        cascade_paths = []
+        if confidence < confidence_threshold:
+            continue
         
-        # 优先使用 cv2.data.haarcascades（适用于大多数安装）
-        if hasattr(cv2, 'data') and hasattr(cv2.data, 'haarcascades'):
-            cascade_paths.append(cv2.data.haarcascades + 'haarcascade_frontalface_default.xml')
+        if crop_size:
+            # 统一尺寸的正方形裁剪图
+            with timer.stage('crop'):
+                face_img = normalized_face_crop(img, x, y, w, h, crop_size, crop_margin)
+        else:
+            # 扩展边界(增加10%边距)
+            margin = int(w * 0.1)
+            x1 = max(0, x - margin)
+            y1 = max(0, y - margin)
+            x2 = min(img.shape[1], x + w + margin)
+            y2 = min(img.shape[0], y + h + margin)
+            
+            # 提取人脸区域
+            face_img = img[y1:y2, x1:x2]
         
-        # 其他可能的路径
-        cascade_paths.extend([
-            'haarcascade_frontalface_default.xml',  # 当前目录
-            '/usr/share/opencv4/haarcascades/haarcascade_frontalface_default.xml',  # Alpine Linux
-            '/usr/local/share/opencv4/haarcascades/haarcascade_frontalface_default.xml',  # 其他Linux
-            'C:\\ProgramData\\Miniconda3\\lib\\site-packages\\cv2\\data\\haarcascade_frontalface_default.xml',  # Windows Miniconda
-        ])
+        face_data = {
+            'bbox': {
+                'x': int(x),
+                'y': int(y),
+                'width': int(w),
+                'height': int(h)
+            },
+            'confidence': round(float(confidence), 3),
+            'quality': quality_breakdown(scores, face_idx),
+            'source_image': source_image
+        }
         
-        face_cascade = None
-        for cascade_path in cascade_paths:
-            if cascade_path is None:
-                continue
-            try:
-                print(f'尝试加载模型: {cascade_path}', file=sys.stderr)
-                cascade = cv2.CascadeClassifier(cascade_path)
-                if not cascade.empty():
-                    face_cascade = cascade
-                    print(f'成功加载模型: {cascade_path}', file=sys.stderr)
-                    break
-            except Exception as e:
-                print(f'加载模型失败 ({cascade_path}): {str(e)}', file=sys.stderr)
-                continue
+        # 保存或编码人脸图片
+        if packed is not None:
+            # 打包输出：由调用方统一编码
+            face_data = {'pack_index': len(packed), **face_data}
+            packed.append(face_img)
+        elif shm_writer is not None:
+            with timer.stage('encode'):
+                buffer = encode_face_crop(face_img, crop_format)
+            with timer.stage('write'):
+                face_data = {'image_shm': shm_writer.append(buffer), **face_data}
+        elif output_dir:
+            # 保存到文件
+            os.makedirs(output_dir, exist_ok=True)
+            face_filename = f"face_{image_idx}_{face_idx}{CROP_FORMATS[crop_format][0]}"
+            face_path = os.path.join(output_dir, face_filename)
+            with timer.stage('write'):
+                cv2.imwrite(face_path, face_img, _encode_params(crop_format))
+            face_data = {'image_url': face_path, **face_data}
+        else:
+            # 编码为base64
+            with timer.stage('encode'):
+                buffer = encode_face_crop(face_img, crop_format)
+                face_base64 = base64.b64encode(buffer).decode('utf-8')
+            face_data = {'image_base64': face_base64, **face_data}
+        
+        faces_data.append(face_data)
+    
+    return faces_data
+
+
+def _write_packed(crops, pack, crop_format, faces, output_dir, shm_writer, timer):
+    """
+    打包所有裁剪图并按输出方式写出：共享内存段 / output_dir 下的文件 / Base64
+    sprite 模式把各裁剪图在拼图中的位置写回对应人脸的 sprite_offset
+    """
+    import numpy as np
+    
+    with timer.stage('encode'):
+        data, info, offsets = pack_face_crops(crops, pack, crop_format)
+    if offsets is not None:
+        for face in faces:
+            face['sprite_offset'] = offsets[face['pack_index']]
+
+    # sprite 是图片，沿用 image_* 字段；array 是原始数组字节，使用 data_* 字段
+    kind = 'image' if pack == 'sprite' else 'data'
+    with timer.stage('write'):
+        if shm_writer is not None:
+            info[f'{kind}_shm'] = shm_writer.append(data)
+        elif output_dir:
+            os.makedirs(output_dir, exist_ok=True)
+            if pack == 'sprite':
+                path = os.path.join(output_dir, f'faces_sprite{CROP_FORMATS[crop_format][0]}')
+                with open(path, 'wb') as f:
+                    f.write(data)
+                info['image_url'] = path
+            else:
+                path = os.path.join(output_dir, 'faces.npy')
+                np.save(path, data)
+                info['data_path'] = path
+        else:
+            info[f'{kind}_base64'] = base64.b64encode(data).decode('utf-8')
+    return info
+
+
+def extract_faces(image_paths, output_dir=None, min_face_size=80, confidence_threshold=0.7, timer=None,
+                  crop_size=None, crop_margin=0.1, crop_format='png', pack=None):
+    """
+    从上传的照片中提取人脸区域
+    
+    Args:
+        image_paths: 图片路径、URL、Base64数据或共享内存引用（shm://...）列表
+        output_dir: 输出目录(可选)，为 'shm://' 时所有裁剪图写入同一个共享内存段
+        min_face_size: 最小人脸尺寸(像素)
+        confidence_threshold: 置信度阈值
+        timer: 阶段计时器（可选）
+        crop_size: 统一裁剪尺寸（可选），所有裁剪图缩放为 crop_size x crop_size 的正方形
+        crop_margin: 统一裁剪时人脸框每侧的边距比例（默认 0.1）
+        crop_format: 裁剪图编码格式 png（默认）/ jpeg
+        pack: 打包方式（需指定 crop_size）: array（所有裁剪图合成一个 RGB 数组）/ sprite（一张拼图 + 各自偏移）
+        
+    Returns:
+        dict: {success: bool, faces: list, message: str}，打包时另有 packed 字段
+    """
+    import cv2
+    import numpy as np
+    from face_detection import load_face_cascade
+    
+    timer = timer or StageTimer()
+    if crop_format not in CROP_FORMATS:
+        return {'success': False, 'faces': [], 'message': f'不支持的裁剪图格式: {crop_format}'}
+    if pack is not None and (pack not in PACK_MODES or not crop_size):
+        return {'success': False, 'faces': [], 'message': f'不支持的打包方式: {pack}（打包需要同时指定 crop_size）'}
+    
+    shm_writer = None
+    try:
+        all_faces = []
+        packed = [] if pack else None
+        
+        # 加载人脸检测模型（进程内缓存）
+        with timer.stage('load_model'):
+            face_cascade = load_face_cascade(verbose=True)
         
         if face_cascade is None or face_cascade.empty():
             return {
@@ -108,19 +335,32 @@ def extract_faces(image_paths, output_dir=None, min_face_size=80, confidence_thr
                 'message': '无法加载人脸检测模型，请确保OpenCV已正确安装'
             }
         
+        if is_shm_output(output_dir):
+            shm_writer = ShmWriter()
+        
         # 处理每张图片
         for idx, image_path in enumerate(image_paths):
             img = None
             
             # 判断输入类型
-            if image_path.startswith('data:image/'):
+            if is_shm_ref(image_path):
+                # 共享内存引用：直接从映射视图解码，不经过Base64
+                try:
+                    with timer.stage('decode'), shm_view(image_path) as data:
+                        img = cv2.imdecode(data, cv2.IMREAD_COLOR)
+                    print(f'图片{idx + 1}: 从共享内存加载成功', file=sys.stderr)
+                except Exception as e:
+                    print(f'图片{idx + 1}: 共享内存读取失败: {str(e)}', file=sys.stderr)
+                    continue
+            elif image_path.startswith('data:image/'):
                 # Base64 数据URI格式
                 try:
                     # 提取base64数据
                     base64_data = image_path.split(',')[1] if ',' in image_path else image_path
-                    img_bytes = base64.b64decode(base64_data)
-                    nparr = np.frombuffer(img_bytes, np.uint8)
-                    img = cv2.imdecode(nparr, cv2.IMREAD_COLOR)
+                    with timer.stage('decode'):
+                        img_bytes = base64.b64decode(base64_data)
+                        nparr = np.frombuffer(img_bytes, np.uint8)
+                        img = cv2.imdecode(nparr, cv2.IMREAD_COLOR)
                     print(f'图片{idx + 1}: 从Base64加载成功', file=sys.stderr)
                 except Exception as e:
                     print(f'图片{idx + 1}: Base64解码失败: {str(e)}', file=sys.stderr)
@@ -128,7 +368,7 @@ def extract_faces(image_paths, output_dir=None, min_face_size=80, confidence_thr
             elif image_path.startswith('http://') or image_path.startswith('https://'):
                 # 从URL下载图片
                 try:
-                    img = download_image_from_url(image_path)
+                    img = download_image_from_url(image_path, timer)
                     print(f'图片{idx + 1}: 从URL下载成功', file=sys.stderr)
                 except Exception as e:
                     print(f'图片{idx + 1}: URL下载失败: {str(e)}', file=sys.stderr)
@@ -136,7 +376,8 @@ def extract_faces(image_paths, output_dir=None, min_face_size=80, confidence_thr
             else:
                 # 读取本地图片
                 try:
-                    img = cv2.imread(image_path)
+                    with timer.stage('decode'):
+                        img = cv2.imread(image_path)
                     if img is not None:
                         print(f'图片{idx + 1}: 从本地文件加载成功', file=sys.stderr)
                 except Exception as e:
@@ -147,81 +388,28 @@ def extract_faces(image_paths, output_dir=None, min_face_size=80, confidence_thr
                 print(f'图片{idx + 1}: 无法加载图片', file=sys.stderr)
                 continue
             
-            # 转换为灰度图
-            gray = cv2.cvtColor(img, cv2.COLOR_BGR2GRAY)
-            
-            # 检测人脸 (使用更宽松的参数)
-            faces = face_cascade.detectMultiScale(
-                gray,
-                scaleFactor=1.05,
-                minNeighbors=3,
-                minSize=(min_face_size, min_face_size)
-            )
-            
-            # 提取每个人脸
-            for face_idx, (x, y, w, h) in enumerate(faces):
-                # 计算清晰度
-                face_roi = gray[y:y+h, x:x+w]
-                laplacian_var = cv2.Laplacian(face_roi, cv2.CV_64F).var()
-                confidence = min(laplacian_var / 500.0, 1.0)
-                
-                if confidence < confidence_threshold:
-                    continue
-                
-                # 扩展边界(增加10%边距)
-                margin = int(w * 0.1)
-                x1 = max(0, x - margin)
-                y1 = max(0, y - margin)
-                x2 = min(img.shape[1], x + w + margin)
-                y2 = min(img.shape[0], y + h + margin)
-                
-                # 提取人脸区域
-                face_img = img[y1:y2, x1:x2]
-                
-                # 保存或编码人脸图片
-                if output_dir:
-                    # 保存到文件
-                    os.makedirs(output_dir, exist_ok=True)
-                    face_filename = f"face_{idx}_{face_idx}.png"
-                    face_path = os.path.join(output_dir, face_filename)
-                    cv2.imwrite(face_path, face_img)
-                    
-                    face_data = {
-                        'image_url': face_path,
-                        'bbox': {
-                            'x': int(x),
-                            'y': int(y),
-                            'width': int(w),
-                            'height': int(h)
-                        },
-                        'confidence': round(float(confidence), 3),
-                        'source_image': image_path
-                    }
-                else:
-                    # 编码为base64
-                    _, buffer = cv2.imencode('.png', face_img)
-                    face_base64 = base64.b64encode(buffer).decode('utf-8')
-                    
-                    face_data = {
-                        'image_base64': face_base64,
-                        'bbox': {
-                            'x': int(x),
-                            'y': int(y),
-                            'width': int(w),
-                            'height': int(h)
-                        },
-                        'confidence': round(float(confidence), 3),
-                        'source_image': image_path
-                    }
-                
-                all_faces.append(face_data)
+            all_faces.extend(extract_faces_from_image(
+                img, image_path, idx, output_dir, min_face_size, confidence_threshold, timer,
+                shm_writer=shm_writer, crop_size=crop_size, crop_margin=crop_margin,
+                crop_format=crop_format, packed=packed
+            ))
+        
+        packed_info = None
+        if packed:
+            packed_info = _write_packed(packed, pack, crop_format, all_faces, output_dir, shm_writer, timer)
+        
+        if shm_writer is not None:
+            shm_writer.close()
         
         if len(all_faces) > 0:
-            return {
+            result = {
                 'success': True,
                 'faces': all_faces,
                 'message': f'成功提取 {len(all_faces)} 张人脸'
             }
+            if packed_info is not None:
+                result['packed'] = packed_info
+            return result
         else:
             return {
                 'success': False,
@@ -230,6 +418,8 @@ def extract_faces(image_paths, output_dir=None, min_face_size=80, confidence_thr
             }
     
     except Exception as e:
+        if shm_writer is not None:
+            shm_writer.discard()
         return {
             'success': False,
             'faces': [],
@@ -244,9 +434,19 @@ def main():
         "image_paths": ["...", "..."],
         "output_dir": "...",
         "min_face_size": 80,
-        "confidence_threshold": 0.7
+        "confidence_threshold": 0.7,
+        "crop_size": 256,
+        "crop_margin": 0.1,
+        "crop_format": "png",
+        "pack": "sprite"
     }
+    crop_size / crop_margin / crop_format / pack 可选：统一尺寸裁剪与打包输出（见 extract_faces）
+    输出结果附带 timings 字段（各阶段耗时，毫秒）
+    可选参数 _profile / _request_id 开启按需剖析（见 profiling.py）
+    image_paths 可包含共享内存引用 shm://...，output_dir 为 shm:// 时裁剪图写入共享内存段（见 shm_io.py）
     """
+    cancellation.install()
+    timer = StageTimer()
     try:
         # 从命令行参数读取JSON
         if len(sys.argv) > 1:
@@ -259,6 +459,12 @@ def main():
         output_dir = params.get('output_dir')
         min_face_size = params.get('min_face_size', 80)
         confidence_threshold = params.get('confidence_threshold', 0.7)
+        crop_options = {
+            'crop_size': params.get('crop_size'),
+            'crop_margin': params.get('crop_margin', 0.1),
+            'crop_format': params.get('crop_format', 'png'),
+            'pack': params.get('pack')
+        }
         
         if not image_paths:
             result = {
@@ -267,16 +473,18 @@ def main():
                 'message': '缺少必需参数: image_paths'
             }
         else:
-            result = extract_faces(image_paths, output_dir, min_face_size, confidence_threshold)
+            result = run_profiled('extract_faces', params, extract_faces, image_paths, output_dir, min_face_size, confidence_threshold, timer, **crop_options)
         
         # 输出JSON结果
+        result['timings'] = timer.as_dict()
         print(json.dumps(result, ensure_ascii=False))
         
     except Exception as e:
         result = {
             'success': False,
             'faces': [],
-            'message': f'脚本执行失败: {str(e)}'
+            'message': f'脚本执行失败: {str(e)}',
+            'timings': timer.as_dict()
         }
         print(json.dumps(result, ensure_ascii=False))
         sys.exit(1)
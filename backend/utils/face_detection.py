@@ -0,0 +1,272 @@
+#!/usr/bin/env python3
+"""
+人脸检测公共模块
+check_face / extract_faces / process_upload 共用的模型加载与检测（质量评分见 face_quality.py）
+
+大图分块并行检测:
+    图片像素数超过 FACE_TILE_MIN_PIXELS 时，按网格切成带重叠的分块，
+    用进程内持久的线程池并行检测（OpenCV 检测期间释放 GIL），再用非极大值抑制合并；
+    工作线程创建时加载各自的分类器，之后的检测复用，每个线程在进程内只加载一次模型。
+    分块间重叠 overlap 像素，分块内只检测边长 <= overlap 的人脸，保证每张这样的人脸
+    至少完整落在一个分块中；更大的人脸在整图上从 overlap 尺度起检测（开销很小）。
+    环境变量 FACE_DETECT_TILED: auto（默认，按像素数判断）/ 1（总是分块）/ 0（关闭）
+"""
+
+import os
+import sys
+import threading
+from concurrent.futures import ThreadPoolExecutor
+import cv2
+import numpy as np
+
+
+# 候选模型路径，按优先级排列
+def _cascade_paths():
+    paths = []
+
+    # 优先使用 cv2.data.haarcascades（适用于大多数安装）
+    if hasattr(cv2, 'data') and hasattr(cv2.data, 'haarcascades'):
+        paths.append(cv2.data.haarcascades + 'haarcascade_frontalface_default.xml')
+
+    # 其他可能的路径
+    paths.extend([
+        'haarcascade_frontalface_default.xml',  # 当前目录
+        '/usr/share/opencv4/haarcascades/haarcascade_frontalface_default.xml',  # Alpine Linux
+        '/usr/local/share/opencv4/haarcascades/haarcascade_frontalface_default.xml',  # 其他Linux
+        'C:\\ProgramData\\Miniconda3\\lib\\site-packages\\cv2\\data\\haarcascade_frontalface_default.xml',  # Windows Miniconda
+    ])
+    return paths
+
+
+_face_cascade = None
+_face_cascade_path = None
+_thread_local = threading.local()
+# 持久线程池: (用途, 线程数) -> ThreadPoolExecutor
+_worker_pools = {}
+_worker_pools_lock = threading.Lock()
+
+FACE_DETECT_TILED = os.environ.get('FACE_DETECT_TILED', 'auto').lower()
+FACE_TILE_MIN_PIXELS = int(os.environ.get('FACE_TILE_MIN_PIXELS', 4000000))
+FACE_TILE_WORKERS = int(os.environ.get('FACE_TILE_WORKERS', 0)) or min(os.cpu_count() or 1, 8)
+
+
+def load_face_cascade(verbose=False):
+    """
+    加载人脸检测模型，进程内只加载一次
+
+    Args:
+        verbose: 是否向 stderr 输出加载过程
+
+    Returns:
+        cv2.CascadeClassifier 或 None（所有路径都加载失败）
+    """
+    global _face_cascade, _face_cascade_path
+    if _face_cascade is not None:
+        return _face_cascade
+
+    for cascade_path in _cascade_paths():
+        try:
+            if verbose:
+                print(f'尝试加载模型: {cascade_path}', file=sys.stderr)
+            cascade = cv2.CascadeClassifier(cascade_path)
+            if not cascade.empty():
+                _face_cascade = cascade
+                _face_cascade_path = cascade_path
+                if verbose:
+                    print(f'成功加载模型: {cascade_path}', file=sys.stderr)
+                break
+        except Exception as e:
+            if verbose:
+                print(f'加载模型失败 ({cascade_path}): {str(e)}', file=sys.stderr)
+            continue
+
+    return _face_cascade
+
+
+def _thread_cascade():
+    """
+    当前线程专用的分类器：CascadeClassifier 检测时会修改内部状态，不能跨线程共享，
+    每个工作线程首次使用时从同一模型文件加载一份；主线程直接使用 load_face_cascade 加载的分类器
+    """
+    cascade = getattr(_thread_local, 'cascade', None)
+    if cascade is None:
+        if threading.current_thread() is threading.main_thread() and _face_cascade is not None:
+            cascade = _face_cascade
+        else:
+            cascade = cv2.CascadeClassifier(_face_cascade_path)
+        _thread_local.cascade = cascade
+    return cascade
+
+
+def worker_pool(purpose, max_workers):
+    """
+    进程内持久的线程池（按用途和线程数区分），工作线程创建时加载各自的分类器，
+    之后的调用复用同一批线程和分类器；调用前需已成功 load_face_cascade()
+    不同用途使用不同的线程池，池内任务不能再向同一个池提交并等待（会互相阻塞）
+    """
+    key = (purpose, max_workers)
+    with _worker_pools_lock:
+        pool = _worker_pools.get(key)
+        if pool is None:
+            pool = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix=f'face-{purpose}',
+                                      initializer=_thread_cascade)
+            _worker_pools[key] = pool
+    return pool
+
+
+def thread_face_cascade():
+    """
+    当前线程专用的分类器，供多张图片并行检测使用；
+    模型文件只按 load_face_cascade 的查找结果解析一次，模型不可用时返回 None
+    """
+    if _face_cascade_path is None and load_face_cascade() is None:
+        return None
+    return _thread_cascade()
+
+
+def _should_tile(gray, min_face_size, tiled):
+    if tiled is None:
+        if FACE_DETECT_TILED in ('0', 'false', 'off'):
+            return False
+        # 自动模式下单核机器分块没有收益
+        tiled = FACE_DETECT_TILED in ('1', 'true', 'on') or (
+            FACE_TILE_WORKERS > 1 and gray.size >= FACE_TILE_MIN_PIXELS)
+    # 图片太小、切不出至少两块时没有意义
+    return bool(tiled) and _face_cascade_path is not None and max(gray.shape) >= 4 * _tile_overlap(min_face_size)
+
+
+def detect_faces(face_cascade, gray, min_face_size, scale_factor=1.1, min_neighbors=5, tiled=None):
+    """
+    在灰度图上检测人脸
+
+    Args:
+        tiled: 是否分块并行检测；None 时按 FACE_DETECT_TILED / 图片大小自动判断
+
+    Returns:
+        人脸框序列 [(x, y, w, h), ...]
+    """
+    if _should_tile(gray, min_face_size, tiled):
+        return detect_faces_tiled(gray, min_face_size, scale_factor, min_neighbors)
+    return face_cascade.detectMultiScale(
+        gray,
+        scaleFactor=scale_factor,
+        minNeighbors=min_neighbors,
+        minSize=(min_face_size, min_face_size)
+    )
+
+
+def _tile_overlap(min_face_size):
+    """分块重叠宽度，也是分块内可检测的最大人脸边长"""
+    return max(4 * min_face_size, 256)
+
+
+def _tile_grid(length, overlap, parts):
+    """把一条边切成 parts 段（每段至少 2*overlap），返回各分块的 (起点, 终点)"""
+    core = max(-(-length // parts), 2 * overlap)
+    starts = range(0, max(length - overlap, 1), core)
+    return [(start, min(start + core + overlap, length)) for start in starts]
+
+
+def _detect_in_tile(gray, x0, y0, x1, y1, min_face_size, max_face_size, scale_factor, min_neighbors):
+    faces, neighbors = _thread_cascade().detectMultiScale2(
+        gray[y0:y1, x0:x1],
+        scaleFactor=scale_factor,
+        minNeighbors=min_neighbors,
+        minSize=(min_face_size, min_face_size),
+        maxSize=(max_face_size, max_face_size)
+    )
+    if len(faces) == 0:
+        return np.empty((0, 4), np.int32), np.empty(0)
+    faces = np.asarray(faces, np.int32)
+    faces[:, 0] += x0
+    faces[:, 1] += y0
+    return faces, np.asarray(neighbors, np.float64).ravel()
+
+
+def _detect_large(gray, overlap, scale_factor, min_neighbors):
+    """
+    在整图上检测边长 >= overlap 的人脸；检测金字塔从 overlap 尺度开始，
+    缩放后的图很小，耗时远低于整图全尺度检测
+    """
+    faces, neighbors = _thread_cascade().detectMultiScale2(
+        gray,
+        scaleFactor=scale_factor,
+        minNeighbors=min_neighbors,
+        minSize=(overlap, overlap)
+    )
+    if len(faces) == 0:
+        return np.empty((0, 4), np.int32), np.empty(0)
+    return np.asarray(faces, np.int32), np.asarray(neighbors, np.float64).ravel()
+
+
+def non_max_suppression(boxes, scores, iou_threshold=0.3, containment_threshold=0.6):
+    """
+    合并重叠的人脸框：按得分从高到低保留，与已保留框 IoU 超过阈值、
+    或大部分面积被已保留框包含（分块边缘截断的半张脸）的框被抑制
+
+    Args:
+        boxes: (N, 4) 数组 [x, y, w, h]
+        scores: (N,) 得分（检测邻居数）
+
+    Returns:
+        保留框的下标数组
+    """
+    if len(boxes) == 0:
+        return np.empty(0, np.int64)
+    boxes = np.asarray(boxes, np.float64)
+    x1, y1 = boxes[:, 0], boxes[:, 1]
+    x2, y2 = x1 + boxes[:, 2], y1 + boxes[:, 3]
+    areas = boxes[:, 2] * boxes[:, 3]
+    # 得分相同时优先保留大框，避免截断的半张脸先占位
+    order = np.lexsort((-areas, -np.asarray(scores, np.float64)))
+
+    keep = []
+    while order.size:
+        i = order[0]
+        keep.append(i)
+        rest = order[1:]
+        inter = (np.clip(np.minimum(x2[i], x2[rest]) - np.maximum(x1[i], x1[rest]), 0, None)
+                 * np.clip(np.minimum(y2[i], y2[rest]) - np.maximum(y1[i], y1[rest]), 0, None))
+        iou = inter / (areas[i] + areas[rest] - inter)
+        contained = inter / np.minimum(areas[i], areas[rest])
+        order = rest[(iou <= iou_threshold) & (contained <= containment_threshold)]
+    return np.asarray(keep, np.int64)
+
+
+def detect_faces_tiled(gray, min_face_size, scale_factor=1.1, min_neighbors=5, max_workers=None):
+    """
+    分块并行检测人脸，结果与整图检测在容差范围内一致
+
+    Args:
+        gray: 灰度图
+        min_face_size: 最小人脸尺寸（像素）
+        max_workers: 线程数（默认 FACE_TILE_WORKERS），同时决定分块数
+
+    Returns:
+        人脸框数组 (N, 4) [x, y, w, h]，按从上到下、从左到右排序
+    """
+    if _face_cascade_path is None and load_face_cascade() is None:
+        raise Exception('无法加载人脸检测模型')
+
+    workers = max_workers or FACE_TILE_WORKERS
+    height, width = gray.shape[:2]
+    overlap = _tile_overlap(min_face_size)
+
+    # 网格行列数尽量让分块数接近线程数
+    cols = max(1, round((workers * width / height) ** 0.5))
+    rows = max(1, -(-workers // cols))
+    tiles = [(x0, y0, x1, y1)
+             for y0, y1 in _tile_grid(height, overlap, rows)
+             for x0, x1 in _tile_grid(width, overlap, cols)]
+
+    pool = worker_pool('tile', workers)
+    futures = [pool.submit(_detect_in_tile, gray, x0, y0, x1, y1,
+                           min_face_size, overlap, scale_factor, min_neighbors)
+               for x0, y0, x1, y1 in tiles]
+    futures.append(pool.submit(_detect_large, gray, overlap, scale_factor, min_neighbors))
+    parts = [future.result() for future in futures]
+
+    boxes = np.concatenate([faces for faces, _ in parts])
+    scores = np.concatenate([neighbors for _, neighbors in parts])
+    merged = boxes[non_max_suppression(boxes, scores)]
+    return merged[np.lexsort((merged[:, 0], merged[:, 1]))] if len(merged) else merged
@@ -0,0 +1,89 @@
+#!/usr/bin/env python3
+"""
+人脸质量评分模块
+check_face / extract_faces 共用的人脸置信度计算，替代原先只看全分辨率拉普拉斯方差的做法
+
+每张人脸先缩放到 ROI_SIZE x ROI_SIZE 的 uint8 小图，叠成 (N, S, S) 数组，
+再一次性向量化计算所有人脸的:
+    sharpness  清晰度：4 邻域拉普拉斯响应的方差（尺寸归一化后不同大小的人脸可比）
+    exposure   曝光：平均亮度偏离中灰的程度，并扣除过暗/过曝像素比例
+    contrast   对比度：亮度标准差
+    size       相对尺寸：人脸边长占图片短边的比例
+综合分 confidence 为四项的加权几何平均，任一项很差都会显著拉低总分
+"""
+
+import cv2
+import numpy as np
+
+
+ROI_SIZE = 64
+
+# 各项归一化基准：达到基准即记满分 1.0
+SHARPNESS_NORM = 400.0   # 64x64 ROI 上的拉普拉斯方差
+CONTRAST_NORM = 48.0     # 亮度标准差
+SIZE_NORM = 0.1          # 人脸边长 / 图片短边
+CLIP_LOW, CLIP_HIGH = 8, 247
+
+# 加权几何平均的权重（和为 1）
+WEIGHTS = {
+    'sharpness': 0.6,
+    'exposure': 0.15,
+    'contrast': 0.15,
+    'size': 0.1,
+}
+
+_EPS = 1e-6
+
+
+def _roi_stack(gray, faces):
+    """把所有人脸区域缩放到统一尺寸，返回 (N, S, S) float32 数组"""
+    stack = np.empty((len(faces), ROI_SIZE, ROI_SIZE), np.uint8)
+    for i, (x, y, w, h) in enumerate(faces):
+        stack[i] = cv2.resize(gray[y:y+h, x:x+w], (ROI_SIZE, ROI_SIZE), interpolation=cv2.INTER_AREA)
+    return stack.astype(np.float32)
+
+
+def score_faces(gray, faces):
+    """
+    对一张图片中的所有人脸批量评分
+
+    Args:
+        gray: 灰度图
+        faces: 人脸框序列 [(x, y, w, h), ...]
+
+    Returns:
+        dict: {confidence, sharpness, exposure, contrast, size}，每项为长度 N 的 float 数组（0-1）
+    """
+    if len(faces) == 0:
+        empty = np.empty(0, np.float64)
+        return {key: empty for key in ('confidence', *WEIGHTS)}
+
+    stack = _roi_stack(gray, faces)
+
+    # 4 邻域拉普拉斯（与 cv2.Laplacian ksize=1 相同的卷积核），只在内部像素上计算
+    lap = (stack[:, :-2, 1:-1] + stack[:, 2:, 1:-1] + stack[:, 1:-1, :-2] + stack[:, 1:-1, 2:]
+           - 4 * stack[:, 1:-1, 1:-1])
+    sharpness = np.minimum(lap.var(axis=(1, 2)) / SHARPNESS_NORM, 1.0)
+
+    mean = stack.mean(axis=(1, 2))
+    clipped = ((stack < CLIP_LOW) | (stack > CLIP_HIGH)).mean(axis=(1, 2))
+    exposure = (1.0 - ((mean - 127.5) / 127.5) ** 2) * (1.0 - clipped)
+
+    contrast = np.minimum(stack.std(axis=(1, 2)) / CONTRAST_NORM, 1.0)
+
+    sides = np.asarray(faces, np.float64)[:, 2:4].min(axis=1)
+    size = np.minimum(sides / min(gray.shape[:2]) / SIZE_NORM, 1.0)
+
+    components = {
+        'sharpness': sharpness.astype(np.float64),
+        'exposure': np.clip(exposure, 0.0, 1.0).astype(np.float64),
+        'contrast': contrast.astype(np.float64),
+        'size': size,
+    }
+    log_score = sum(weight * np.log(np.maximum(components[key], _EPS)) for key, weight in WEIGHTS.items())
+    return {'confidence': np.exp(log_score), **components}
+
+
+def quality_breakdown(scores, index):
+    """取出第 index 张人脸的各项得分（保留三位小数），用于写入 JSON 结果"""
+    return {key: round(float(scores[key][index]), 3) for key in WEIGHTS}
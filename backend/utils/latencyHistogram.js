@@ -0,0 +1,99 @@
+/**
+ * 延迟直方图工具模块
+ *
+ * 以固定的对数间隔桶记录耗时样本，内存占用恒定，
+ * 用于在真实负载下汇总 Python 脚本各阶段的耗时分布
+ *
+ * 功能特性:
+ * - 固定桶边界（毫秒），记录为 O(桶数)
+ * - 桶内线性插值估算 p50/p90/p99
+ * - 记录 count/sum/min/max
+ */
+
+// 桶上边界（毫秒），最后一个桶收纳所有更大的样本
+const DEFAULT_BUCKETS = [1, 2, 5, 10, 20, 50, 100, 200, 500, 1000, 2000, 5000, 10000, 30000, 60000, Infinity];
+
+class LatencyHistogram {
+  /**
+   * @param {number[]} buckets - 递增的桶上边界（毫秒）
+   */
+  constructor(buckets = DEFAULT_BUCKETS) {
+    this.buckets = buckets;
+    this.reset();
+  }
+
+  reset() {
+    this.counts = new Array(this.buckets.length).fill(0);
+    this.count = 0;
+    this.sum = 0;
+    this.min = Infinity;
+    this.max = 0;
+  }
+
+  /**
+   * 记录一个耗时样本
+   * @param {number} ms - 耗时（毫秒），非法值忽略
+   */
+  record(ms) {
+    if (typeof ms !== 'number' || !Number.isFinite(ms) || ms < 0) {
+      return;
+    }
+    let idx = 0;
+    while (ms > this.buckets[idx]) {
+      idx++;
+    }
+    this.counts[idx]++;
+    this.count++;
+    this.sum += ms;
+    if (ms < this.min) this.min = ms;
+    if (ms > this.max) this.max = ms;
+  }
+
+  /**
+   * 估算分位数：定位样本所在桶后在桶内线性插值，结果限制在 [min, max]
+   * @param {number} p - 分位（0-100）
+   * @returns {number|null} 估算值（毫秒），无样本时为 null
+   */
+  percentile(p) {
+    if (this.count === 0) {
+      return null;
+    }
+    const rank = (p / 100) * this.count;
+    let seen = 0;
+    for (let i = 0; i < this.counts.length; i++) {
+      if (this.counts[i] === 0) continue;
+      if (seen + this.counts[i] >= rank) {
+        const lower = i === 0 ? 0 : this.buckets[i - 1];
+        const upper = Number.isFinite(this.buckets[i]) ? this.buckets[i] : this.max;
+        const estimate = lower + (upper - lower) * ((rank - seen) / this.counts[i]);
+        return Math.min(Math.max(estimate, this.min), this.max);
+      }
+      seen += this.counts[i];
+    }
+    return this.max;
+  }
+
+  toJSON() {
+    const round = (value) => (value === null ? null : Math.round(value * 100) / 100);
+    return {
+      count: this.count,
+      mean: this.count ? round(this.sum / this.count) : null,
+      min: this.count ? round(this.min) : null,
+      max: this.count ? round(this.max) : null,
+      p50: round(this.percentile(50)),
+      p90: round(this.percentile(90)),
+      p99: round(this.percentile(99)),
+      buckets: this.buckets.reduce((acc, bound, i) => {
+        if (this.counts[i] > 0) {
+          acc[Number.isFinite(bound) ? `le_${bound}` : 'le_inf'] = this.counts[i];
+        }
+        return acc;
+      }, {})
+    };
+  }
+}
+
+module.exports = {
+  DEFAULT_BUCKETS,
+  LatencyHistogram
+};
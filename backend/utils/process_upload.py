@@ -0,0 +1,307 @@
+#!/usr/bin/env python3
+"""
+上传图片组合处理脚本
+一次进程调用内完成人脸校验、人脸提取、压缩、加水印，图片只读取和解码一次，
+各阶段共享解码结果（BGR / 灰度 / PIL 视图按需生成并缓存）
+"""
+
+import sys
+import os
+import io
+import json
+import base64
+from contextlib import nullcontext
+import cancellation
+from stage_timer import StageTimer
+from profiling import run_profiled
+from check_face import check_face_image
+from extract_faces import extract_faces_from_image
+from compress_image import compress_pil_image, normalize_pil_mode
+from add_watermark import apply_watermark
+from shm_io import SHM_OUTPUT, ShmWriter, is_shm_ref, is_shm_output, open_shm_file, shm_view, write_output
+
+
+STAGES = ('check_face', 'extract_faces', 'compress', 'watermark')
+DEFAULT_STAGES = ['check_face', 'extract_faces', 'compress']
+
+
+class DecodedImage:
+    """
+    一次解码、多处复用的图片
+    bgr 为 OpenCV 解码结果（人脸阶段使用），gray 在首次访问时由 bgr 派生并缓存；
+    pil 在首次访问时由 Pillow 从原始字节解码：OpenCV 的 IMREAD_COLOR 会丢弃 PNG 透明度并按 EXIF 旋转，
+    压缩 / 水印阶段需要与单独的 compress_image.py / add_watermark.py 一样保留透明度、不旋转
+    """
+
+    def __init__(self, bgr, timer, open_source):
+        self.bgr = bgr
+        self._timer = timer
+        self._open_source = open_source  # 返回原始字节文件对象的上下文管理器
+        self._gray = None
+        self._pil = None
+
+    @property
+    def gray(self):
+        import cv2
+
+        if self._gray is None:
+            with self._timer.stage('decode'):
+                self._gray = cv2.cvtColor(self.bgr, cv2.COLOR_BGR2GRAY)
+        return self._gray
+
+    @property
+    def pil(self):
+        from PIL import Image
+
+        if self._pil is None:
+            with self._timer.stage('decode'), self._open_source() as fp:
+                img = Image.open(fp)
+                img.load()
+                self._pil = normalize_pil_mode(img)
+        return self._pil
+
+
+def read_image_bytes(image_path, timer):
+    """
+    读取图片原始字节，支持本地路径、http(s) URL 与 Base64 数据URI
+    （共享内存引用不经过这里，由 process_upload 直接映射解码）
+    """
+    if image_path.startswith('data:image/'):
+        base64_data = image_path.split(',')[1] if ',' in image_path else image_path
+        with timer.stage('decode'):
+            return base64.b64decode(base64_data)
+    if image_path.startswith('http://') or image_path.startswith('https://'):
+        import requests
+
+        with timer.stage('download'):
+            response = requests.get(image_path.strip(), timeout=30)
+            response.raise_for_status()
+            return response.content
+    with timer.stage('download'):
+        with open(image_path, 'rb') as f:
+            return f.read()
+
+
+def _output_path(image_path, suffix):
+    """未指定输出路径时：本地文件放在原图旁边，共享内存输入写回共享内存，其他来源放到临时目录"""
+    if is_shm_ref(image_path):
+        return SHM_OUTPUT
+    if os.path.isfile(image_path):
+        base, _ = os.path.splitext(image_path)
+        return f"{base}_{suffix}"
+    # 进程被取消时由 cancellation 删除未交付的输出
+    return cancellation.scratch_file(f'_{suffix}')
+
+
+def process_upload(image_path, stages=None, options=None, stop_on_fail=True, timer=None):
+    """
+    对一张上传图片按顺序执行多个处理阶段
+
+    Args:
+        image_path: 图片路径、URL、Base64数据URI或共享内存引用（shm://...）
+        stages: 阶段列表，可选 check_face / extract_faces / compress / watermark
+        options: 各阶段参数 {stage: {...}}，与单独脚本的参数同名
+        stop_on_fail: check_face 未通过时是否跳过后续阶段
+        timer: 阶段计时器（可选）
+
+    Returns:
+        dict: {success: bool, stages: {stage: result}, completed: list, skipped: list, message: str}
+              某个阶段抛出异常时 stages / completed 为已完成阶段的结果（其中的共享内存段由调用方释放），
+              并附带 failed_stage
+    """
+    import cv2
+    import numpy as np
+
+    timer = timer or StageTimer()
+    stages = list(stages or DEFAULT_STAGES)
+    options = options or {}
+
+    unknown = [stage for stage in stages if stage not in STAGES]
+    if unknown:
+        return {
+            'success': False,
+            'stages': {},
+            'message': f'不支持的处理阶段: {", ".join(unknown)}'
+        }
+
+    results = {}
+    completed = []
+    stage = None
+    try:
+        if is_shm_ref(image_path):
+            with timer.stage('decode'), shm_view(image_path) as data:
+                bgr = cv2.imdecode(data, cv2.IMREAD_COLOR)
+            # 输入段在整个调用期间有效，PIL 视图需要时重新映射
+            open_source = lambda: open_shm_file(image_path)
+        else:
+            data = read_image_bytes(image_path, timer)
+            with timer.stage('decode'):
+                bgr = cv2.imdecode(np.frombuffer(data, np.uint8), cv2.IMREAD_COLOR)
+            open_source = lambda: nullcontext(io.BytesIO(data))
+        if bgr is None:
+            return {
+                'success': False,
+                'stages': {},
+                'message': '无法读取图片文件'
+            }
+        image = DecodedImage(bgr, timer, open_source)
+        # Base64 输入不回写到结果里，避免输出体积翻倍
+        if image_path.startswith('data:image/'):
+            source_image = 'base64'
+        elif is_shm_ref(image_path):
+            source_image = 'shm'
+        else:
+            source_image = image_path
+
+        skipped = []
+        success = True
+
+        for stage in stages:
+            if not success and stop_on_fail:
+                skipped.append(stage)
+                continue
+
+            opts = options.get(stage, {})
+            if stage == 'check_face':
+                result = check_face_image(
+                    image.bgr,
+                    opts.get('min_face_size', 80),
+                    opts.get('confidence_threshold', 0.7),
+                    timer,
+                    gray=image.gray,
+                    gate=opts.get('gate', False)
+                )
+            elif stage == 'extract_faces':
+                output_dir = opts.get('output_dir')
+                with (ShmWriter() if is_shm_output(output_dir) else nullcontext()) as shm_writer:
+                    faces = extract_faces_from_image(
+                        image.bgr, source_image, 0,
+                        output_dir,
+                        opts.get('min_face_size', 80),
+                        opts.get('confidence_threshold', 0.7),
+                        timer,
+                        gray=image.gray,
+                        shm_writer=shm_writer,
+                        crop_size=opts.get('crop_size'),
+                        crop_margin=opts.get('crop_margin', 0.1),
+                        crop_format=opts.get('crop_format', 'png')
+                    )
+                result = {
+                    'success': len(faces) > 0,
+                    'faces': faces,
+                    'message': f'成功提取 {len(faces)} 张人脸' if faces else '未检测到清晰的人脸'
+                }
+            elif stage == 'compress':
+                result = compress_pil_image(
+                    image.pil,
+                    opts.get('output_path') or _output_path(image_path, 'compressed.png'),
+                    opts.get('max_size_mb', 2),
+                    timer
+                )
+            else:
+                output_path = opts.get('output_path') or _output_path(image_path, 'watermarked.jpg')
+                watermarked = apply_watermark(
+                    image.pil,
+                    opts.get('watermark_text', 'AI全家福制作\n扫码去水印'),
+                    opts.get('qr_url', 'https://your-domain.com/pay'),
+                    opts.get('position', 'center'),
+                    timer
+                )
+                with timer.stage('encode'):
+                    buffer = io.BytesIO()
+                    watermarked.save(buffer, 'JPEG', quality=95)
+                with timer.stage('write'):
+                    output = write_output(output_path, buffer.getbuffer())
+                result = {
+                    'success': True,
+                    **output,
+                    'message': '水印添加成功'
+                }
+
+            results[stage] = result
+            completed.append(stage)
+            if not result.get('success'):
+                success = False
+
+        failed = [stage for stage in completed if not results[stage].get('success')]
+        return {
+            'success': success,
+            'stages': results,
+            'completed': completed,
+            'skipped': skipped,
+            'message': '图片处理完成' if success else f'{failed[0]} 未通过: {results[failed[0]].get("message", "")}'
+        }
+
+    except Exception as e:
+        # 返回已完成阶段的结果，调用方据此释放其中已写出的共享内存段
+        result = {
+            'success': False,
+            'stages': results,
+            'completed': completed,
+            'message': f'图片处理失败: {str(e)}'
+        }
+        if stage is not None:
+            result['failed_stage'] = stage
+            result['message'] = f'{stage} 处理失败: {str(e)}'
+        return result
+
+
+def main():
+    """
+    命令行入口
+    接收JSON格式的参数: {
+        "image_path": "...",
+        "stages": ["check_face", "extract_faces", "compress", "watermark"],
+        "options": {
+            "check_face": {"min_face_size": 80, "confidence_threshold": 0.7},
+            "extract_faces": {"output_dir": "...（或 shm://）", "min_face_size": 80, "confidence_threshold": 0.7,
+                              "crop_size": 256, "crop_margin": 0.1, "crop_format": "png"},
+            "compress": {"output_path": "...", "max_size_mb": 2},
+            "watermark": {"output_path": "...", "watermark_text": "...", "qr_url": "...", "position": "center"}
+        },
+        "stop_on_fail": true
+    }
+    输出结果附带 timings 字段（各阶段耗时，毫秒）
+    可选参数 _profile / _request_id 开启按需剖析（见 profiling.py）
+    image_path 可为共享内存引用 shm://...，输出路径 / output_dir 可为 shm://（见 shm_io.py）
+    """
+    cancellation.install()
+    timer = StageTimer()
+    try:
+        # 从命令行参数读取JSON
+        if len(sys.argv) > 1:
+            params = json.loads(sys.argv[1])
+        else:
+            # 从stdin读取
+            params = json.load(sys.stdin)
+
+        image_path = params.get('image_path')
+
+        if not image_path:
+            result = {
+                'success': False,
+                'stages': {},
+                'message': '缺少必需参数: image_path'
+            }
+        else:
+            result = run_profiled('process_upload', params, process_upload, image_path,
+                                  params.get('stages'), params.get('options'),
+                                  params.get('stop_on_fail', True), timer)
+
+        # 输出JSON结果
+        result['timings'] = timer.as_dict()
+        print(json.dumps(result, ensure_ascii=False))
+
+    except Exception as e:
+        result = {
+            'success': False,
+            'stages': {},
+            'message': f'脚本执行失败: {str(e)}',
+            'timings': timer.as_dict()
+        }
+        print(json.dumps(result, ensure_ascii=False))
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,211 @@
+#!/usr/bin/env python3
+"""
+按需性能剖析工具
+通过环境变量 PY_PROFILE=1 或请求参数 "_profile": true 开启；
+"_profile" 只由 pythonBridge 的 options.profile 在服务端内部设置，HTTP 接口不对外暴露，
+线上排查时用 PY_PROFILE=1 重启服务开启。开启后
+在 cProfile 与 tracemalloc 下执行一次 utils 调用，并把结果写入
+PY_PROFILE_DIR/<request_id>/ 目录:
+    <script>.prof             cProfile 原始数据（可用 pstats / snakeviz 打开）
+    <script>.allocations.txt  tracemalloc 按代码行统计的内存分配 Top N
+    <script>.meta.json        耗时、峰值内存、参数摘要
+未开启时只多一次字典查找，不导入 cProfile / tracemalloc
+
+汇总命令:
+    python profiling.py list
+    python profiling.py summarize <request_id 或目录> [--top 20] [--sort cumulative]
+"""
+
+import os
+import re
+import sys
+import json
+import time
+import uuid
+import argparse
+
+PROFILE_DIR = os.environ.get(
+    'PY_PROFILE_DIR',
+    os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'profiles')
+)
+TOP_ALLOCATIONS = 25
+_TRUTHY = ('1', 'true', 'yes', 'on')
+
+
+def profile_enabled(params):
+    """环境变量或请求参数任一开启即剖析"""
+    if os.environ.get('PY_PROFILE', '').lower() in _TRUTHY:
+        return True
+    flag = params.get('_profile') if isinstance(params, dict) else None
+    if isinstance(flag, str):
+        return flag.lower() in _TRUTHY
+    return bool(flag)
+
+
+def _safe_request_id(params):
+    request_id = params.get('_request_id') if isinstance(params, dict) else None
+    # 只保留文件名安全字符，避免请求参数构造出目录穿越；
+    # 以 . 开头（含 . / .. 这类全是点的 id）会指向 PROFILE_DIR 自身、上级目录或隐藏目录，改用生成的 id
+    request_id = re.sub(r'[^\w.-]', '_', str(request_id or ''))[:128]
+    if not request_id or request_id.startswith('.'):
+        request_id = f"{time.strftime('%Y%m%d_%H%M%S')}_{os.getpid()}_{uuid.uuid4().hex[:8]}"
+    return request_id
+
+
+def _params_summary(params):
+    """参数摘要：只记录键与值类型/长度，避免把 Base64 图片写进 dump"""
+    summary = {}
+    for key, value in params.items():
+        if isinstance(value, (list, tuple, dict)):
+            summary[key] = f'{type(value).__name__}[{len(value)}]'
+        elif isinstance(value, str) and len(value) > 200:
+            summary[key] = f'str[{len(value)}]'
+        else:
+            summary[key] = value
+    return summary
+
+
+def run_profiled(script_name, params, func, *args, **kwargs):
+    """
+    执行 func(*args, **kwargs)；开启剖析时在 cProfile + tracemalloc 下执行并写出 dump
+
+    Args:
+        script_name: 脚本名（dump 文件名前缀）
+        params: 请求参数（读取 _profile / _request_id）
+        func: 被调用的处理函数
+
+    Returns:
+        func 的返回值；剖析开启且返回 dict 时附带 profile 字段 {request_id, dump_dir}
+    """
+    if not profile_enabled(params):
+        return func(*args, **kwargs)
+
+    import cProfile
+    import tracemalloc
+
+    request_id = _safe_request_id(params)
+    dump_dir = os.path.join(PROFILE_DIR, request_id)
+
+    profiler = cProfile.Profile()
+    tracemalloc.start()
+    started_at = time.perf_counter()
+    profiler.enable()
+    try:
+        result = func(*args, **kwargs)
+    finally:
+        profiler.disable()
+        elapsed_ms = (time.perf_counter() - started_at) * 1000
+        snapshot = tracemalloc.take_snapshot()
+        _, peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+
+        try:
+            os.makedirs(dump_dir, exist_ok=True)
+            profiler.dump_stats(os.path.join(dump_dir, f'{script_name}.prof'))
+
+            stats = snapshot.filter_traces((
+                tracemalloc.Filter(False, tracemalloc.__file__),
+                tracemalloc.Filter(False, '<frozen importlib._bootstrap*>'),
+            )).statistics('lineno')
+            with open(os.path.join(dump_dir, f'{script_name}.allocations.txt'), 'w', encoding='utf-8') as f:
+                for stat in stats[:TOP_ALLOCATIONS]:
+                    f.write(f'{stat}\n')
+
+            with open(os.path.join(dump_dir, f'{script_name}.meta.json'), 'w', encoding='utf-8') as f:
+                json.dump({
+                    'script': script_name,
+                    'request_id': request_id,
+                    'elapsed_ms': round(elapsed_ms, 2),
+                    'peak_memory_kb': round(peak / 1024, 1),
+                    'params': _params_summary(params),
+                    'created_at': time.strftime('%Y-%m-%dT%H:%M:%S')
+                }, f, ensure_ascii=False, indent=2, default=str)
+            print(f'[profiling] 剖析结果已写入: {dump_dir}', file=sys.stderr)
+        except OSError as e:
+            # 剖析失败不影响业务结果
+            print(f'[profiling] 写入剖析结果失败: {str(e)}', file=sys.stderr)
+
+    if isinstance(result, dict):
+        result['profile'] = {'request_id': request_id, 'dump_dir': os.path.abspath(dump_dir)}
+    return result
+
+
+def _resolve_dump_dir(target):
+    if os.path.isdir(target):
+        return target
+    return os.path.join(PROFILE_DIR, target)
+
+
+def list_dumps():
+    """列出所有 dump（按时间倒序）"""
+    if not os.path.isdir(PROFILE_DIR):
+        print(f'没有剖析结果: {PROFILE_DIR}')
+        return
+    entries = []
+    for request_id in os.listdir(PROFILE_DIR):
+        dump_dir = os.path.join(PROFILE_DIR, request_id)
+        if not os.path.isdir(dump_dir):
+            continue
+        for name in os.listdir(dump_dir):
+            if name.endswith('.meta.json'):
+                with open(os.path.join(dump_dir, name), 'r', encoding='utf-8') as f:
+                    entries.append(json.load(f))
+    entries.sort(key=lambda m: m.get('created_at', ''), reverse=True)
+    for meta in entries:
+        print(f"{meta.get('created_at', '')}  {meta['request_id']:<40} {meta['script']:<24} "
+              f"{meta['elapsed_ms']:>10.1f} ms  peak {meta['peak_memory_kb']:>10.1f} KB")
+
+
+def summarize(target, top=20, sort='cumulative'):
+    """打印一个 dump 目录下每个脚本的热点函数与内存分配 Top N"""
+    import pstats
+
+    dump_dir = _resolve_dump_dir(target)
+    if not os.path.isdir(dump_dir):
+        print(f'剖析目录不存在: {dump_dir}', file=sys.stderr)
+        sys.exit(1)
+
+    for name in sorted(os.listdir(dump_dir)):
+        if not name.endswith('.prof'):
+            continue
+        script_name = name[:-len('.prof')]
+        meta_path = os.path.join(dump_dir, f'{script_name}.meta.json')
+        if os.path.exists(meta_path):
+            with open(meta_path, 'r', encoding='utf-8') as f:
+                meta = json.load(f)
+            print(f"== {script_name}  耗时 {meta['elapsed_ms']} ms  峰值内存 {meta['peak_memory_kb']} KB")
+            print(f"   参数: {json.dumps(meta.get('params', {}), ensure_ascii=False)}")
+        else:
+            print(f'== {script_name}')
+
+        print(f'-- 热点函数 (按 {sort} 排序, Top {top})')
+        pstats.Stats(os.path.join(dump_dir, name), stream=sys.stdout).strip_dirs().sort_stats(sort).print_stats(top)
+
+        alloc_path = os.path.join(dump_dir, f'{script_name}.allocations.txt')
+        if os.path.exists(alloc_path):
+            print(f'-- 内存分配 (Top {top})')
+            with open(alloc_path, 'r', encoding='utf-8') as f:
+                for line in f.readlines()[:top]:
+                    print(f'   {line.rstrip()}')
+        print()
+
+
+def main():
+    parser = argparse.ArgumentParser(description='utils 脚本剖析结果汇总')
+    sub = parser.add_subparsers(dest='command', required=True)
+    sub.add_parser('list', help='列出所有剖析结果')
+    summary_parser = sub.add_parser('summarize', help='汇总一次请求的剖析结果')
+    summary_parser.add_argument('target', help='request_id 或 dump 目录')
+    summary_parser.add_argument('--top', type=int, default=20, help='显示前 N 项')
+    summary_parser.add_argument('--sort', default='cumulative',
+                                choices=['cumulative', 'tottime', 'ncalls'], help='热点函数排序字段')
+    args = parser.parse_args()
+
+    if args.command == 'list':
+        list_dumps()
+    else:
+        summarize(args.target, args.top, args.sort)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,24 @@
+/**
+ * 客户端断开检测
+ * 响应完成前连接就已关闭（用户取消上传、小程序页面退出、网关超时等）时中止 AbortSignal，
+ * 传给 pythonBridge 后取消仍在排队的任务，或终止正在运行的 Python 进程组
+ */
+
+/**
+ * 创建随客户端断开而中止的 AbortSignal
+ * @param res Express 响应对象
+ * @returns {AbortSignal}
+ */
+function disconnectSignal(res) {
+  const controller = new AbortController();
+  res.on('close', () => {
+    if (!res.writableFinished) {
+      controller.abort();
+    }
+  });
+  return controller.signal;
+}
+
+module.exports = {
+  disconnectSignal
+};
@@ -0,0 +1,176 @@
+/**
+ * 共享内存交接工具
+ * 与 Python 端 utils/shm_io.py 配合：Node 把图片字节写入 /dev/shm 下的段文件，
+ * 参数里只传 shm://<name>?offset=..&length=.. 引用，Python 直接映射解码；
+ * Python 的输出同样写入段文件并返回 { name, offset, length }，由 Node 读取后删除。
+ * Node 写入的段按内容哈希命名并引用计数：相同图片得到相同的 shm:// 引用，
+ * pythonBridge 的请求合并照常生效，最后一个调用方释放时才删除段文件。
+ * 段目录由环境变量 PY_SHM_DIR 指定，默认 /dev/shm（不存在时退回系统临时目录）。
+ */
+
+const fs = require('fs');
+const os = require('os');
+const path = require('path');
+const crypto = require('crypto');
+
+const SHM_DIR = process.env.PY_SHM_DIR || (fs.existsSync('/dev/shm') ? '/dev/shm' : os.tmpdir());
+const SHM_PREFIX = 'aiart-';
+// 作为输出路径传给 Python，表示结果写入新的共享内存段
+const SHM_OUTPUT = 'shm://';
+// 超过该时长仍未删除的段视为进程异常退出遗留
+const STALE_SEGMENT_MS = 10 * 60 * 1000;
+
+const NAME_PATTERN = /^[A-Za-z0-9._-]+$/;
+
+// Node 写入的段: 段名 → 引用计数
+const segmentRefCounts = new Map();
+
+function segmentPath(name) {
+  if (!NAME_PATTERN.test(name) || !name.startsWith(SHM_PREFIX)) {
+    throw new Error(`非法的共享内存段名: ${name}`);
+  }
+  return path.join(SHM_DIR, name);
+}
+
+/**
+ * 把字节写入共享内存段（段名由内容哈希决定，内容相同的段只写一次并增加引用计数）
+ * 每次调用都需要对应一次 releaseSegment
+ * @param buffer 图片字节
+ * @returns {Object} { name, ref }，ref 为传给 Python 的 shm:// 引用
+ */
+function writeSegment(buffer) {
+  const digest = crypto.createHash('sha256').update(buffer).digest('hex').slice(0, 32);
+  const name = `${SHM_PREFIX}node-${process.pid}-${digest}`;
+  const refCount = segmentRefCounts.get(name) || 0;
+  if (refCount === 0) {
+    fs.writeFileSync(segmentPath(name), buffer);
+  }
+  segmentRefCounts.set(name, refCount + 1);
+  return { name, ref: `${SHM_OUTPUT}${name}?offset=0&length=${buffer.length}` };
+}
+
+/**
+ * 把 Base64 数据URI 解码后写入共享内存段（非数据URI 返回 null）
+ */
+function dataUriToSegment(value) {
+  if (typeof value !== 'string' || !value.startsWith('data:image/')) {
+    return null;
+  }
+  const comma = value.indexOf(',');
+  return writeSegment(Buffer.from(comma === -1 ? value : value.slice(comma + 1), 'base64'));
+}
+
+/**
+ * 释放共享内存段：Node 写入的段减少引用计数，计数归零或为 Python 输出段时删除（段不存在时忽略）
+ * @param nameOrRef 段名、shm:// 引用或 { name } 对象
+ */
+function releaseSegment(nameOrRef) {
+  let name = typeof nameOrRef === 'object' ? nameOrRef.name : nameOrRef;
+  if (name.startsWith(SHM_OUTPUT)) {
+    name = new URL(name).host;
+  }
+  const filePath = segmentPath(name);
+  const refCount = segmentRefCounts.get(name);
+  if (refCount > 1) {
+    segmentRefCounts.set(name, refCount - 1);
+    return;
+  }
+  segmentRefCounts.delete(name);
+  try {
+    fs.unlinkSync(filePath);
+  } catch (error) {
+    if (error.code !== 'ENOENT') {
+      console.error(`[SharedMemory] 删除共享内存段失败 ${name}:`, error.message);
+    }
+  }
+}
+
+/**
+ * 把 Python 结果中的共享内存输出换成 Buffer，并删除已读取的段：
+ *   { output_shm } → { output_buffer }
+ *   { image_shm }  → { image_base64 }（人脸裁剪图 / 拼图，保持接口返回格式不变）
+ *   { data_shm }   → { data_base64 }（打包的原始数组）
+ * 同一个段只读取一次；原地修改且可重复调用（合并调用的多个调用方共享同一个结果对象）
+ * @param result Python 脚本返回的结果
+ * @returns 同一个结果对象
+ */
+function resolveShmOutputs(result) {
+  const segments = new Map();
+  const read = ({ name, offset, length }) => {
+    if (!segments.has(name)) {
+      segments.set(name, fs.readFileSync(segmentPath(name)));
+    }
+    return segments.get(name).subarray(offset, offset + length);
+  };
+
+  const visit = (value) => {
+    if (Array.isArray(value)) {
+      value.forEach(visit);
+    } else if (value && typeof value === 'object' && !Buffer.isBuffer(value)) {
+      if (value.output_shm) {
+        value.output_buffer = read(value.output_shm);
+        delete value.output_shm;
+      }
+      if (value.image_shm) {
+        value.image_base64 = read(value.image_shm).toString('base64');
+        delete value.image_shm;
+      }
+      if (value.data_shm) {
+        value.data_base64 = read(value.data_shm).toString('base64');
+        delete value.data_shm;
+      }
+      Object.values(value).forEach(visit);
+    }
+  };
+
+  try {
+    visit(result);
+  } finally {
+    for (const name of segments.keys()) {
+      releaseSegment(name);
+    }
+  }
+  return result;
+}
+
+/**
+ * 清理进程异常退出遗留的共享内存段
+ * @param maxAgeMs 最后修改时间早于该时长的段会被删除
+ * @returns {number} 删除的段数
+ */
+function sweepStaleSegments(maxAgeMs = STALE_SEGMENT_MS) {
+  let removed = 0;
+  let names;
+  try {
+    names = fs.readdirSync(SHM_DIR);
+  } catch (error) {
+    return 0;
+  }
+  const cutoff = Date.now() - maxAgeMs;
+  for (const name of names) {
+    // 仍被引用的段属于进行中的调用
+    if (!name.startsWith(SHM_PREFIX) || segmentRefCounts.has(name)) {
+      continue;
+    }
+    try {
+      const filePath = path.join(SHM_DIR, name);
+      if (fs.statSync(filePath).mtimeMs < cutoff) {
+        fs.unlinkSync(filePath);
+        removed++;
+      }
+    } catch (error) {
+      // 段已被其他进程删除
+    }
+  }
+  return removed;
+}
+
+module.exports = {
+  SHM_DIR,
+  SHM_OUTPUT,
+  writeSegment,
+  dataUriToSegment,
+  releaseSegment,
+  resolveShmOutputs,
+  sweepStaleSegments
+};
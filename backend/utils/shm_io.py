@@ -0,0 +1,193 @@
+#!/usr/bin/env python3
+"""
+共享内存交接模块
+Node 把图片字节写入 /dev/shm 下的段文件（内存文件系统，不落盘），参数里只传引用:
+    shm://<name>?offset=<偏移>&length=<长度>
+Python 用 mmap 映射段文件，np.frombuffer 直接得到零拷贝视图交给 cv2.imdecode，
+免去 stdin JSON 中的 Base64 编码与临时文件读写。
+
+输出方向相同：输出路径为 SHM_OUTPUT（'shm://'）时，编码结果写入新的段文件，
+结果中返回 {name, offset, length}，由 Node 读取后删除。
+段目录由环境变量 PY_SHM_DIR 指定，默认 /dev/shm（不存在时退回系统临时目录）。
+"""
+
+import io
+import os
+import re
+import mmap
+import tempfile
+import uuid
+from contextlib import contextmanager
+from urllib.parse import urlsplit, parse_qs
+
+
+SHM_DIR = os.environ.get('PY_SHM_DIR') or ('/dev/shm' if os.path.isdir('/dev/shm') else tempfile.gettempdir())
+SHM_PREFIX = 'aiart-'
+SHM_OUTPUT = 'shm://'
+
+_NAME_PATTERN = re.compile(r'^[A-Za-z0-9._-]+$')
+
+
+def is_shm_ref(value):
+    """是否为共享内存输入引用"""
+    return isinstance(value, str) and value.startswith(SHM_OUTPUT) and len(value) > len(SHM_OUTPUT)
+
+
+def is_shm_output(value):
+    """输出路径是否要求写入共享内存段"""
+    return value == SHM_OUTPUT
+
+
+def _segment_path(name):
+    # 段名来自参数，只允许简单文件名，防止读写段目录以外的文件
+    if not _NAME_PATTERN.match(name) or not name.startswith(SHM_PREFIX):
+        raise ValueError(f'非法的共享内存段名: {name}')
+    return os.path.join(SHM_DIR, name)
+
+
+def parse_shm_ref(ref):
+    """
+    解析 shm://<name>?offset=..&length=..
+
+    Returns:
+        (段文件路径, offset, length)
+    """
+    parts = urlsplit(ref)
+    query = parse_qs(parts.query)
+    path = _segment_path(parts.netloc)
+    offset = int(query.get('offset', ['0'])[0])
+    length = int(query['length'][0]) if 'length' in query else os.path.getsize(path) - offset
+    return path, offset, length
+
+
+@contextmanager
+def shm_view(ref):
+    """
+    以只读方式映射段文件，产出引用范围内的零拷贝 np.uint8 视图
+    视图只在 with 块内有效，不要在块外保留
+    """
+    import numpy as np
+
+    path, offset, length = parse_shm_ref(ref)
+    with open(path, 'rb') as f:
+        mm = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+    try:
+        yield np.frombuffer(mm, np.uint8, count=length, offset=offset)
+    finally:
+        try:
+            mm.close()
+        except BufferError:
+            # 调用方仍持有视图时，映射随视图一起被垃圾回收
+            pass
+
+
+class _ShmReader(io.RawIOBase):
+    """把段内的一段字节包装成只读文件对象（供 PIL.Image.open 流式读取）"""
+
+    def __init__(self, view):
+        self._view = memoryview(view)
+        self._pos = 0
+
+    def readable(self):
+        return True
+
+    def seekable(self):
+        return True
+
+    def tell(self):
+        return self._pos
+
+    def seek(self, pos, whence=io.SEEK_SET):
+        base = {io.SEEK_SET: 0, io.SEEK_CUR: self._pos, io.SEEK_END: len(self._view)}[whence]
+        self._pos = max(base + pos, 0)
+        return self._pos
+
+    def readinto(self, buffer):
+        chunk = self._view[self._pos:self._pos + len(buffer)]
+        buffer[:len(chunk)] = chunk
+        self._pos += len(chunk)
+        return len(chunk)
+
+    def close(self):
+        self._view.release()
+        super().close()
+
+
+@contextmanager
+def open_shm_file(ref):
+    """以文件对象形式打开共享内存引用，适用于只接受文件对象的解码器"""
+    with shm_view(ref) as view:
+        reader = _ShmReader(view)
+        try:
+            yield io.BufferedReader(reader)
+        finally:
+            reader.close()
+
+
+class ShmWriter:
+    """
+    把多个输出依次写入同一个新的段文件，每次 append 返回该输出的引用
+    （多张人脸裁剪图共用一个段，Node 端只需读取一次）
+    """
+
+    def __init__(self):
+        self.name = f'{SHM_PREFIX}py-{os.getpid()}-{uuid.uuid4().hex[:12]}'
+        self._file = open(_segment_path(self.name), 'wb')
+        self._offset = 0
+
+    def append(self, data):
+        """
+        Args:
+            data: 支持缓冲区协议的对象（bytes / np.ndarray / BytesIO.getbuffer()）
+
+        Returns:
+            dict: {name, offset, length}
+        """
+        length = self._file.write(memoryview(data).cast('B'))
+        ref = {'name': self.name, 'offset': self._offset, 'length': length}
+        self._offset += length
+        return ref
+
+    def close(self):
+        """关闭段文件；没有写入任何输出的空段不会被引用，直接删除"""
+        if not self._file.closed:
+            self._file.close()
+            if self._offset == 0:
+                self.discard()
+
+    def discard(self):
+        """放弃已写入的内容（出错时调用，避免留下无人读取的段文件）"""
+        self._file.close()
+        try:
+            os.unlink(self._file.name)
+        except OSError:
+            pass
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, *exc):
+        if exc_type is not None:
+            self.discard()
+        else:
+            self.close()
+
+
+def write_shm(data):
+    """把单个输出写入新的段文件，返回 {name, offset, length}"""
+    with ShmWriter() as writer:
+        return writer.append(data)
+
+
+def write_output(output_path, data):
+    """
+    写出编码结果：output_path 为 SHM_OUTPUT 时写入共享内存段，否则写入文件
+
+    Returns:
+        dict: 结果字段 {'output_shm': 引用} 或 {'output_path': 路径}
+    """
+    if is_shm_output(output_path):
+        return {'output_shm': write_shm(data)}
+    with open(output_path, 'wb') as f:
+        f.write(data)
+    return {'output_path': output_path}
@@ -0,0 +1,46 @@
+#!/usr/bin/env python3
+"""
+阶段计时工具
+为 utils 脚本的 JSON 结果提供结构化的 timings 字段（单位毫秒），
+由 pythonBridge.js 汇总为各脚本各阶段的耗时直方图
+"""
+
+import time
+import threading
+from contextlib import contextmanager
+
+
+class StageTimer:
+    """
+    按阶段累计耗时，同名阶段多次进入时累加（例如多张图片逐张解码）
+    可在多个线程中共用，并行阶段的耗时按各线程累加
+
+    用法:
+        timer = StageTimer()
+        with timer.stage('decode'):
+            img = cv2.imread(path)
+        result['timings'] = timer.as_dict()
+    """
+
+    def __init__(self):
+        self.started_at = time.perf_counter()
+        self.stages = {}
+        self._lock = threading.Lock()
+
+    @contextmanager
+    def stage(self, name):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.add(name, (time.perf_counter() - start) * 1000)
+
+    def add(self, name, elapsed_ms):
+        with self._lock:
+            self.stages[name] = self.stages.get(name, 0.0) + elapsed_ms
+
+    def as_dict(self):
+        """各阶段耗时及 total（计时器创建至今），保留两位小数"""
+        timings = {name: round(ms, 2) for name, ms in self.stages.items()}
+        timings['total'] = round((time.perf_counter() - self.started_at) * 1000, 2)
+        return timings
@@ -51,6 +51,20 @@ function validateUrl(url) {
   }
 }
 
+/**
+ * 校验交给 Python 读取的图片输入：只接受 http/https 地址或 Base64 图片数据URI
+ * （shm:// 引用只由 pythonBridge 内部生成，本地路径、file:// 等不能由客户端传入）
+ * @param {string} value - 待校验的图片地址
+ * @returns {boolean}
+ */
+function validateImageInput(value) {
+  if (typeof value !== 'string') return false;
+  if (value.startsWith('data:image/')) {
+    return value.includes(';base64,');
+  }
+  return validateUrl(value) && ['http:', 'https:'].includes(new URL(value).protocol);
+}
+
 /**
  * 校验数组长度
  * @param {Array} arr - 待校验的数组
@@ -314,15 +328,130 @@ function validateExtractFacesParams(params) {
     if (!validateArrayLength(params.imageUrls, 1, 10)) {
       errors.push('imageUrls数组长度必须在1-10之间');
     } else {
-      // 校验每个URL格式
+      // 校验每个图片地址（http/https 或 Base64 数据URI）
+      for (let i = 0; i < params.imageUrls.length; i++) {
+        if (!validateImageInput(params.imageUrls[i])) {
+          errors.push(`imageUrls[${i}]必须是http/https地址或Base64图片`);
+        }
+      }
+    }
+  }
+  
+  // 校验cropSize（可选）
+  if (params.cropSize !== undefined &&
+      !(Number.isInteger(params.cropSize) && validateNumberRange(params.cropSize, 32, 1024))) {
+    errors.push('cropSize必须是32-1024之间的整数');
+  }
+  
+  // 校验cropMargin（可选）
+  if (params.cropMargin !== undefined && !validateNumberRange(params.cropMargin, 0, 1)) {
+    errors.push('cropMargin必须在0-1之间');
+  }
+  
+  // 校验cropFormat（可选）
+  if (params.cropFormat && !validateEnum(params.cropFormat, ['png', 'jpeg'])) {
+    errors.push('cropFormat必须是png或jpeg之一');
+  }
+  
+  // 校验pack（可选，需要同时指定cropSize）
+  if (params.pack) {
+    if (!validateEnum(params.pack, ['array', 'sprite'])) {
+      errors.push('pack必须是array或sprite之一');
+    } else if (params.cropSize === undefined) {
+      errors.push('pack需要同时指定cropSize');
+    }
+  }
+  
+  return {
+    valid: errors.length === 0,
+    errors
+  };
+}
+
+/**
+ * 校验批量人脸校验请求参数
+ * @param {Object} params - 请求参数
+ * @returns {Object} { valid: boolean, errors: Array<string> }
+ */
+function validateCheckFacesParams(params) {
+  const errors = [];
+  
+  // 校验必需字段
+  const { valid, missingFields } = validateRequiredFields(params, ['imageUrls']);
+  if (!valid) {
+    errors.push(`缺少必需参数: ${missingFields.join(', ')}`);
+  }
+  
+  // 校验imageUrls
+  if (params.imageUrls) {
+    if (!validateArrayLength(params.imageUrls, 1, 10)) {
+      errors.push('imageUrls数组长度必须在1-10之间');
+    } else {
+      // 校验每个图片地址（http/https 或 Base64 数据URI）
       for (let i = 0; i < params.imageUrls.length; i++) {
-        if (!validateUrl(params.imageUrls[i])) {
-          errors.push(`imageUrls[${i}]不是有效的URL格式`);
+        if (!validateImageInput(params.imageUrls[i])) {
+          errors.push(`imageUrls[${i}]必须是http/https地址或Base64图片`);
         }
       }
     }
   }
   
+  // 校验gate（可选）
+  if (params.gate !== undefined && typeof params.gate !== 'boolean') {
+    errors.push('gate必须是布尔值');
+  }
+  
+  return {
+    valid: errors.length === 0,
+    errors
+  };
+}
+
+// 上传组合处理的 Base64 图片解码后大小上限
+const MAX_PROCESS_UPLOAD_IMAGE_BYTES = 5 * 1024 * 1024;
+
+/**
+ * 校验上传组合处理请求参数
+ * image（Base64 数据URI）与 imageUrl（http/https 地址）二选一，会直接交给 Python 读取，
+ * 因此不接受本地路径、file:// 或共享内存引用
+ * @param {Object} params - 请求参数
+ * @returns {Object} { valid: boolean, errors: Array<string> }
+ */
+function validateProcessUploadParams(params) {
+  const errors = [];
+  const { image, imageUrl, watermark } = params;
+  
+  if (image === undefined && imageUrl === undefined) {
+    errors.push('缺少必需参数: image 或 imageUrl');
+  } else if (image !== undefined && imageUrl !== undefined) {
+    errors.push('image和imageUrl只能提供一个');
+  }
+  
+  // 校验image是base64格式且不超过大小上限
+  if (image !== undefined) {
+    if (typeof image !== 'string') {
+      errors.push('image必须是字符串');
+    } else if (!image.startsWith('data:image/') || !image.includes(';base64,')) {
+      errors.push('image必须是有效的base64图片格式（以data:image/开头）');
+    } else if (Math.floor((image.length - image.indexOf(',') - 1) * 3 / 4) > MAX_PROCESS_UPLOAD_IMAGE_BYTES) {
+      errors.push(`image解码后不能超过${MAX_PROCESS_UPLOAD_IMAGE_BYTES / 1024 / 1024}MB`);
+    }
+  }
+  
+  // 校验imageUrl只能是http/https地址
+  if (imageUrl !== undefined) {
+    if (!validateUrl(imageUrl) || !['http:', 'https:'].includes(new URL(imageUrl).protocol)) {
+      errors.push('imageUrl必须是有效的http/https地址');
+    } else if (!validateStringLength(imageUrl, 1, 2048)) {
+      errors.push('imageUrl长度不能超过2048');
+    }
+  }
+  
+  // 校验watermark（可选）
+  if (watermark !== undefined && typeof watermark !== 'boolean') {
+    errors.push('watermark必须是布尔值');
+  }
+  
   return {
     valid: errors.length === 0,
     errors
@@ -468,6 +597,7 @@ module.exports = {
   validateRequiredFields,
   validateStringLength,
   validateUrl,
+  validateImageInput,
   validateArrayLength,
   validateEnum,
   validateNumberRange,
@@ -481,6 +611,8 @@ module.exports = {
   validateWechatPaymentParams,
   validateUploadImageParams,
   validateExtractFacesParams,
+  validateCheckFacesParams,
+  validateProcessUploadParams,
   validateCreateProductOrderParams,
   validateGenerateVideoParams,
   
@@ -54,6 +54,17 @@ const faceAPI = {
     showLoading: true,
     loadingText: '检测人脸中...',
     timeout: 60000
+  }),
+
+  /**
+   * 批量校验照片是否包含清晰人脸（多张照片一次请求）
+   * @param {string[]} imageUrls 图片URL数组
+   * @returns {Promise<Object>} 逐张结果 results 与汇总 summary
+   */
+  checkFaces: (imageUrls) => post('/api/check-faces', { imageUrls }, {
+    showLoading: true,
+    loadingText: '校验照片中...',
+    timeout: 60000
   })
 };
 